@@ -1,7 +1,7 @@
 import discord
 from discord.ext import commands, tasks
 from discord import app_commands
-from services.alert_service import alert_service
+from services.async_db import async_db
 from services.price_service import get_cached_price
 import logging
 
@@ -18,7 +18,7 @@ class Alerts(commands.Cog):
     @tasks.loop(minutes=2)
     async def check_alerts(self):
         """Background task to check all pending price alerts."""
-        alerts = alert_service.get_all_alerts()
+        alerts = await async_db.alerts.get_all_alerts()
         if not alerts:
             return
 
@@ -45,7 +45,7 @@ class Alerts(commands.Cog):
                 
             if triggered:
                 await self.notify_user(alert, current_val)
-                alert_service.delete_alert(alert['id'])
+                await async_db.alerts.delete_alert(alert['id'])
 
     async def notify_user(self, alert, current_price):
         """Send a DM notification when an alert triggers."""
@@ -83,7 +83,7 @@ class Alerts(commands.Cog):
         app_commands.Choice(name="Below", value="below")
     ])
     async def pricealert_set(self, interaction: discord.Interaction, currency: str, price: float, condition: str = "above", fiat: str = "usd"):
-        alert_service.add_alert(interaction.user.id, currency, price, condition, fiat)
+        await async_db.alerts.add_alert(interaction.user.id, currency, price, condition, fiat)
         
         embed = discord.Embed(
             title="✅ Alert Set!",
@@ -96,7 +96,7 @@ class Alerts(commands.Cog):
 
     @app_commands.command(name="alerts", description="List or manage your active price alerts")
     async def alerts_list(self, interaction: discord.Interaction):
-        user_alerts = alert_service.get_user_alerts(interaction.user.id)
+        user_alerts = await async_db.alerts.get_user_alerts(interaction.user.id)
         
         if not user_alerts:
             await interaction.response.send_message("You have no active price alerts.", ephemeral=True)
@@ -113,7 +113,7 @@ class Alerts(commands.Cog):
 
     @app_commands.command(name="alertremove", description="Remove an active price alert by ID")
     async def alert_remove(self, interaction: discord.Interaction, alert_id: int):
-        alert_service.delete_alert(alert_id, interaction.user.id)
+        await async_db.alerts.delete_alert(alert_id, interaction.user.id)
         await interaction.response.send_message(f"✅ Alert #{alert_id} has been removed.", ephemeral=True)
 
 async def setup(bot):
@@ -0,0 +1,123 @@
+import discord
+from discord import app_commands
+from discord.ext import commands, tasks
+from discord.ui import View, Button
+import logging
+import os
+from services.async_db import async_db
+import config
+
+logger = logging.getLogger("AuditCog")
+
+AUDIT_PAGE_SIZE = 10
+AUDIT_LIVE_MONTHS = int(os.getenv("AUDIT_LIVE_MONTHS", "1"))
+AUDIT_DROP_EXPORTED = os.getenv("AUDIT_DROP_EXPORTED", "false").lower() == "true"
+
+
+class AuditLogView(View):
+    """Keyset-paginated audit query (each page starts after the last record of the previous one)."""
+    def __init__(self, owner_id, filters):
+        super().__init__(timeout=300)
+        self.owner_id = owner_id
+        self.filters = filters
+        self.cursors = [None] # Cursor that starts each visited page
+        self.next_cursor = None
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.owner_id
+
+    async def build_embed(self):
+        records, self.next_cursor = await async_db.audit.query_actions(
+            before=self.cursors[-1], limit=AUDIT_PAGE_SIZE, **self.filters
+        )
+
+        desc = ""
+        for r in records:
+            target = f" → `{r['target_id']}`" if r["target_id"] else ""
+            desc += f"<t:{int(r['timestamp'])}:f> **{r['action']}** by <@{r['user_id']}>{target}\n"
+            if r["details"]:
+                desc += f"> {r['details'][:150]}\n"
+
+        shown = ", ".join(f"{k}={v}" for k, v in self.filters.items() if v not in (None, False)) or "all actions"
+        embed = discord.Embed(
+            title="📜 Audit Log",
+            description=desc[:4000] or "No matching records.",
+            color=discord.Color.dark_grey()
+        )
+        embed.set_footer(text=f"{shown} • Page {len(self.cursors)}")
+
+        self.prev_page.disabled = len(self.cursors) == 1
+        self.next_page.disabled = self.next_cursor is None
+        return embed
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary, emoji="◀️")
+    async def prev_page(self, interaction: discord.Interaction, button: Button):
+        if len(self.cursors) > 1:
+            self.cursors.pop()
+        embed = await self.build_embed()
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary, emoji="▶️")
+    async def next_page(self, interaction: discord.Interaction, button: Button):
+        if self.next_cursor is not None:
+            self.cursors.append(self.next_cursor)
+        embed = await self.build_embed()
+        await interaction.response.edit_message(embed=embed, view=self)
+
+
+class Audit(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.retention_loop.start()
+
+    def cog_unload(self):
+        self.retention_loop.cancel()
+
+    @tasks.loop(hours=24)
+    async def retention_loop(self):
+        # Roll old months out of audit_logs, then compress whatever was rolled over
+        try:
+            segments = await async_db.audit.rollover(live_months=AUDIT_LIVE_MONTHS)
+            if segments:
+                logger.info(f"Audit rollover wrote {', '.join(segments)}")
+            await async_db.audit.export_pending(drop=AUDIT_DROP_EXPORTED)
+        except Exception as e:
+            logger.error(f"Audit retention failed: {e}")
+
+    @retention_loop.before_loop
+    async def before_retention(self):
+        await self.bot.wait_until_ready()
+
+    @app_commands.command(name="audit", description="Search the audit log (Owner Only)")
+    @app_commands.describe(
+        user="Only actions performed by this user",
+        target="Only actions on this target (deal ID, user ID...)",
+        action="Only this action type (e.g. DEAL_WITHDRAWN)",
+        archived="Also search rolled-over monthly archives"
+    )
+    async def audit(self, interaction: discord.Interaction, user: discord.User = None, target: str = None,
+                    action: str = None, archived: bool = False):
+        if interaction.user.id not in config.OWNER_IDS:
+            await interaction.response.send_message("❌ You are not authorized to use this command.", ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True)
+        # Make just-logged actions visible before querying
+        await async_db.audit.flush()
+
+        filters = {
+            "user_id": user.id if user else None,
+            "target_id": target,
+            "action": action.upper() if action else None,
+            "archived": archived,
+        }
+        try:
+            view = AuditLogView(interaction.user.id, filters)
+            embed = await view.build_embed()
+            await interaction.followup.send(embed=embed, view=view, ephemeral=True)
+        except Exception as e:
+            logger.error(f"Audit query failed: {e}")
+            await interaction.followup.send(f"❌ Audit query failed: {e}", ephemeral=True)
+
+async def setup(bot):
+    await bot.add_cog(Audit(bot))
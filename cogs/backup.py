@@ -0,0 +1,56 @@
+from discord.ext import commands, tasks
+import asyncio
+import logging
+import os
+from utils import backup
+
+logger = logging.getLogger("BackupCog")
+
+BACKUP_INTERVAL_HOURS = float(os.getenv("BACKUP_INTERVAL_HOURS", "24"))
+# 0 disables incremental journals between full snapshots
+BACKUP_INCREMENTAL_MINUTES = float(os.getenv("BACKUP_INCREMENTAL_MINUTES", "0"))
+
+class Backup(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self._lock = asyncio.Lock() # Never run a full backup and a journal at the same time
+        self.full_backup_loop.change_interval(hours=BACKUP_INTERVAL_HOURS)
+        self.full_backup_loop.start()
+        if BACKUP_INCREMENTAL_MINUTES > 0:
+            self.incremental_backup_loop.change_interval(minutes=BACKUP_INCREMENTAL_MINUTES)
+            self.incremental_backup_loop.start()
+
+    def cog_unload(self):
+        self.full_backup_loop.cancel()
+        self.incremental_backup_loop.cancel()
+
+    async def _run(self, incremental):
+        async with self._lock:
+            try:
+                # Page-stepped copy and compression run off the event loop
+                path = await asyncio.to_thread(backup.run_backup, incremental)
+                if path is None:
+                    logger.error(f"{'Incremental' if incremental else 'Full'} backup did not complete.")
+            except Exception as e:
+                logger.error(f"Backup task failed: {e}")
+
+    @tasks.loop(hours=24)
+    async def full_backup_loop(self):
+        await self._run(incremental=False)
+
+    @tasks.loop(minutes=60)
+    async def incremental_backup_loop(self):
+        await self._run(incremental=True)
+
+    @full_backup_loop.before_loop
+    async def before_full_backup(self):
+        await self.bot.wait_until_ready()
+
+    @incremental_backup_loop.before_loop
+    async def before_incremental_backup(self):
+        await self.bot.wait_until_ready()
+        # The full loop takes the first snapshot; journals start one interval later
+        await asyncio.sleep(BACKUP_INCREMENTAL_MINUTES * 60)
+
+async def setup(bot):
+    await bot.add_cog(Backup(bot))
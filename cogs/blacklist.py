@@ -3,6 +3,7 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 from services.blacklist_service import blacklist_service
+from services.async_db import async_db
 import config
 
 class Blacklist(commands.Cog):
@@ -40,21 +41,21 @@ class Blacklist(commands.Cog):
                 await interaction.response.send_message("❌ Please provide a reason for blacklisting.", ephemeral=True)
                 return
             
-            success = blacklist_service.add_user(user.id, reason, interaction.user.id)
+            success = await async_db.blacklist.add_user(user.id, reason, interaction.user.id)
             if success:
                 await interaction.response.send_message(f"✅ **{user.name}** (`{user.id}`) has been blacklisted.\nReason: {reason}")
             else:
                 await interaction.response.send_message("❌ Failed to add user to blacklist. Check logs.", ephemeral=True)
 
         elif action.value == "remove":
-            success = blacklist_service.remove_user(user.id)
+            success = await async_db.blacklist.remove_user(user.id)
             if success:
                 await interaction.response.send_message(f"✅ **{user.name}** (`{user.id}`) has been removed from the blacklist.")
             else:
                 await interaction.response.send_message("❌ Failed to remove user from blacklist.", ephemeral=True)
 
         elif action.value == "check":
-            info = blacklist_service.get_info(user.id)
+            info = await async_db.blacklist.get_info(user.id)
             if info:
                 embed = discord.Embed(title="⛔ Blacklisted User", color=discord.Color.red())
                 embed.add_field(name="User", value=f"{user.name} (`{user.id}`)", inline=False)
@@ -1,7 +1,7 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import database
+from services.async_db import async_db
 from typing import Optional
 
 class Gamification(commands.Cog):
@@ -29,7 +29,7 @@ class Gamification(commands.Cog):
 
     @app_commands.command(name="streak", description="Check your current deal streak (Duolingo Style)")
     async def streak(self, interaction: discord.Interaction):
-        stats = database.get_gamified_stats(interaction.user.id)
+        stats = await async_db.database.get_gamified_stats(interaction.user.id)
         current = stats['streak']
         highest = stats['highest_streak']
         
@@ -58,7 +58,7 @@ class Gamification(commands.Cog):
     @app_commands.describe(user="User to check achievements for")
     async def achievements(self, interaction: discord.Interaction, user: Optional[discord.Member] = None):
         target = user or interaction.user
-        stats = database.get_gamified_stats(target.id)
+        stats = await async_db.database.get_gamified_stats(target.id)
         
         unlocked = set(stats['achievements'])
         xp = stats['xp']
@@ -89,7 +89,7 @@ class Gamification(commands.Cog):
 
     @app_commands.command(name="badges", description="Show off your premium badges")
     async def badges(self, interaction: discord.Interaction):
-        stats = database.get_gamified_stats(interaction.user.id)
+        stats = await async_db.database.get_gamified_stats(interaction.user.id)
         earned = stats['badges'] or []
         
         embed = discord.Embed(
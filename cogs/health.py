@@ -5,6 +5,7 @@ from discord.ext import commands, tasks
 import time
 import logging
 from services.db_manager import db
+from utils.cache import cache_stats
 
 logger = logging.getLogger("HealthMonitor")
 
@@ -41,7 +42,24 @@ class Health(commands.Cog):
         except Exception as e:
             db_status = f"❌ Error: {str(e)}"
 
-        # 3. Uptime
+        # 3. Connection Pool
+        try:
+            stats = db.pool_stats()
+            if stats.get("backend") == "sqlite":
+                pool_str = f"{stats['open']} open, {stats['reuse_rate'] * 100:.1f}% reused"
+            else:
+                pool_str = f"{stats['in_use']}/{stats['max']} in use"
+        except Exception as e:
+            pool_str = f"❌ {e}"
+
+        # 4. Caches
+        caches = cache_stats()
+        cache_str = "\n".join(
+            f"{name}: {s['hit_rate'] * 100:.1f}% hit ({s['size']} keys, {s['evictions']} evicted)"
+            for name, s in caches.items()
+        ) or "None"
+
+        # 5. Uptime
         uptime = int(time.time() - self.start_time)
         hours, remainder = divmod(uptime, 3600)
         minutes, seconds = divmod(remainder, 60)
@@ -50,6 +68,8 @@ class Health(commands.Cog):
         embed = discord.Embed(title="🏓 Pong!", color=0x00ff00)
         embed.add_field(name="Latency", value=f"{latency:.2f} ms", inline=True)
         embed.add_field(name="Database", value=db_status, inline=True)
+        embed.add_field(name="DB Pool", value=pool_str, inline=True)
+        embed.add_field(name="Caches", value=cache_str, inline=False)
         embed.add_field(name="Uptime", value=uptime_str, inline=False)
         
         await interaction.followup.send(embed=embed)
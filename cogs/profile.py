@@ -1,7 +1,7 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import database
+from services.async_db import async_db
 import math
 from datetime import datetime
 
@@ -15,7 +15,7 @@ class ProfileView(discord.ui.View):
     @discord.ui.button(label="Leaderboard", style=discord.ButtonStyle.secondary, emoji="📊")
     async def leaderboard(self, interaction: discord.Interaction, button: discord.ui.Button):
         try:
-            top_users = database.get_top_users(limit=10)
+            top_users = await async_db.database.get_top_users(limit=10)
             if not top_users:
                 return await interaction.response.send_message("No archival data recorded yet.", ephemeral=True)
             
@@ -33,7 +33,7 @@ class ProfileView(discord.ui.View):
     async def achievements(self, interaction: discord.Interaction, button: discord.ui.Button):
         try:
             from services.achievement_service import achievement_service
-            stats = database.get_gamified_stats(self.target_id)
+            stats = await async_db.database.get_gamified_stats(self.target_id)
             unlocked = set(stats.get('achievements', []))
             
             embed = discord.Embed(title="✨ Milestones", color=0x3498DB)
@@ -69,7 +69,7 @@ class ProfileView(discord.ui.View):
 
     @discord.ui.button(label="Referral", style=discord.ButtonStyle.primary, emoji="🎁")
     async def referral(self, interaction: discord.Interaction, button: discord.ui.Button):
-        stats = database.get_gamified_stats(self.target_id)
+        stats = await async_db.database.get_gamified_stats(self.target_id)
         code = stats.get('referral_code', 'N/A')
         await interaction.response.send_message(
             f"💰 **PARTNER BONUSES**\n\nInvite others to the network and earn commission.\n\n"
@@ -109,7 +109,7 @@ class Profile(commands.Cog):
     async def profile_slash(self, interaction: discord.Interaction, user: discord.Member = None):
         await interaction.response.defer(ephemeral=False)
         target = user or interaction.user
-        stats = database.get_gamified_stats(target.id)
+        stats = await async_db.database.get_gamified_stats(target.id)
         
         level = self.get_level(stats['xp'])
         rank_name, color, next_rank = self.get_rank_info(level)
@@ -126,9 +126,13 @@ class Profile(commands.Cog):
         filled = int(percent * bar_len)
         bar = "█" * filled + "▒" * (bar_len - filled)
         
-        # Dynamic Standing calculation
-        global_rank = max(1, 100 - (level * 2) - int(stats['volume']/5000))
-        rank_suffix = "st" if global_rank == 1 else "nd" if global_rank == 2 else "rd" if global_rank == 3 else "th"
+        # Real leaderboard position by volume
+        global_rank = await async_db.database.get_user_rank(target.id)
+        if global_rank is None:
+            rank_label = "UNRANKED"
+        else:
+            rank_suffix = "th" if 10 <= global_rank % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get(global_rank % 10, "th")
+            rank_label = f"RANK #{global_rank}{rank_suffix}"
 
         embed = discord.Embed(color=color)
         embed.set_author(name=f"{target.display_name.upper()} • TRADING PROFILE", icon_url=target.display_avatar.url)
@@ -139,7 +143,7 @@ class Profile(commands.Cog):
         owner_badge = " 👑 **OWNER**" if target.id in config.OWNER_IDS else ""
         
         embed.description = (
-            f"**{rank_name.upper()}** ┃ `RANK #{global_rank}{rank_suffix}`{owner_badge}\n"
+            f"**{rank_name.upper()}** ┃ `{rank_label}`{owner_badge}\n"
             f"`{bar}` **{int(percent*100)}%**\n"
             f"XP: `{stats['xp']}` / `{next_lvl_xp}`"
         )
@@ -184,8 +188,7 @@ class Profile(commands.Cog):
         last_ach_key = stats.get('last_achievement')
         if not last_ach_key and stats.get('achievements'):
              last_ach_key = stats['achievements'][-1]
-             with database.db.session() as conn:
-                 conn.cursor().execute(f"UPDATE users SET last_achievement = {database.db.p} WHERE user_id = {database.db.p}", (last_ach_key, str(target.id)))
+             await async_db.database.backfill_user_profile(target.id, last_achievement=last_ach_key)
         
         if last_ach_key:
             from services.achievement_service import achievement_service
@@ -204,8 +207,7 @@ class Profile(commands.Cog):
         if not first_seen:
              import time
              first_seen = time.time()
-             with database.db.session() as conn:
-                 conn.cursor().execute(f"UPDATE users SET first_seen = {database.db.p} WHERE user_id = {database.db.p}", (first_seen, str(target.id)))
+             await async_db.database.backfill_user_profile(target.id, first_seen=first_seen)
         
         since = datetime.fromtimestamp(first_seen).strftime("%b %Y")
         embed.set_footer(text=f"MEMBER SINCE {since.upper()} • ARCHIVE ID: {target.id % 10000}")
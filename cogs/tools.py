@@ -5,12 +5,15 @@ import config
 from crypto_utils import rpc_call, rpc_async
 from services.price_service import currency_to_fiat
 from services.localization_service import localization_service
-from services.transaction_tracking_service import tracking_service
-from web3 import Web3, AsyncWeb3, AsyncHTTPProvider
+from services.async_db import async_db
+from web3 import Web3
+from services.evm_provider import evm_providers
+from services.multicall import multicall
 import datetime
 import logging
 import re
 import asyncio
+from utils import json_codec
 
 logger = logging.getLogger("ToolsCog")
 
@@ -36,27 +39,24 @@ class Tools(commands.Cog):
         }
         for rpc in rpc_urls:
             try:
-                w3 = AsyncWeb3(AsyncHTTPProvider(rpc, request_kwargs={"timeout": 5}))
-                if not await w3.is_connected():
-                    continue
+                w3 = await evm_providers.get(rpc, timeout=5)
 
                 check_addr = w3.to_checksum_address(address)
                 
                 # TX Count (Native Nonce)
                 stats['total_tx'] = await w3.eth.get_transaction_count(check_addr)
 
+                # Token or native balance through Multicall3 (balanceOf / getEthBalance)
+                balances = await multicall.balances(rpc, [check_addr], token=token_contract, native=not token_contract)
+                if check_addr not in balances:
+                    continue
+                token_raw, native_wei = balances[check_addr]
                 if token_contract:
                     # Token Balance
-                    contract = w3.eth.contract(
-                        address=w3.to_checksum_address(token_contract),
-                        abi=config.USDT_ABI
-                    )
-                    balance_raw = await contract.functions.balanceOf(check_addr).call()
-                    stats['balance'] = balance_raw / (10 ** decimals)
+                    stats['balance'] = token_raw / (10 ** decimals)
                 else:
                     # Native Balance
-                    balance_wei = await w3.eth.get_balance(check_addr)
-                    stats['balance'] = float(w3.from_wei(balance_wei, 'ether'))
+                    stats['balance'] = native_wei / (10 ** 18)
                 
                 return stats # Success
 
@@ -83,7 +83,7 @@ class Tools(commands.Cog):
                     # Balance
                     async with session.post(url, json=payload, timeout=5) as r:
                          if r.status == 200:
-                             data = await r.json()
+                             data = await r.json(loads=json_codec.loads)
                              if "result" in data:
                                  stats['balance'] = data["result"]["value"] / 1e9
                                  
@@ -119,7 +119,7 @@ class Tools(commands.Cog):
                 try:
                     async with session.get(url, timeout=5) as r:
                         if r.status == 200:
-                            data = await r.json()
+                            data = await r.json(loads=json_codec.loads)
                             stats = {
                                 'balance': 0.0, 'unconfirmed': 0.0, 
                                 'total_tx': 0, 'total_received': 0.0,
@@ -170,7 +170,7 @@ class Tools(commands.Cog):
                 try:
                     async with session.get(url, timeout=5) as r:
                         if r.status == 200:
-                            data = await r.json()
+                            data = await r.json(loads=json_codec.loads)
                             stats = {
                                 'balance': 0.0, 'unconfirmed': 0.0, 
                                 'total_tx': 0, 'total_received': 0.0, 
@@ -399,7 +399,7 @@ class Tools(commands.Cog):
                 try:
                     async with session.get(url, timeout=5) as r:
                          if r.status == 200:
-                             data = await r.json()
+                             data = await r.json(loads=json_codec.loads)
                              # Normalize data to resemble RPC 'getrawtransaction' verbose output
                              
                              if "outputs" in data: # Blockcypher
@@ -452,11 +452,8 @@ class Tools(commands.Cog):
         """Fetch EVM transaction details with block info using AsyncWeb3."""
         for rpc in rpc_urls:
             try:
-                w3 = AsyncWeb3(AsyncHTTPProvider(rpc, request_kwargs={"timeout": 5}))
-                
-                if not await w3.is_connected():
-                    continue
-                    
+                w3 = await evm_providers.get(rpc, timeout=5)
+
                 tx = await w3.eth.get_transaction(txid)
                 receipt = await w3.eth.get_transaction_receipt(txid)
                 
@@ -510,7 +507,7 @@ class Tools(commands.Cog):
                 async with aiohttp.ClientSession() as session:
                     async with session.post(url, json=payload, timeout=5) as r:
                          if r.status == 200:
-                             data = await r.json()
+                             data = await r.json(loads=json_codec.loads)
                              if "result" in data and data["result"]:
                                  return data["result"]
             except Exception:
@@ -532,7 +529,7 @@ class Tools(commands.Cog):
                 try:
                     async with session.get(url, timeout=5) as r:
                         if r.status == 200:
-                            return await r.json()
+                            return await r.json(loads=json_codec.loads)
                 except:
                     continue
         return None
@@ -841,7 +838,7 @@ class Tools(commands.Cog):
                                 if hasattr(b_num, 'hex'): b_num = int(b_num.hex(), 16)
                                 for rpc_node in rpc_urls:
                                     try:
-                                        w_node = AsyncWeb3(AsyncHTTPProvider(rpc_node, request_kwargs={"timeout": 3}))
+                                        w_node = await evm_providers.get(rpc_node, timeout=3)
                                         b_data = await w_node.eth.get_block(b_num)
                                         ts = b_data.get('timestamp') or b_data['timestamp']
                                         if ts:
@@ -949,7 +946,7 @@ class Tools(commands.Cog):
         currency = mapping.get(currency, currency)
         if currency == 'usdt': currency = 'usdt_bep20'
 
-        tracking_service.add_tracking(interaction.user.id, txid, currency, confirmations)
+        await async_db.tracking.add_tracking(interaction.user.id, txid, currency, confirmations)
         
         embed = discord.Embed(
             title="🎯 Transaction Tracking Started",
@@ -965,7 +962,7 @@ class Tools(commands.Cog):
     @tasks.loop(minutes=1)
     async def check_tracked_transactions(self):
         """Background task to monitor confirmations for tracked transactions."""
-        pending = tracking_service.get_all_pending_tracking()
+        pending = await async_db.tracking.get_all_pending_tracking()
         if not pending:
             return
 
@@ -1033,7 +1030,7 @@ class Tools(commands.Cog):
                         logger.error(f"Failed to notify user {user_id}: {e}")
                     
                     # Mark as completed
-                    tracking_service.update_tracking_status(track['id'], 'completed')
+                    await async_db.tracking.update_tracking_status(track['id'], 'completed')
                     
             except Exception as e:
                 logger.error(f"Error checking tracking {track['id']}: {e}")
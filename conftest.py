@@ -0,0 +1,10 @@
+import os
+import tempfile
+
+def pytest_configure(config):
+    # database.py and the services package open rainyday.db in the working directory
+    # on import, so tests run from a scratch directory instead of the checkout
+    os.chdir(tempfile.mkdtemp(prefix="rainybot-tests-"))
+
+def pytest_unconfigure(config):
+    os.chdir(config.invocation_params.dir)
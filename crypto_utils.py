@@ -4,6 +4,7 @@ from web3 import Web3
 from eth_account import Account
 from bitcoinrpc.authproxy import AuthServiceProxy
 import config
+from services.evm_provider import evm_providers
 
 def dbg(msg):
     # Consider using proper logging later
@@ -38,7 +39,6 @@ async def rpc_async(method, *params):
 
 async def get_gas_balance(address, currency):
     """Return BNB (for BEP20) or MATIC (for Polygon) balance using AsyncWeb3"""
-    from web3 import AsyncWeb3, AsyncHTTPProvider
     try:
         rpc_urls = []
         if currency == "usdt_bep20":
@@ -50,9 +50,7 @@ async def get_gas_balance(address, currency):
 
         for rpc in rpc_urls:
             try:
-                w3 = AsyncWeb3(AsyncHTTPProvider(rpc, request_kwargs={"timeout": 5}))
-                if not await w3.is_connected():
-                    continue
+                w3 = await evm_providers.get(rpc, timeout=5)
                 bal = await w3.eth.get_balance(Web3.to_checksum_address(address))
                 return float(w3.from_wei(bal, 'ether'))
             except:
@@ -64,13 +62,10 @@ async def get_gas_balance(address, currency):
 
 async def get_eth_balance_parallel(address):
     """Get ETH balance from multiple RPCs in parallel (Async)."""
-    from web3 import AsyncWeb3, AsyncHTTPProvider
     
     async def fetch_balance(rpc_url):
         try:
-            w3 = AsyncWeb3(AsyncHTTPProvider(rpc_url, request_kwargs={"timeout": 5}))
-            if not await w3.is_connected():
-                return None
+            w3 = await evm_providers.get(rpc_url, timeout=5)
             balance_wei = await w3.eth.get_balance(Web3.to_checksum_address(address))
             return float(balance_wei / (10 ** 18))
         except Exception as e:
@@ -91,14 +86,11 @@ async def get_eth_balance_parallel(address):
 
 async def get_last_eth_txhash(address):
     """Get last incoming ETH transaction hash using AsyncWeb3"""
-    from web3 import AsyncWeb3, AsyncHTTPProvider
     address_checksum = Web3.to_checksum_address(address)
     
     async def fetch_last_tx(rpc_url):
         try:
-            w3 = AsyncWeb3(AsyncHTTPProvider(rpc_url, request_kwargs={"timeout": 5}))
-            if not await w3.is_connected():
-                return None
+            w3 = await evm_providers.get(rpc_url, timeout=5)
             
             latest_block = await w3.eth.block_number
             start_block = max(0, latest_block - 20)
@@ -128,15 +120,12 @@ async def get_last_eth_txhash(address):
 
 async def send_eth(private_key, to_address, amount_eth=None):
     """Sends ETH using AsyncWeb3."""
-    from web3 import AsyncWeb3, AsyncHTTPProvider
     account = Account.from_key(private_key)
     from_address = account.address
 
     for rpc_url in config.ETH_RPC_URLS:
         try:
-            w3 = AsyncWeb3(AsyncHTTPProvider(rpc_url, request_kwargs={"timeout": 10}))
-            if not await w3.is_connected():
-                continue
+            w3 = await evm_providers.get(rpc_url, timeout=10)
 
             balance = await w3.eth.get_balance(from_address)
             from services.nonce_manager import nonce_manager
@@ -181,21 +170,15 @@ async def send_eth(private_key, to_address, amount_eth=None):
 
 async def estimate_required_gas(contract_address, private_key, to_address, amount, rpc_urls, decimals):
     """Estimate gas using AsyncWeb3."""
-    from web3 import AsyncWeb3, AsyncHTTPProvider
     account = Account.from_key(private_key)
     from_addr = account.address
     amount_wei = int(amount * (10 ** decimals))
 
     for rpc in rpc_urls:
         try:
-            w3 = AsyncWeb3(AsyncHTTPProvider(rpc, request_kwargs={"timeout": 5}))
-            if not await w3.is_connected():
-                continue
+            w3 = await evm_providers.get(rpc, timeout=5)
 
-            contract = w3.eth.contract(
-                address=w3.to_checksum_address(contract_address),
-                abi=config.USDT_ABI
-            )
+            contract = evm_providers.contract(w3, contract_address, config.USDT_ABI)
 
             nonce = await w3.eth.get_transaction_count(from_addr)
 
@@ -220,15 +203,12 @@ async def estimate_required_gas(contract_address, private_key, to_address, amoun
 
 async def send_native_chain_generic(private_key, to_address, amount_native, rpc_urls, chain_id):
     """Sends native token using AsyncWeb3."""
-    from web3 import AsyncWeb3, AsyncHTTPProvider
     account = Account.from_key(private_key)
     from_address = account.address
 
     for rpc_url in rpc_urls:
         try:
-            w3 = AsyncWeb3(AsyncHTTPProvider(rpc_url, request_kwargs={"timeout": 10}))
-            if not await w3.is_connected():
-                continue
+            w3 = await evm_providers.get(rpc_url, timeout=10)
 
             balance = await w3.eth.get_balance(from_address)
             from services.nonce_manager import nonce_manager
@@ -2,31 +2,34 @@ import json
 import logging
 import time
 from services.db_manager import db
+from services.deal_store import DealStore
+from services.deal_model import Deal
+from services.deal_writer import DealWriteBehind, DealVersionConflict, DealBatchConflict
+from services.deal_journal import deal_journal, SECRET_FIELDS
+from services.schema_migrations import HOT_DEAL_FIELDS
+from services.async_db import async_db
+from services.global_stats import global_stats, TOTAL_VOLUME, TOTAL_DEALS, USER_COUNT
+from services.leaderboard_service import leaderboard_service
+from utils.cache import TTLCache
+from utils import json_codec
+from services.deal_counter import deal_counter
 
 logger = logging.getLogger("Database")
 
 # --- Performance Caching Layer ---
-class SimpleCache:
-    def __init__(self, ttl=60):
-        self.cache = {}
-        self.ttl = ttl
-
-    def get(self, key):
-        if key in self.cache:
-            data, timestamp = self.cache[key]
-            if time.time() - timestamp < self.ttl:
-                return data
-        return None
+# Bounded LRU+TTL cache for per-user reads; entries are tagged "user:<id>" and
+# dropped by every write path that touches that user's row
+USER_STATS_CACHE = TTLCache("user_stats", maxsize=2048, ttl=60)
 
-    def set(self, key, data):
-        self.cache[key] = (data, time.time())
+def user_cache_tag(user_id):
+    return f"user:{user_id}"
 
-# TTL Caches for high-frequency queries
-STATS_CACHE = SimpleCache(ttl=60)      # Cache user stats for 60s
-LEADERBOARD_CACHE = SimpleCache(ttl=300) # Cache leaderboard for 5m
+def invalidate_user_stats(user_id):
+    """Drop every cached read of this user's stats (call after writing their users row)."""
+    USER_STATS_CACHE.invalidate_tag(user_cache_tag(user_id))
 
 # --- Global Memory Cache ---
-GLOBAL_DEAL_CACHE = None
+GLOBAL_DEAL_CACHE = None # DealStore once loaded (dict with channel/address/participant/status indexes)
 cache_lock = None # Initialize lazily
 
 def create_deal_id(length: int = 64, prefix: str = ""):
@@ -36,9 +39,20 @@ def create_deal_id(length: int = 64, prefix: str = ""):
     deal_id = ''.join(secrets.choice(charset) for _ in range(length))
     return f"{prefix}{deal_id}" if prefix else deal_id
 
-def _row_to_dict(row):
-    """Convert DB row to deal dictionary"""
-    # Row: (deal_id, channel_id, buyer_id, seller_id, amount, currency, status, created_at, other_data)
+# Column order shared by every deals SELECT/INSERT (hot fields follow the legacy 9 columns)
+DEAL_COLUMNS = ("deal_id", "channel_id", "buyer_id", "seller_id", "amount", "currency", "status", "created_at", "other_data") + tuple(HOT_DEAL_FIELDS) + ("version",)
+DEAL_SELECT = f"SELECT {', '.join(DEAL_COLUMNS)} FROM deals"
+ARCHIVE_SELECT = f"SELECT {', '.join(DEAL_COLUMNS)}, archived_at FROM deals_archive"
+
+# Closed deals in these statuses are moved to deals_archive at startup once idle this long
+FINAL_STATUSES = ("released", "refunded", "cancelled", "completed")
+ARCHIVE_AFTER = 24 * 3600
+# Deal fields where another writer's change wins over a pending local edit
+MONEY_FIELDS = frozenset({"status", "paid"})
+
+def _row_to_dict(row, factory=dict):
+    """Convert DB row to deal dictionary (or a services.deal_model.Deal with factory=Deal)"""
+    # Row: (deal_id, channel_id, buyer_id, seller_id, amount, currency, status, created_at, other_data, *HOT_DEAL_FIELDS, version)
     if not row:
         return None
         
@@ -50,7 +64,8 @@ def _row_to_dict(row):
         "amount": row[4],
         "currency": row[5],
         "status": row[6],
-        "start_time": row[7]
+        "start_time": row[7],
+        "version": row[9 + len(HOT_DEAL_FIELDS)] or 0
     }
     
     other_data = row[8] if row[8] else {}
@@ -58,56 +73,149 @@ def _row_to_dict(row):
     # If it's a string (SQLite), parse it.
     if isinstance(other_data, str):
         try:
-            other_data = json.loads(other_data)
+            other_data = json_codec.loads(other_data)
         except:
             other_data = {}
+
+    # Promoted columns; NULL means the deal never had the field
+    for field, value in zip(HOT_DEAL_FIELDS, row[9:]):
+        if value is not None:
+            other_data[field] = bool(value) if field == "paid" else value
             
-    full_data = {**other_data, **base_data}
-    return full_data
+    return factory(other_data, **base_data)
 
 def load_all_data():
     global GLOBAL_DEAL_CACHE
     if GLOBAL_DEAL_CACHE is not None:
         return GLOBAL_DEAL_CACHE
 
+    data = _warm_start()
+    if data is None:
+        # Keep the live table (and this cache) limited to deals that can still change
+        try:
+            archive_stale_deals()
+        except Exception as e:
+            logger.error(f"Deal archive sweep failed: {e}")
+
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(DEAL_SELECT)
+            rows = cursor.fetchall()
+            if db.db_type == "sqlite":
+                cursor.close()
+            
+        data = DealStore()
+        for row in rows:
+            deal = _row_to_dict(row, Deal)
+            if deal:
+                data.load(deal.deal_id, deal)
+        deal_journal.reset(data)
+
+    GLOBAL_DEAL_CACHE = data
+    deal_writer.attach(data)
+    return data
+
+def _deal_fingerprint():
+    """(row count, version sum) of the live table; any write to it changes one of them."""
     with db.get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT deal_id, channel_id, buyer_id, seller_id, amount, currency, status, created_at, other_data FROM deals")
-        rows = cursor.fetchall()
+        cursor.execute("SELECT COUNT(*), COALESCE(SUM(version), 0) FROM deals")
+        count, versions = cursor.fetchone()
         if db.db_type == "sqlite":
             cursor.close()
-            
-        data = {}
-        for row in rows:
-            deal_dict = _row_to_dict(row)
-            if deal_dict:
-                data[deal_dict['deal_id']] = deal_dict
-        
-        GLOBAL_DEAL_CACHE = data
-        return data
+    return int(count), int(versions)
+
+def _load_deal_secrets(state):
+    """Put SECRET_FIELDS (kept out of the snapshot files) back into restored deals."""
+    for field in SECRET_FIELDS:
+        if db.db_type == "sqlite":
+            expr = f"json_extract(other_data, '$.{field}')"
+        else:
+            expr = f"other_data->>'{field}'"
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT deal_id, {expr} FROM deals WHERE {expr} IS NOT NULL")
+            rows = cursor.fetchall()
+            if db.db_type == "sqlite":
+                cursor.close()
+        for deal_id, value in rows:
+            deal = state.get(deal_id)
+            if deal is not None:
+                deal[field] = value
+
+def _warm_start():
+    """
+    DealStore rebuilt from the snapshot + journal (services/deal_journal.py),
+    or None when there is none or it no longer matches the deals table.
+    """
+    state = deal_journal.restore()
+    if state is None:
+        return None
+    try:
+        expected = (len(state), sum(int(deal.get("version") or 0) for deal in state.values()))
+        actual = _deal_fingerprint()
+    except Exception as e:
+        logger.error(f"Deal fingerprint check failed: {e}")
+        return None
+    if expected != actual:
+        logger.info(f"Deal snapshot is stale ({expected} vs DB {actual}); doing a full load.")
+        return None
+    try:
+        _load_deal_secrets(state)
+    except Exception as e:
+        logger.error(f"Deal key reload failed: {e}")
+        return None
+
+    data = DealStore()
+    for deal_id, deal in state.items():
+        data.load(deal_id, deal)
+    try:
+        # Same sweep as a full load, applied to the restored deals
+        for deal_id in archive_stale_deals():
+            dict.pop(data, deal_id, None)
+            data.reindex(deal_id)
+    except Exception as e:
+        logger.error(f"Deal archive sweep failed: {e}")
+    return data
 
 def save_all_data(data):
-    """Save all data to DB (Background)"""
+    """Persist changed deals (write-behind; money-critical changes are flushed synchronously)"""
     global GLOBAL_DEAL_CACHE
-    GLOBAL_DEAL_CACHE = data
-    
-    import threading
-    def _bg_save():
-        try:
-            # Use list(data.items()) to avoid "dictionary changed size during iteration"
-            items_snapshot = list(data.items())
-            with db.session() as conn:
-                cursor = conn.cursor()
-                for deal_id, info in items_snapshot:
-                    _upsert_deal_cursor(cursor, deal_id, info)
-                if db.db_type == "sqlite":
-                    cursor.close()
-        except Exception as e:
-            logger.error(f"Background save_all_data failed: {e}")
+    if GLOBAL_DEAL_CACHE is None:
+        GLOBAL_DEAL_CACHE = DealStore()
+        deal_writer.attach(GLOBAL_DEAL_CACHE)
 
-    threading.Thread(target=_bg_save, daemon=True).start()
+    # Callers usually pass the store itself after in-place edits, which the deals
+    # have already reported; plain dicts in another mapping are copied into the store
+    GLOBAL_DEAL_CACHE.replace_all(data)
+    _persist_changes()
 
-def _upsert_deal_cursor(cursor, deal_id, info):
+def _persist_changes():
+    """Flush now if a money-critical transition is pending, otherwise let the writer batch it."""
+    if deal_writer.has_critical():
+        deal_writer.flush()
+    else:
+        deal_writer.request_flush()
+
+def flush_deals(deal_ids=None):
+    """Synchronously persist pending deal changes (all, or only `deal_ids`)."""
+    if GLOBAL_DEAL_CACHE is None:
+        return True
+    return deal_writer.flush(deal_ids)
+
+_DEAL_SCHEMA_KEYS = {"deal_id", "channel_id", "buyer", "seller", "amount", "currency", "start_time", "status", "version"}
+
+def _hot_column_value(field, value):
+    """Value for a promoted column, or None if it doesn't fit the column type (it then stays in other_data)."""
+    if field == "paid":
+        return value if isinstance(value, bool) else None
+    if field == "address":
+        return value if isinstance(value, str) else None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+def _deal_row_params(deal_id, info):
     channel_id = str(info.get("channel_id"))
     buyer = info.get("buyer")
     seller = info.get("seller")
@@ -116,111 +224,336 @@ def _upsert_deal_cursor(cursor, deal_id, info):
     created_at = info.get("start_time")
     status = info.get("status", "active")
     
-    schema_keys = {"deal_id", "channel_id", "buyer", "seller", "amount", "currency", "start_time", "status"}
-    other_data = {k: v for k, v in info.items() if k not in schema_keys}
+    other_data = {k: v for k, v in info.items() if k not in _DEAL_SCHEMA_KEYS}
+    hot_values = []
+    for field in HOT_DEAL_FIELDS:
+        value = _hot_column_value(field, other_data.get(field))
+        if value is not None:
+            del other_data[field]
+        hot_values.append(value)
     
     # Handle JSON serialization based on DB type
     if db.db_type == "postgres":
         from psycopg2.extras import Json
-        json_val = Json(other_data)
+        json_val = Json(other_data, dumps=json_codec.dumps)
     else:
-        json_val = json.dumps(other_data)
+        json_val = json_codec.dumps(other_data)
+
+    return (deal_id, channel_id, buyer, seller, amount, currency, status, created_at, json_val, *hot_values, int(info.get("version") or 0))
 
+def _deal_upsert_sql():
+    columns = ", ".join(DEAL_COLUMNS)
+    placeholders = ", ".join([db.p] * len(DEAL_COLUMNS))
     if db.db_type == "sqlite":
         # Use INSERT OR REPLACE for SQLite to handle all unique constraints (deal_id and channel_id)
-        cursor.execute(f"""
-            INSERT OR REPLACE INTO deals (deal_id, channel_id, buyer_id, seller_id, amount, currency, status, created_at, other_data)
-            VALUES ({db.p}, {db.p}, {db.p}, {db.p}, {db.p}, {db.p}, {db.p}, {db.p}, {db.p})
-        """, (deal_id, channel_id, buyer, seller, amount, currency, status, created_at, json_val))
-    else:
-        # Postgres UPSERT
-        cursor.execute(f"""
-            INSERT INTO deals (deal_id, channel_id, buyer_id, seller_id, amount, currency, status, created_at, other_data)
-            VALUES ({db.p}, {db.p}, {db.p}, {db.p}, {db.p}, {db.p}, {db.p}, {db.p}, {db.p})
+        return f"""
+            INSERT OR REPLACE INTO deals ({columns})
+            VALUES ({placeholders})
+        """
+    # Postgres UPSERT
+    updates = ",\n                ".join(f"{col}=EXCLUDED.{col}" for col in DEAL_COLUMNS[1:])
+    return f"""
+            INSERT INTO deals ({columns})
+            VALUES ({placeholders})
             ON CONFLICT(deal_id) DO UPDATE SET
-                channel_id=EXCLUDED.channel_id,
-                buyer_id=EXCLUDED.buyer_id,
-                seller_id=EXCLUDED.seller_id,
-                amount=EXCLUDED.amount,
-                currency=EXCLUDED.currency,
-                status=EXCLUDED.status,
-                created_at=EXCLUDED.created_at,
-                other_data=EXCLUDED.other_data
-        """, (deal_id, channel_id, buyer, seller, amount, currency, status, created_at, json_val))
+                {updates}
+        """
 
-def save_deal_field_sync(deal_id, field, value):
-    """Synchronously updates a single field of a deal in the DB and cache."""
-    global GLOBAL_DEAL_CACHE
-    data = load_all_data()
-    if deal_id not in data:
-        return False
-        
-    data[deal_id][field] = value
-    GLOBAL_DEAL_CACHE = data
-    
-    try:
-        with db.session() as conn:
-            cursor = conn.cursor()
-            _upsert_deal_cursor(cursor, deal_id, data[deal_id])
-            if db.db_type == "sqlite":
-                cursor.close()
-        return True
-    except Exception as e:
-        logger.error(f"Sync save failed for {deal_id}.{field}: {e}")
-        return False
+# Deal keys stored in their own column (key -> column); everything else lives in other_data
+_FIELD_COLUMNS = {
+    "channel_id": "channel_id", "buyer": "buyer_id", "seller": "seller_id", "amount": "amount",
+    "currency": "currency", "start_time": "created_at", "status": "status",
+}
 
-def load_counter():
-    # Sync with counter.json (User Request: "old stats")
-    file_val = 0
-    try:
-        import os
-        if os.path.exists("counter.json"):
-            with open("counter.json", "r") as f:
-                content = f.read().strip()
-                if content:
-                    file_val = int(content)
-    except Exception as e:
-        logger.error(f"Failed to read counter.json: {e}")
+def _json_path(field):
+    return '$."' + field.replace('"', '\\"') + '"'
 
-    db_val = 0
-    with db.get_connection() as conn:
+def _deal_patch_statement(deal_id, fields, removed=(), table="deals", expected_version=None):
+    """
+    (sql, params) for an in-place UPDATE of only `fields` (and deletion of
+    `removed` keys). Columns are set directly; JSON keys are patched
+    server-side with json_set/json_remove (SQLite) or ||/- (Postgres).
+    The row version is bumped; with `expected_version` the UPDATE only
+    applies if the row is still at that version (rowcount 0 otherwise).
+    Returns (None, None) if there is nothing to write.
+    """
+    sets, params = [], []
+    json_set, json_del = {}, []
+    for field, value in fields.items():
+        if field in ("deal_id", "version"):
+            continue
+        if field in _FIELD_COLUMNS:
+            sets.append(f"{_FIELD_COLUMNS[field]} = {db.p}")
+            params.append(str(value) if field == "channel_id" else value)
+        elif field in HOT_DEAL_FIELDS:
+            col_value = _hot_column_value(field, value)
+            sets.append(f"{field} = {db.p}")
+            params.append(col_value)
+            if col_value is None:
+                json_set[field] = value # Doesn't fit the column type; keep it in the JSON
+            else:
+                json_del.append(field)
+        else:
+            json_set[field] = value
+    for field in removed:
+        if field in ("deal_id", "version"):
+            continue
+        if field in _FIELD_COLUMNS or field in HOT_DEAL_FIELDS:
+            sets.append(f"{_FIELD_COLUMNS.get(field, field)} = NULL")
+        if field not in _FIELD_COLUMNS:
+            json_del.append(field)
+
+    if json_set or json_del:
+        if db.db_type == "sqlite":
+            expr = "COALESCE(other_data, '{}')"
+            if json_del:
+                expr = f"json_remove({expr}, {', '.join([db.p] * len(json_del))})"
+                params.extend(_json_path(field) for field in json_del)
+            if json_set:
+                pairs = ", ".join(f"{db.p}, json({db.p})" for _ in json_set)
+                expr = f"json_set({expr}, {pairs})"
+                for field, value in json_set.items():
+                    params.extend((_json_path(field), json_codec.dumps(value)))
+        else:
+            from psycopg2.extras import Json
+            expr = "COALESCE(other_data, '{}'::jsonb)"
+            if json_del:
+                expr = f"({expr} - {db.p}::text[])"
+                params.append(json_del)
+            if json_set:
+                expr = f"({expr} || {db.p})"
+                params.append(Json(json_set, dumps=json_codec.dumps))
+        sets.append(f"other_data = {expr}")
+
+    if not sets:
+        return None, None
+    sets.append("version = version + 1")
+    if expected_version is None:
+        return f"UPDATE {table} SET {', '.join(sets)} WHERE deal_id = {db.p}", (*params, deal_id)
+    return f"UPDATE {table} SET {', '.join(sets)} WHERE deal_id = {db.p} AND version = {db.p}", (*params, deal_id, expected_version)
+
+def _fetch_versions(cursor, deal_ids):
+    if not deal_ids:
+        return {}
+    cursor.execute(
+        f"SELECT deal_id, version FROM deals WHERE deal_id IN ({', '.join([db.p] * len(deal_ids))})",
+        tuple(deal_ids)
+    )
+    return {row[0]: row[1] or 0 for row in cursor.fetchall()}
+
+def _archive_upsert_sql():
+    columns = ", ".join(DEAL_COLUMNS) + ", archived_at"
+    placeholders = ", ".join([db.p] * (len(DEAL_COLUMNS) + 1))
+    if db.db_type == "sqlite":
+        return f"INSERT OR REPLACE INTO deals_archive ({columns}) VALUES ({placeholders})"
+    updates = ", ".join(f"{col}=EXCLUDED.{col}" for col in DEAL_COLUMNS[1:] + ("archived_at",))
+    return f"INSERT INTO deals_archive ({columns}) VALUES ({placeholders}) ON CONFLICT(deal_id) DO UPDATE SET {updates}"
+
+def _upsert_deal_cursor(cursor, deal_id, info):
+    cursor.execute(_deal_upsert_sql(), _deal_row_params(deal_id, info))
+
+def _write_deal_batch(items, removed=(), status_deltas=None):
+    """
+    Write (deal_id, snapshot, fields) triples in a single transaction.
+    Deals with a `fields` set are patched in place; `fields=None` rewrites
+    the whole row. `snapshot["version"]` is the version last written by
+    this process (None for new deals) and every write is a compare-and-swap
+    against it: if any row was changed by someone else, DealBatchConflict is
+    raised and the transaction rolls back, so the writer can reload and merge
+    those deals (_merge_conflicted_deal) before retrying. `removed` deals were closed: their final state
+    goes to deals_archive and the live row is deleted; deals written to
+    `deals` for the first time drop any deals_archive row. `status_deltas`
+    ({status: +/-n}) keeps the global_stats per-status counts in step.
+
+    Returns {deal_id: new row version}.
+    """
+    versions = {}
+    full_rows = []
+    patches = []
+    for deal_id, info, fields in items:
+        if fields is None or info.get("version") is None:
+            full_rows.append((deal_id, info))
+        else:
+            patches.append((deal_id, info, {f: info[f] for f in fields if f in info}, [f for f in fields if f not in info]))
+
+    with db.session() as conn:
         cursor = conn.cursor()
-        cursor.execute(f"SELECT value FROM config WHERE key={db.p}", ('deal_counter',))
-        row = cursor.fetchone()
+        conflicts = []
+        unresolved = []
+        for deal_id, info, fields, gone in patches:
+            sql, params = _deal_patch_statement(deal_id, fields, gone, expected_version=info["version"])
+            if sql is None:
+                continue
+            cursor.execute(sql, params)
+            if cursor.rowcount:
+                versions[deal_id] = info["version"] + 1
+            else:
+                unresolved.append((deal_id, info, fields, gone))
+
+        if unresolved:
+            current = _fetch_versions(cursor, [deal_id for deal_id, *_ in unresolved])
+            for deal_id, info, fields, gone in unresolved:
+                if deal_id not in current:
+                    full_rows.append((deal_id, info)) # Row vanished (manual delete/restore); rewrite in full
+                    continue
+                conflicts.append(DealVersionConflict(deal_id, info["version"], current[deal_id]))
+
+        if full_rows:
+            current = _fetch_versions(cursor, [deal_id for deal_id, _ in full_rows])
+            params = []
+            for deal_id, info in full_rows:
+                expected = info.get("version")
+                stored = current.get(deal_id)
+                if expected is not None and stored is not None and stored != expected:
+                    conflicts.append(DealVersionConflict(deal_id, expected, stored))
+                    continue
+                versions[deal_id] = (stored or 0) + 1
+                params.append(_deal_row_params(deal_id, {**info, "version": versions[deal_id]}))
+            cursor.executemany(_deal_upsert_sql(), params)
+            # New live rows (e.g. /recover) leave the archive in the same transaction
+            restored = [(deal_id,) for deal_id, _ in full_rows if deal_id not in current]
+            if restored:
+                cursor.executemany(f"DELETE FROM deals_archive WHERE deal_id = {db.p}", restored)
+        if conflicts:
+            raise DealBatchConflict(conflicts) # Rolls back the whole batch
+        if removed:
+            now = time.time()
+            cursor.executemany(_archive_upsert_sql(), [_deal_row_params(deal_id, info) + (now,) for deal_id, info in removed])
+            cursor.executemany(f"DELETE FROM deals WHERE deal_id = {db.p}", [(deal_id,) for deal_id, _ in removed])
+        if status_deltas:
+            global_stats.bump_statuses(cursor, status_deltas)
         if db.db_type == "sqlite":
             cursor.close()
-        if row:
-            db_val = int(row[0])
-    
-    # Return max value and ensure DB is synced
-    final_val = max(file_val, db_val)
-    
-    # If file was higher, update DB
-    if file_val > db_val:
-        save_counter(final_val) # This will update DB and overwrite file again (safe)
-        
-    return final_val
+    return versions
 
-def save_counter(counter):
-    # Save to DB
+def archive_stale_deals(max_age=ARCHIVE_AFTER):
+    """
+    Move finalized deals idle for `max_age` seconds from deals to deals_archive.
+    Runs before the cache is loaded; live deals are archived by the writer when they close.
+    Returns the archived deal ids.
+    """
+    cutoff = time.time() - max_age
+    statuses = ", ".join([db.p] * len(FINAL_STATUSES))
+    where = f"status IN ({statuses}) AND COALESCE(last_activity, created_at, 0) < {db.p}"
+    params = (*FINAL_STATUSES, cutoff)
+    columns = ", ".join(DEAL_COLUMNS)
+    conflict = "" if db.db_type == "sqlite" else " ON CONFLICT(deal_id) DO NOTHING"
+    insert = "INSERT OR REPLACE INTO" if db.db_type == "sqlite" else "INSERT INTO"
     with db.session() as conn:
         cursor = conn.cursor()
+        cursor.execute(f"SELECT deal_id, status FROM deals WHERE {where}", params)
+        stale = cursor.fetchall()
+        status_counts = {}
+        for _, status in stale:
+            status_counts[status] = status_counts.get(status, 0) - 1
+        global_stats.bump_statuses(cursor, status_counts)
         cursor.execute(f"""
-            INSERT INTO config (key, value) VALUES ({db.p}, {db.p})
-            ON CONFLICT (key) DO UPDATE SET value = excluded.value
-        """ if db.db_type == "sqlite" else f"""
-            INSERT INTO config (key, value) VALUES ({db.p}, {db.p})
-            ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
-        """, ('deal_counter', str(counter)))
+            {insert} deals_archive ({columns}, archived_at)
+            SELECT {columns}, {db.p} FROM deals WHERE {where}{conflict}
+        """, (time.time(), *params))
+        cursor.execute(f"DELETE FROM deals WHERE {where}", params)
+        moved = cursor.rowcount
         if db.db_type == "sqlite":
             cursor.close()
-            
-    # Save to counter.json
-    try:
-        with open("counter.json", "w") as f:
-            f.write(str(counter))
-    except Exception as e:
-        logger.error(f"Failed to write counter.json: {e}")
+    if moved:
+        logger.info(f"Archived {moved} finalized deals.")
+    archived = [deal_id for deal_id, _ in stale]
+    deal_journal.record_close(archived)
+    return archived
+
+def _merge_conflicted_deal(deal_id, fields):
+    """
+    Reload a deal another writer changed and fold the pending local edits
+    (`fields`, or None when unknown) into it. The stored row wins for every
+    field not edited here, and for status/paid if the other writer moved
+    them. Returns the fields still to write.
+    """
+    data = GLOBAL_DEAL_CACHE
+    deal = data.get(deal_id) if data is not None else None
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"{DEAL_SELECT} WHERE deal_id = {db.p}", (deal_id,))
+        row = cursor.fetchone()
+        if db.db_type == "sqlite":
+            cursor.close()
+    fresh = _row_to_dict(row)
+    if fresh is None or deal is None:
+        return fields
+
+    local = deal.to_dict()
+    if fields is None:
+        fields = {k for k in set(local) | set(fresh) if k != "version" and local.get(k) != fresh.get(k)}
+    persisted = deal_writer.persisted_money_state(deal_id)
+    if persisted is not None and (fresh.get("status"), bool(fresh.get("paid"))) != persisted:
+        dropped = fields & MONEY_FIELDS
+        if dropped:
+            logger.error(f"Deal {deal_id} money state was changed by another writer ({persisted} -> "
+                         f"{fresh.get('status')}, paid={bool(fresh.get('paid'))}); discarding local {', '.join(sorted(dropped))}")
+        fields = fields - MONEY_FIELDS
+
+    merged = dict(fresh)
+    for field in fields:
+        if field in local:
+            merged[field] = local[field]
+        else:
+            merged.pop(field, None)
+    with deal_writer.exclusive():
+        deal.replace(merged, notify=False)
+        data.reindex(deal_id)
+        deal_writer.mark_persisted(deal_id, fresh)
+    logger.warning(f"Deal {deal_id} changed outside this process (now v{fresh['version']}); "
+                   f"merged, re-applying {', '.join(sorted(fields)) or 'nothing'}")
+    return fields
+
+deal_writer = DealWriteBehind(_write_deal_batch, executor=async_db.write_executor, journal=deal_journal,
+                              merge=_merge_conflicted_deal)
+
+def patch_deal(deal_id, fields, removed=()):
+    """
+    Synchronously persist a field-level change: `fields` ({key: value}) are
+    set and `removed` keys deleted, in the cache and in the DB, without
+    rebuilding or rewriting the rest of the row. Returns True on success.
+    """
+    data = load_all_data()
+    deal = data.get(deal_id)
+    if deal is None:
+        # Not cached (archived/closed deal): patch the stored row directly
+        sql, params = _deal_patch_statement(deal_id, fields, removed)
+        if not sql:
+            return True
+        try:
+            with db.session() as conn:
+                cursor = conn.cursor()
+                cursor.execute(sql, params)
+                updated = cursor.rowcount
+                if not updated:
+                    cursor.execute(*_deal_patch_statement(deal_id, fields, removed, table="deals_archive"))
+                    updated = cursor.rowcount
+                if db.db_type == "sqlite":
+                    cursor.close()
+            return updated > 0
+        except Exception as e:
+            logger.error(f"Patch failed for {deal_id}: {e}")
+            return False
+
+    for field, value in fields.items():
+        deal[field] = value
+    for field in removed:
+        deal.pop(field, None)
+
+    if deal_writer.flush([deal_id]):
+        return True
+    logger.error(f"Patch failed for {deal_id}: {', '.join((*fields, *removed))}")
+    return False
+
+def save_deal_field_sync(deal_id, field, value):
+    """Synchronously updates a single field of a deal in the DB and cache."""
+    return patch_deal(deal_id, {field: value})
+
+def load_counter():
+    """Last ticket number handed out (numbers are allocated by services.deal_counter)."""
+    deal_counter.warm()
+    return deal_counter.current()
 
 def get_deal_by_dealid(deal_id):
     """Fetch deal from cache (Fast)"""
@@ -228,27 +561,36 @@ def get_deal_by_dealid(deal_id):
     return data.get(deal_id)
 
 def get_deal_by_channel(channel_id):
-    """Fetch deal from cache by channel ID (Fast)"""
-    data = load_all_data()
-    cid_str = str(channel_id)
-    for deal_id, deal in data.items():
-        if str(deal.get('channel_id')) == cid_str:
-            return deal_id, deal
-    return None, None
+    """Fetch deal from cache by channel ID (Fast, indexed)"""
+    return load_all_data().find_by_channel(channel_id)
+
+def get_deals_by_participant(user_id):
+    """All cached deals where the user is buyer or seller (indexed)."""
+    return load_all_data().find_by_participant(user_id)
+
+def get_deals_by_status(*statuses):
+    """All cached deals currently in any of the given statuses (indexed)."""
+    return load_all_data().find_by_status(*statuses)
 
 def get_deal_by_address(address):
+    # Cached deals first (indexed), DB only for deals no longer in memory
+    deal_id, deal = load_all_data().find_by_address(address)
+    if deal_id:
+        return deal_id, deal
+
     with db.get_connection() as conn:
         cursor = conn.cursor()
         
-        if db.db_type == "postgres":
-             # Query: other_data ->> 'address' = ?
-            query = f"SELECT deal_id, channel_id, buyer_id, seller_id, amount, currency, status, created_at, other_data FROM deals WHERE other_data ->> 'address' = {db.p}"
-        else:
-             # SQLite: json_extract
-            query = f"SELECT deal_id, channel_id, buyer_id, seller_id, amount, currency, status, created_at, other_data FROM deals WHERE json_extract(other_data, '$.address') = {db.p}"
+        # Promoted column, index seek on idx_deals_address
+        query = f"{DEAL_SELECT} WHERE address = {db.p}"
 
         cursor.execute(query, (address,))
         row = cursor.fetchone()
+        if not row:
+            # Closed deals (e.g. late deposits to an old address)
+            cursor.execute(f"{ARCHIVE_SELECT} WHERE address = {db.p}", (address,))
+            archived = cursor.fetchone()
+            row = archived[:-1] if archived else None
         if db.db_type == "sqlite":
             cursor.close()
         if row:
@@ -256,30 +598,190 @@ def get_deal_by_address(address):
             return deal_dict['deal_id'], deal_dict
     return None, None
 
-def update_deal(channel_id, deal_data):
-    """Update deal in cache and DB synchronously for reliability"""
-    global GLOBAL_DEAL_CACHE
+# --- Archive (closed deals, queried on demand, never cached) ---
+def _archive_row_to_dict(row):
+    if not row:
+        return None
+    deal = _row_to_dict(row[:-1])
+    deal["archived_at"] = row[-1]
+    return deal
+
+def _query_archive(where, params, limit=None):
+    query = f"{ARCHIVE_SELECT} WHERE {where} ORDER BY archived_at DESC"
+    if limit:
+        query += f" LIMIT {int(limit)}"
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        if db.db_type == "sqlite":
+            cursor.close()
+    return [_archive_row_to_dict(row) for row in rows]
+
+def get_archived_deal(deal_id):
+    """Closed deal by ID, or None."""
+    rows = _query_archive(f"deal_id = {db.p}", (deal_id,), limit=1)
+    return rows[0] if rows else None
+
+def get_archived_deal_by_channel(channel_id):
+    rows = _query_archive(f"channel_id = {db.p}", (str(channel_id),), limit=1)
+    return (rows[0]["deal_id"], rows[0]) if rows else (None, None)
+
+def get_archived_deals_by_participant(user_id, limit=25, before=None):
+    """Closed deals of a user, newest first. Pass the last `archived_at` as `before` for the next page."""
+    uid = str(user_id)
+    where = f"(buyer_id = {db.p} OR seller_id = {db.p})"
+    params = [uid, uid]
+    if before is not None:
+        where += f" AND archived_at < {db.p}"
+        params.append(before)
+    return _query_archive(where, tuple(params), limit=limit)
+
+def find_deal(deal_id):
+    """Live deal from the cache, falling back to the archive."""
+    return get_deal_by_dealid(deal_id) or get_archived_deal(deal_id)
+
+def _cache_deal(channel_id, deal_data):
+    """Put a (possibly replaced) deal dict into the cache; returns its deal_id."""
     deal_id = deal_data.get("deal_id") or str(channel_id)
-    
-    # Update cache
     data = load_all_data()
+    current = data.get(deal_id)
+    if current is not None and current is not deal_data:
+        # Whole-deal replacement: a copy read before the last write would silently undo it
+        ours, cached = deal_data.get("version"), current.get("version")
+        if ours is not None and cached is not None and ours < cached:
+            deal_writer.stats["stale_writes"] += 1
+            logger.warning(f"Stale update of deal {deal_id} (v{ours} < v{cached}); newer changes may be overwritten")
+        if cached is not None:
+            deal_data["version"] = cached
+    # Re-assigning also refreshes the store's indexes and marks the deal dirty
     data[deal_id] = deal_data
-    GLOBAL_DEAL_CACHE = data
+    return deal_id
 
-    # Sync Save (small enough that sync is better for ACID)
-    try:
+def update_deal(channel_id, deal_data):
+    """Update deal in cache and queue it for the write-behind engine (critical transitions flush synchronously)"""
+    _cache_deal(channel_id, deal_data)
+    _persist_changes()
+
+# --- Optimistic concurrency (DealVersionConflict lives in services/deal_writer.py) ---
+def _apply_quietly(deal, fields, removed=()):
+    # Edit a cached deal without marking it dirty (the change is already stored)
+    for field, value in fields.items():
+        deal.set_quiet(field, value)
+    for field in removed:
+        deal.discard_quiet(field)
+
+def refresh_deal(deal_id):
+    """Reload a cached deal from its row (in place, so existing references stay valid)."""
+    data = load_all_data()
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"{DEAL_SELECT} WHERE deal_id = {db.p}", (deal_id,))
+        row = cursor.fetchone()
+        if db.db_type == "sqlite":
+            cursor.close()
+    fresh = _row_to_dict(row)
+    deal = data.get(deal_id)
+    if fresh is None or deal is None:
+        return fresh
+    with deal_writer.exclusive():
+        deal.replace(fresh, notify=False)
+        data.reindex(deal_id)
+        deal_writer.mark_persisted(deal_id, fresh)
+    return deal
+
+def compare_and_set_deal(deal_id, expected_version, fields, removed=()):
+    """
+    Persist `fields` (and delete `removed` keys) only if the deal is still at
+    `expected_version`, in the cache and in the DB. Returns the new version;
+    raises DealVersionConflict if anyone wrote the deal in between.
+    """
+    data = load_all_data()
+    with deal_writer.exclusive():
+        deal_writer.flush([deal_id]) # Pending edits count as a newer version
+        deal = data.get(deal_id)
+        if deal is None:
+            raise KeyError(deal_id)
+        cached = deal.get("version", 0)
+        if cached != expected_version:
+            raise DealVersionConflict(deal_id, expected_version, cached)
+
+        sql, params = _deal_patch_statement(deal_id, fields, removed, expected_version=expected_version)
+        if sql is None:
+            return expected_version
         with db.session() as conn:
             cursor = conn.cursor()
-            _upsert_deal_cursor(cursor, deal_id, deal_data)
+            cursor.execute(sql, params)
+            updated = cursor.rowcount
+            actual = None if updated else _fetch_versions(cursor, [deal_id]).get(deal_id)
+            if updated and "status" in fields and fields["status"] != deal.get("status"):
+                global_stats.bump_statuses(cursor, {deal.get("status"): -1, fields["status"]: 1})
             if db.db_type == "sqlite":
                 cursor.close()
-    except Exception as e:
-        logger.error(f"update_deal failed: {e}")
+        if not updated:
+            raise DealVersionConflict(deal_id, expected_version, actual)
+
+        new_version = expected_version + 1
+        _apply_quietly(deal, {**fields, "version": new_version}, removed)
+        data.reindex(deal_id)
+        deal_writer.mark_persisted(deal_id, deal)
+        return new_version
+
+def modify_deal(deal_id, mutator, retries=3):
+    """
+    Read-modify-write a deal with optimistic concurrency: `mutator(draft)`
+    edits a copy of the current deal, the changed fields are written with
+    compare_and_set_deal, and on conflict the deal is reloaded and the
+    mutator re-run. Returns the updated deal; raises DealVersionConflict
+    after `retries` failed attempts.
+    """
+    import copy
+    for attempt in range(retries + 1):
+        flush_deals([deal_id])
+        deal = get_deal_by_dealid(deal_id)
+        if deal is None:
+            raise KeyError(deal_id)
+        version = deal.get("version", 0)
+        draft = copy.deepcopy(dict(deal))
+        mutator(draft)
+        fields = {k: v for k, v in draft.items() if k != "version" and (k not in deal or deal[k] != v)}
+        removed = [k for k in deal if k not in draft and k != "version"]
+        try:
+            compare_and_set_deal(deal_id, version, fields, removed)
+            return deal
+        except DealVersionConflict:
+            if attempt == retries:
+                raise
+            refresh_deal(deal_id)
+
+class _TransitionSkipped(Exception):
+    pass
+
+def transition_deal(deal_id, fields, guard=None):
+    """
+    Money transition (paid / released / refunded) through modify_deal instead
+    of the write-behind: `fields` are written only if `guard(deal)` still
+    holds on the latest version, so two tasks racing on the same deal cannot
+    both apply it. Returns False (nothing written) when the guard fails.
+    """
+    def mutate(draft):
+        if guard is not None and not guard(draft):
+            raise _TransitionSkipped()
+        draft.update(fields)
+    try:
+        modify_deal(deal_id, mutate)
+        return True
+    except _TransitionSkipped:
+        return False
 
 # =====================================================
 # USER STATS (Leaderboard)
 # =====================================================
 
+def get_global_stats():
+    """Platform totals from the materialized global_stats counters (O(1), no users scan)."""
+    return global_stats.get()
+
 def load_user_stats():
     with db.get_connection() as conn:
         cursor = conn.cursor()
@@ -363,13 +865,24 @@ def update_user_stats(user_id: int, amount_usd: float, crypto_amount: float = 0.
                 first_seen = COALESCE(users.first_seen, {db.p})
         """, (uid, amount_usd, current_streak, highest_streak, today_str, xp_gain, json.dumps(deal_info), timestamp,
               amount_usd, current_streak, highest_streak, today_str, xp_gain, json.dumps(deal_info), timestamp))
+
+        # Materialized totals for the stats channels (same transaction)
+        global_stats.bump(cursor, {TOTAL_VOLUME: amount_usd, TOTAL_DEALS: 1, USER_COUNT: 0 if row else 1})
+
+        cursor.execute(f"SELECT deals_completed, volume_usd FROM users WHERE user_id = {db.p}", (uid,))
+        totals = cursor.fetchone()
         
         if db.db_type == "sqlite":
             cursor.close()
 
+    invalidate_user_stats(uid)
+    if totals:
+        leaderboard_service.update(uid, totals[1], totals[0])
+
 def get_gamified_stats(user_id):
     """Fetch all gamification data for a user with TTL caching."""
-    cached = STATS_CACHE.get(user_id)
+    cache_key = ("gamified", str(user_id))
+    cached = USER_STATS_CACHE.get(cache_key)
     if cached: return cached
 
     with db.get_connection() as conn:
@@ -409,8 +922,11 @@ def get_gamified_stats(user_id):
                 try:
                     # Comprehensive status list for completed deals
                     cursor.execute(f"""
-                        SELECT amount, currency, other_data, created_at 
-                        FROM deals 
+                        SELECT amount, currency, other_data, created_at FROM (
+                            SELECT amount, currency, other_data, created_at, buyer_id, seller_id, status FROM deals
+                            UNION ALL
+                            SELECT amount, currency, other_data, created_at, buyer_id, seller_id, status FROM deals_archive
+                        ) d
                         WHERE (buyer_id = {db.p} OR seller_id = {db.p}) 
                         AND status IN ('released', 'completed', 'awaiting_withdrawal') 
                         ORDER BY created_at DESC LIMIT 1
@@ -464,7 +980,7 @@ def get_gamified_stats(user_id):
                 "last_achievement": row[14]
             }
             if db.db_type == "sqlite": cursor.close()
-            STATS_CACHE.set(user_id, res)
+            USER_STATS_CACHE.set(cache_key, res, tags=(user_cache_tag(user_id),))
             return res
 
         if db.db_type == "sqlite": cursor.close()
@@ -504,6 +1020,7 @@ def update_user_metadata(user_id, chain=None, language=None, fast_deal=False):
 
         if fast_deal:
              cursor.execute(f"UPDATE users SET fast_deals = fast_deals + 1 WHERE user_id = {db.p}", (uid,))
+    invalidate_user_stats(uid)
 
 def update_achievements(user_id, achievements_list):
     import json
@@ -531,6 +1048,7 @@ def update_achievements(user_id, achievements_list):
             cursor.execute(f"UPDATE users SET achievements = {db.p} WHERE user_id = {db.p}", (json_val, uid))
         if db.db_type == "sqlite":
             cursor.close()
+    invalidate_user_stats(uid)
 
 def update_badges(user_id, badges_list):
     import json
@@ -541,40 +1059,45 @@ def update_badges(user_id, badges_list):
         cursor.execute(f"UPDATE users SET badges = {db.p} WHERE user_id = {db.p}", (json_val, uid))
         if db.db_type == "sqlite":
             cursor.close()
+    invalidate_user_stats(uid)
+
+def backfill_user_profile(user_id, last_achievement=None, first_seen=None):
+    """Fill in profile fields older rows are missing (only the ones given)."""
+    uid = str(user_id)
+    with db.session() as conn:
+        cursor = conn.cursor()
+        if last_achievement:
+            cursor.execute(f"UPDATE users SET last_achievement = {db.p} WHERE user_id = {db.p}", (last_achievement, uid))
+        if first_seen:
+            cursor.execute(f"UPDATE users SET first_seen = {db.p} WHERE user_id = {db.p}", (first_seen, uid))
+        if db.db_type == "sqlite":
+            cursor.close()
+    invalidate_user_stats(uid)
 
 def get_top_users(limit=10):
-    """Fetch top users by volume with TTL caching for high-concurrency."""
-    cache_key = f"top_{limit}"
-    cached = LEADERBOARD_CACHE.get(cache_key)
-    if cached: return cached
+    """Top users by volume from the in-memory leaderboard (kept current by update_user_stats)."""
+    return leaderboard_service.top(limit)
 
-    with db.get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(f"""
-            SELECT user_id, deals_completed, volume_usd 
-            FROM users 
-            ORDER BY volume_usd DESC 
-            LIMIT {db.p}
-        """, (limit,))
-        rows = cursor.fetchall()
-        if db.db_type == "sqlite": cursor.close()
-        
-        result = []
-        for row in rows:
-            result.append((str(row[0]), {"deals": row[1], "volume": row[2]}))
-        
-        LEADERBOARD_CACHE.set(cache_key, result) # Cache for 5 mins
-        return result
+def get_leaderboard_page(after=None, limit=10):
+    """Keyset page of the leaderboard: (entries, next_cursor); pass next_cursor back as `after`."""
+    return leaderboard_service.page(after=after, limit=limit)
+
+def get_user_rank(user_id):
+    """Exact leaderboard position by volume, or None for users without stats."""
+    return leaderboard_service.rank(user_id)
 
 def get_single_user_stats(user_id):
-    """Fetch stats for a single user efficiently."""
-    with db.get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(f"SELECT deals_completed, volume_usd FROM users WHERE user_id = {db.p}", (str(user_id),))
-        row = cursor.fetchone()
-        if db.db_type == "sqlite":
-            cursor.close()
-        
-        if row:
-            return {"deals": row[0], "volume": row[1]}
-        return {"deals": 0, "volume": 0.0}
+    """Fetch stats for a single user efficiently (cached until the user's row changes)."""
+    def load():
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT deals_completed, volume_usd FROM users WHERE user_id = {db.p}", (str(user_id),))
+            row = cursor.fetchone()
+            if db.db_type == "sqlite":
+                cursor.close()
+            
+            if row:
+                return {"deals": row[0], "volume": row[1]}
+            return {"deals": 0, "volume": 0.0}
+
+    return USER_STATS_CACHE.get_or_load(("single", str(user_id)), load, tags=(user_cache_tag(user_id),))
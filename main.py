@@ -49,6 +49,16 @@ from services.image_service import generate_handshake_image
 from utils.confirmation_utils import get_evm_confirmations, get_solana_confirmations
 from handlers import *
 from services.audit_service import audit_service
+from services.async_db import async_db
+from services.evm_provider import evm_providers
+from services.deposit_watcher import deposit_watcher, FULL
+from services.rpc_batch import rpc_batch
+from services.multicall import multicall
+from services.log_follower import transfer_logs
+from services.deal_model import Deal
+from utils import json_codec
+from services.leaderboard_service import leaderboard_service
+from services.deal_counter import deal_counter
 from services.reputation_service import reputation_service
 from services.notification_service import notification_service
 from services.achievement_service import achievement_service
@@ -103,7 +113,7 @@ async def setup_hook():
             logger.info("[MIGRATION] legacy data.json found. Migrating to database...")
             with open("data.json", "r") as f:
                 legacy_data = json.load(f)
-            save_all_data(legacy_data) # This now saves to DB via database.py
+            await async_db.database.save_all_data(legacy_data) # This now saves to DB via database.py
             os.rename("data.json", "data.json.migrated")
             logger.info("[MIGRATION] Migration complete. data.json moved to data.json.migrated.")
         else:
@@ -120,9 +130,9 @@ async def setup_hook():
     except Exception as e:
         logger.error(f"[ERROR] Blacklist pre-warm failed: {e}")
 
-    # 2. Pre-warm Deal Counter Cache (File I/O)
+    # 2. Pre-warm Deal Counter (reserves the first block of ticket numbers)
     try:
-        load_counter()
+        deal_counter.warm()
         logger.info("[INFO] Counter cache pre-warmed.")
     except Exception as e:
         logger.error(f"[ERROR] Counter pre-warm failed: {e}")
@@ -147,7 +157,7 @@ bot.setup_hook = setup_hook
 
 
 
-# Helper functions load_counter, save_counter, get_deal_by_dealid are now imported from database.py
+# Helper functions load_counter, get_deal_by_dealid are now imported from database.py
 
 
 
@@ -239,27 +249,22 @@ def get_currency_info(currency):
 
 
 async def get_gas_balance(address, currency):
-    """Return BNB (for BEP20) or MATIC (for Polygon) balance using AsyncWeb3"""
-    from web3 import AsyncWeb3, AsyncHTTPProvider
+    """Return BNB (for BEP20) or MATIC (for Polygon) balance via Multicall3"""
     try:
         if currency == "usdt_bep20":
-            for rpc in BEP20_RPC_URLS:
-                try:
-                    w3 = AsyncWeb3(AsyncHTTPProvider(rpc, request_kwargs={"timeout": 5}))
-                    if not await w3.is_connected(): continue
-                    bal = await w3.eth.get_balance(address)
-                    return float(w3.from_wei(bal, 'ether'))
-                except:
-                    continue
+            rpc_urls = BEP20_RPC_URLS
         elif currency == "usdt_polygon":
-            for rpc in POLYGON_RPC_URLS:
-                try:
-                    w3 = AsyncWeb3(AsyncHTTPProvider(rpc, request_kwargs={"timeout": 5}))
-                    if not await w3.is_connected(): continue
-                    bal = await w3.eth.get_balance(address)
-                    return float(w3.from_wei(bal, 'ether'))
-                except:
-                    continue
+            rpc_urls = POLYGON_RPC_URLS
+        else:
+            return 0.0
+        for rpc in rpc_urls:
+            try:
+                # Multicall3 getEthBalance (plain eth_getBalance where it is not deployed)
+                balances = await multicall.balances(rpc, [address], native=True)
+                if address in balances:
+                    return float(balances[address][1] / (10 ** 18))
+            except:
+                continue
     except Exception as e:
         logger.error(f"Gas balance error: {e}")
 
@@ -502,31 +507,35 @@ async def generate_wallet_for_currency(deal_id, currency):
 
 
 
+async def get_eth_balances_batch(rpc_url, addresses):
+    """
+    ETH balances of many addresses from ONE endpoint in one batched POST.
+    Returns {address: balance} for the addresses the endpoint answered.
+    """
+    calls = []
+    for address in addresses:
+        # Check both latest and pending. Pending allows detection before mining!
+        calls.append(("eth_getBalance", [address, "latest"]))
+        calls.append(("eth_getBalance", [address, "pending"]))
+    results = await rpc_batch.call(rpc_url, calls, timeout=6)
+
+    balances = {}
+    for i, address in enumerate(addresses):
+        values = [int(r, 16) for r in results[2 * i:2 * i + 2] if isinstance(r, str)]
+        if values:
+            # Use the maximum to catch unconfirmed incoming funds
+            balances[address] = float(max(values) / (10 ** 18))
+    return balances
+
+
 async def get_eth_balance_parallel(address):
     """Get ETH balance from multiple RPCs. Returns the HIGHEST balance found (solves RPC lag)."""
-    from web3 import AsyncWeb3, AsyncHTTPProvider
-    
     async def fetch_balance(rpc_url):
-        w3 = None
         try:
-            w3 = AsyncWeb3(AsyncHTTPProvider(rpc_url, request_kwargs={"timeout": 6}))
-            if not await w3.is_connected():
-                return 0.0
-            
-            addr_checksum = AsyncWeb3.to_checksum_address(address)
-            # Check both latest and pending. Pending allows detection before mining!
-            balance_latest = await w3.eth.get_balance(addr_checksum, 'latest')
-            balance_pending = await w3.eth.get_balance(addr_checksum, 'pending')
-            
-            # Use the maximum to catch unconfirmed incoming funds
-            balance_wei = max(balance_latest, balance_pending)
-            return float(balance_wei / (10 ** 18))
+            balances = await get_eth_balances_batch(rpc_url, [address])
+            return balances.get(address, 0.0)
         except:
             return 0.0
-        finally:
-            if w3 is not None:
-                try: await w3.provider.session.close()
-                except: pass
             
     # Run ALL in parallel and take the MAX
     tasks = [fetch_balance(url) for url in ETH_RPC_URLS]
@@ -540,10 +549,9 @@ async def get_eth_balance_parallel(address):
 
 async def get_eth_block_number():
     """Get current ETH block number from multiple RPCs using AsyncWeb3"""
-    from web3 import AsyncWeb3, AsyncHTTPProvider
     async def fetch_block(rpc_url):
         try:
-            w3 = AsyncWeb3(AsyncHTTPProvider(rpc_url, request_kwargs={"timeout": 5}))
+            w3 = await evm_providers.get(rpc_url, timeout=5)
             return await w3.eth.block_number
         except:
             return None
@@ -560,7 +568,7 @@ async def get_solana_slot():
             payload = {"jsonrpc": "2.0", "id": 1, "method": "getSlot"}
             async with session.post(rpc_url, json=payload, timeout=5) as r:
                 if r.status == 200:
-                    data = await r.json()
+                    data = await r.json(loads=json_codec.loads)
                     return data.get("result")
         except:
             return None
@@ -572,39 +580,40 @@ async def get_solana_slot():
 
 async def get_last_eth_txhash(address):
     """Get last incoming ETH transaction hash using robust parallel RPCs."""
-    from web3 import AsyncWeb3, AsyncHTTPProvider
-    
     addr_lower = address.lower()
-    
+    session = await get_session()
+
+    async def rpc(rpc_url, method, params):
+        # Raw JSON-RPC on the shared session: full blocks are large, so they are
+        # parsed with the fast codec instead of going through web3's middleware
+        payload = {"jsonrpc": "2.0", "id": 1, "method": method, "params": params}
+        async with session.post(rpc_url, json=payload, timeout=aiohttp.ClientTimeout(total=6)) as r:
+            if r.status != 200:
+                return None
+            return (await json_codec.read_json(r)).get("result")
+
     async def fetch_last_tx(rpc_url):
-        w3 = None
         try:
-            w3 = AsyncWeb3(AsyncHTTPProvider(rpc_url, request_kwargs={"timeout": 6}))
-            if not await w3.is_connected():
-                return None
-            
             # Get latest block
-            latest_block = await w3.eth.block_number
+            latest = await rpc(rpc_url, "eth_blockNumber", [])
+            if latest is None:
+                return None
+            latest_block = int(latest, 16)
             
             # Check last 50 blocks (~10 minutes) for reliability
             for block_num in range(latest_block, latest_block - 50, -1):
                 if block_num <= 0: break
                 try:
-                    # BLOCK FETCH MUST BE AWAITED
-                    block = await w3.eth.get_block(block_num, full_transactions=True)
-                    if not block or not block.transactions: continue
+                    block = await rpc(rpc_url, "eth_getBlockByNumber", [hex(block_num), True])
+                    if not block or not block.get("transactions"): continue
                     
-                    for tx in block.transactions:
-                        if tx.to and tx.to.lower() == addr_lower:
-                            return tx.hash.hex()
+                    for tx in block["transactions"]:
+                        if tx.get("to") and tx["to"].lower() == addr_lower:
+                            return tx["hash"]
                 except:
                     continue
         except Exception as e:
             logger.debug(f"[ETH-TX-RPC] Error ({rpc_url}): {e}")
-        finally:
-            if w3 is not None:
-                try: await w3.provider.session.close()
-                except: pass
         return None
 
     tasks = [fetch_last_tx(url) for url in ETH_RPC_URLS]
@@ -623,17 +632,14 @@ async def check_eth_balance_sufficient(address, amount_eth=None, rpc_urls=None):
     Check if an address has sufficient ETH balance to send a transaction.
     Returns (is_sufficient, balance, required, error_message)
     """
-    from web3 import AsyncWeb3, AsyncHTTPProvider
+    from web3 import AsyncWeb3
     
     if rpc_urls is None:
         rpc_urls = ETH_RPC_URLS
     
     for rpc in rpc_urls:
-        w3 = None
         try:
-            w3 = AsyncWeb3(AsyncHTTPProvider(rpc, request_kwargs={"timeout": 5}))
-            if not await w3.is_connected():
-                continue
+            w3 = await evm_providers.get(rpc, timeout=5)
             
             checksum_addr = AsyncWeb3.to_checksum_address(address)
             balance = await w3.eth.get_balance(checksum_addr)
@@ -664,12 +670,6 @@ async def check_eth_balance_sufficient(address, amount_eth=None, rpc_urls=None):
             
         except Exception as e:
             continue
-        finally:
-            if w3 is not None:
-                try:
-                    await w3.provider.session.close()
-                except:
-                    pass
     
     return False, 0, 0, "Unable to connect to any ETH RPC"
 
@@ -678,7 +678,7 @@ async def check_eth_balance_sufficient(address, amount_eth=None, rpc_urls=None):
 async def send_eth(private_key, to_address, amount=None, nonce=None):
     """Sends ETH using AsyncWeb3 (Supports manual nonce & Detailed logging)."""
     from eth_account import Account
-    from web3 import AsyncWeb3, AsyncHTTPProvider
+    from web3 import AsyncWeb3
 
     acc = Account.from_key(private_key)
     from_address = acc.address
@@ -688,11 +688,8 @@ async def send_eth(private_key, to_address, amount=None, nonce=None):
     rpc_urls = ETH_RPC_URLS
 
     for rpc in rpc_urls:
-        w3 = None
         try:
-            w3 = AsyncWeb3(AsyncHTTPProvider(rpc, request_kwargs={"timeout": 10}))
-            if not await w3.is_connected():
-                continue
+            w3 = await evm_providers.get(rpc, timeout=10)
 
             from_checksum = AsyncWeb3.to_checksum_address(from_address)
             to_checksum = AsyncWeb3.to_checksum_address(to_address)
@@ -757,13 +754,6 @@ async def send_eth(private_key, to_address, amount=None, nonce=None):
             last_error = f"RPC {rpc} general error: {e}"
             logger.error(f"[ETH] {last_error}")
             continue
-        finally:
-            # Ensure provider session is closed to prevent warnings
-            if w3 is not None:
-                try:
-                    await w3.provider.session.close()
-                except:
-                    pass
 
     raise Exception(f"ETH Withdrawal Failed: {last_error}")
 
@@ -778,7 +768,7 @@ async def send_eth(private_key, to_address, amount=None, nonce=None):
 async def estimate_required_gas(contract_address, private_key, to_address, amount, rpc_urls, decimals):
     """Estimate gas using AsyncWeb3."""
     from eth_account import Account
-    from web3 import AsyncWeb3, AsyncHTTPProvider
+    from web3 import AsyncWeb3
     
     account = Account.from_key(private_key)
     from_addr = account.address
@@ -786,14 +776,9 @@ async def estimate_required_gas(contract_address, private_key, to_address, amoun
 
     for rpc in rpc_urls:
         try:
-            w3 = AsyncWeb3(AsyncHTTPProvider(rpc, request_kwargs={"timeout": 5}))
-            if not await w3.is_connected():
-                continue
+            w3 = await evm_providers.get(rpc, timeout=5)
 
-            contract = w3.eth.contract(
-                address=AsyncWeb3.to_checksum_address(contract_address),
-                abi=USDT_ABI
-            )
+            contract = evm_providers.contract(w3, contract_address, USDT_ABI)
 
             nonce = await w3.eth.get_transaction_count(from_addr)
 
@@ -835,7 +820,7 @@ async def get_coingecko_price(currency_key):
     try:
         async with session.get(url, timeout=5) as r:
             if r.status == 200:
-                data = await r.json()
+                data = await r.json(loads=json_codec.loads)
                 if cg_id in data:
                     return float(data[cg_id]['usd'])
     except: pass
@@ -887,7 +872,7 @@ async def get_usdt_price():
         try:
             async with session.get(url, timeout=3) as r:
                 if r.status == 200:
-                    d = await r.json()
+                    d = await r.json(loads=json_codec.loads)
                     if "price" in d: return float(d["price"])
                     if "tether" in d: return float(d["tether"]["usd"])
                     if "USD" in d: return float(d["USD"])
@@ -917,7 +902,7 @@ async def get_ltc_price():
         try:
             async with session.get(url, timeout=3) as r:
                 if r.status == 200:
-                    d = await r.json()
+                    d = await r.json(loads=json_codec.loads)
                     if "price" in d: return float(d["price"])
                     if "litecoin" in d: return float(d["litecoin"]["usd"])
                     if "USD" in d: return float(d["USD"])
@@ -947,7 +932,7 @@ async def get_solana_price():
         try:
             async with session.get(url, timeout=3) as r:
                 if r.status == 200:
-                    d = await r.json()
+                    d = await r.json(loads=json_codec.loads)
                     if "price" in d: return float(d["price"])
                     if "solana" in d: return float(d["solana"]["usd"])
                     if "USD" in d: return float(d["USD"])
@@ -977,7 +962,7 @@ async def get_ethereum_price():
         try:
             async with session.get(url, timeout=3) as r:
                 if r.status == 200:
-                    d = await r.json()
+                    d = await r.json(loads=json_codec.loads)
                     if "price" in d: return float(d["price"])
                     if "ethereum" in d: return float(d["ethereum"]["usd"])
                     if "USD" in d: return float(d["USD"])
@@ -1072,12 +1057,10 @@ def get_required_gas(currency):
 
 async def check_gas_paid(currency, address, rpc_urls):
     """Check if address has enough gas for transactions using AsyncWeb3"""
-    from web3 import AsyncWeb3, AsyncHTTPProvider
+    from web3 import AsyncWeb3
     for url in rpc_urls:
         try:
-            w3 = AsyncWeb3(AsyncHTTPProvider(url, request_kwargs={"timeout": 5}))
-            if not await w3.is_connected():
-                continue
+            w3 = await evm_providers.get(url, timeout=5)
             bal_wei = await w3.eth.get_balance(AsyncWeb3.to_checksum_address(address))
             bal = bal_wei / 1e18
 
@@ -1251,7 +1234,7 @@ async def send_ltc(sendaddy, private_key, to_address, amount=None):
 async def send_usdt(contract_address, private_key, to_address, amount, rpc_urls, decimals, chain_id, nonce=None):
     """Sends USDT using AsyncWeb3 (Supports manual nonce & Detailed logging)."""
     from eth_account import Account
-    from web3 import AsyncWeb3, AsyncHTTPProvider
+    from web3 import AsyncWeb3
 
     usdt_abi = [
         {"constant": True, "inputs": [{"name": "_owner", "type": "address"}], "name": "balanceOf", "outputs": [{"name": "balance", "type": "uint256"}], "type": "function"},
@@ -1263,14 +1246,11 @@ async def send_usdt(contract_address, private_key, to_address, amount, rpc_urls,
     last_error = "No RPC connected"
 
     for rpc in rpc_urls:
-        w3 = None
         try:
-            w3 = AsyncWeb3(AsyncHTTPProvider(rpc, request_kwargs={"timeout": 10}))
-            if not await w3.is_connected():
-                continue
+            w3 = await evm_providers.get(rpc, timeout=10)
 
             to_checksum = AsyncWeb3.to_checksum_address(to_address)
-            contract = w3.eth.contract(AsyncWeb3.to_checksum_address(contract_address), abi=usdt_abi)
+            contract = evm_providers.contract(w3, contract_address, usdt_abi)
             from_checksum = AsyncWeb3.to_checksum_address(from_address)
 
             balance = await contract.functions.balanceOf(from_checksum).call()
@@ -1327,13 +1307,6 @@ async def send_usdt(contract_address, private_key, to_address, amount, rpc_urls,
             last_error = f"RPC {rpc} general error: {e}"
             logger.info(f"[EVM] {last_error}")
             continue
-        finally:
-            # Ensure provider session is closed to prevent warnings
-            if w3 is not None:
-                try:
-                    await w3.provider.session.close()
-                except:
-                    pass
 
     raise Exception(f"Withdrawal Failed: {last_error}")
 
@@ -1415,7 +1388,7 @@ async def send_solana(private_key_b58, to_address, amount):
 
             async with session.post(RPC, json=payload) as r:
 
-                return await r.json()
+                return await r.json(loads=json_codec.loads)
 
 
 
@@ -1613,7 +1586,7 @@ async def send_usdt_wallet_with_gas_embed(interaction, deal_id, currency, addres
 
     data[deal_id] = deal
 
-    save_all_data(data)
+    await async_db.database.save_all_data(data)
 
 
 
@@ -1952,7 +1925,7 @@ async def send_funds_with_fee(deal_info, to_address, amount=None, status_msg=Non
 async def send_usdt_specific_amount(contract_address, private_key, to_address, amount, rpc_urls, decimals, chain_id, nonce=None):
     """Send a specific amount of USDT using AsyncWeb3 (Supports manual nonce & Robustness)."""
     from eth_account import Account
-    from web3 import AsyncWeb3, AsyncHTTPProvider
+    from web3 import AsyncWeb3
 
     usdt_abi = [
         {"constant": True, "inputs": [{"name": "_owner", "type": "address"}], "name": "balanceOf", "outputs": [{"name": "balance", "type": "uint256"}], "type": "function"},
@@ -1966,12 +1939,10 @@ async def send_usdt_specific_amount(contract_address, private_key, to_address, a
 
     for rpc in rpc_urls:
         try:
-            w3 = AsyncWeb3(AsyncHTTPProvider(rpc, request_kwargs={"timeout": 10}))
-            if not await w3.is_connected():
-                continue
+            w3 = await evm_providers.get(rpc, timeout=10)
 
             to_checksum = AsyncWeb3.to_checksum_address(to_address)
-            contract = w3.eth.contract(AsyncWeb3.to_checksum_address(contract_address), abi=usdt_abi)
+            contract = evm_providers.contract(w3, contract_address, usdt_abi)
             from_checksum = AsyncWeb3.to_checksum_address(from_address)
             balance = await contract.functions.balanceOf(from_checksum).call()
             
@@ -2026,34 +1997,23 @@ async def send_usdt_specific_amount(contract_address, private_key, to_address, a
 
 
 
+async def get_usdt_balances_batch(contract_address, wallets, rpc_url, decimals):
+    """
+    Token balances of many wallets from ONE endpoint: balanceOf for every
+    wallet through Multicall3 (services/multicall.py). Returns {wallet: balance}.
+    """
+    balances = await multicall.balances(rpc_url, wallets, token=contract_address)
+    return {wallet: float(raw / (10 ** decimals)) for wallet, (raw, _) in balances.items()}
+
+
 async def get_usdt_balance_parallel(contract_address, wallet, rpc_urls, decimals):
     """Get USDT balance from multiple RPCs. Returns the HIGHEST balance found."""
-    from web3 import AsyncWeb3, AsyncHTTPProvider
-    
     async def fetch_balance(rpc_url):
-        w3 = None
         try:
-            w3 = AsyncWeb3(AsyncHTTPProvider(rpc_url, request_kwargs={"timeout": 6}))
-            if not await w3.is_connected():
-                return 0.0
-            
-            contract = w3.eth.contract(
-                address=AsyncWeb3.to_checksum_address(contract_address),
-                abi=USDT_ABI
-            )
-            
-            # For USDT, we also check pending if available (supported on some RPCs)
-            try:
-                 bal = await contract.functions.balanceOf(AsyncWeb3.to_checksum_address(wallet)).call()
-                 return float(bal / (10 ** decimals))
-            except:
-                 return 0.0
+            balances = await get_usdt_balances_batch(contract_address, [wallet], rpc_url, decimals)
+            return balances.get(wallet, 0.0)
         except:
             return 0.0
-        finally:
-            if w3 is not None:
-                try: await w3.provider.session.close()
-                except: pass
 
     tasks = [fetch_balance(url) for url in rpc_urls]
     results = await asyncio.gather(*tasks, return_exceptions=True)
@@ -2081,7 +2041,7 @@ async def get_solana_balance_parallel(address):
             }
             async with session.post(rpc_url, json=payload, timeout=6) as resp:
                 if resp.status == 200:
-                    data = await resp.json()
+                    data = await resp.json(loads=json_codec.loads)
                     balance_lamports = data['result']['value']
                     return float(balance_lamports / 1_000_000_000)
         except: return 0.0
@@ -2108,7 +2068,7 @@ async def get_solana_transactions(address):
             }
             async with session.post(rpc_url, json=payload, timeout=6) as resp:
                 if resp.status == 200:
-                    data = await resp.json()
+                    data = await resp.json(loads=json_codec.loads)
                     res = data.get('result', [])
                     return res if res else None # Return None if empty to keep looking
         except: pass
@@ -2161,7 +2121,7 @@ async def get_solana_transaction_details(tx_signature):
 
                     if resp.status == 200:
 
-                        data = await resp.json()
+                        data = await resp.json(loads=json_codec.loads)
 
                         return data.get('result')
 
@@ -2253,7 +2213,7 @@ async def tatum_ltc_balance(session, address):
 
         ) as r:
 
-            data = await r.json()
+            data = await r.json(loads=json_codec.loads)
 
             if "result" in data:
 
@@ -2275,7 +2235,7 @@ async def blockcypher_ltc_balance(session, address):
 
             if r.status == 200:
 
-                data = await r.json()
+                data = await r.json(loads=json_codec.loads)
 
                 return data.get("balance", 0) / 1e8
 
@@ -2305,7 +2265,7 @@ async def litecoinspace_ltc_balance(session, address):
 
 
 
-            d = await r.json()
+            d = await r.json(loads=json_codec.loads)
 
             funded = d["chain_stats"]["funded_txo_sum"]
 
@@ -2341,7 +2301,7 @@ async def tatum_ltc_received(address):
 
             async with session.post(LTC_TATUM_RPC, json=payload, headers=LTC_TATUM_HEADERS, timeout=6) as r:
 
-                data = await r.json()
+                data = await r.json(loads=json_codec.loads)
 
                 if "result" in data:
 
@@ -2373,7 +2333,7 @@ async def tatum_ltc(method, params):
 
             ) as r:
 
-                return await r.json()
+                return await r.json(loads=json_codec.loads)
 
     except:
 
@@ -2399,7 +2359,7 @@ async def fetch_mempool_status(session, address):
 
             
 
-            d = await r.json()
+            d = await r.json(loads=json_codec.loads)
 
 
 
@@ -2612,7 +2572,7 @@ async def api_get_status(address: str):
             url = f"https://litecoinspace.org/api/address/{address}"
             async with session.get(url, proxy=proxy_url, timeout=4) as r:
                 if r.status == 200:
-                    d = await r.json()
+                    d = await r.json(loads=json_codec.loads)
                     conf = (d["chain_stats"]["funded_txo_sum"] - d["chain_stats"]["spent_txo_sum"]) / 1e8
                     unconf = (d["mempool_stats"]["funded_txo_sum"] - d["mempool_stats"]["spent_txo_sum"]) / 1e8
                     return {"confirmed": conf, "unconfirmed": unconf, "total": conf + unconf}
@@ -2623,7 +2583,7 @@ async def api_get_status(address: str):
             url = f"https://chain.so/api/v2/address/LTC/{address}"
             async with session.get(url, proxy=proxy_url, timeout=4) as r:
                 if r.status == 200:
-                    d = await r.json()
+                    d = await r.json(loads=json_codec.loads)
                     data = d["data"]
                     conf = float(data["confirmed_balance"])
                     unconf = float(data["unconfirmed_balance"])
@@ -2645,6 +2605,75 @@ async def api_get_status(address: str):
 
     return {"confirmed": 0.0, "unconfirmed": 0.0}
 
+
+# =====================================================
+# DEPOSIT WATCHER FETCHERS
+# One call per chain per cycle for ALL watched addresses
+# (services/deposit_watcher.py picks the endpoint)
+# =====================================================
+async def _gather_balances(addresses, fetch_one):
+    results = await asyncio.gather(*(fetch_one(a) for a in addresses), return_exceptions=True)
+    return {a: float(r) for a, r in zip(addresses, results) if isinstance(r, (int, float))}
+
+def usdt_deposit_fetcher(currency, contract_address, decimals):
+    async def fetch_usdt_deposits(rpc_url, addresses):
+        balances = await get_usdt_balances_batch(contract_address, addresses, rpc_url, decimals)
+        # Followed addresses report the exact sum of their Transfer logs; the balance still
+        # counts since the follower only sees `lookback` blocks before the watch began
+        for address, balance in balances.items():
+            follower = transfer_logs.get(currency, address)
+            if follower is not None:
+                balances[address] = max(balance, follower.received(address) / (10 ** decimals))
+        return balances
+    return fetch_usdt_deposits
+
+async def fetch_solana_deposits(rpc_url, addresses):
+    """SOL balances via getMultipleAccounts (100 accounts per call, all calls in one batched POST)."""
+    session = await get_session()
+    chunks = [addresses[i:i + 100] for i in range(0, len(addresses), 100)]
+    calls = [("getMultipleAccounts", [chunk, {"encoding": "base64", "dataSlice": {"offset": 0, "length": 0}}]) for chunk in chunks]
+    results = await rpc_batch.call(rpc_url, calls, session=session, timeout=6)
+
+    balances = {}
+    for chunk, result in zip(chunks, results):
+        if not isinstance(result, dict):
+            continue
+        for address, account in zip(chunk, result['value']):
+            # Unfunded accounts come back as null
+            balances[address] = (account['lamports'] if account else 0) / 1_000_000_000
+    return balances
+
+# Addresses the node wallet holds; listunspent is silent (not an error) for any other address
+_ltc_node_addresses = set()
+_ltc_node_checked = set()
+
+async def fetch_ltc_deposits(source, addresses):
+    """
+    LTC balances: one listunspent for every address on the node, or the explorers per address.
+    The node only answers for addresses in its wallet; the others are left out so the
+    watcher fails over to the explorers for them.
+    """
+    if source == "node":
+        if any(a not in _ltc_node_checked for a in addresses):
+            received = await rpc_async("listreceivedbyaddress", 0, True, True)
+            _ltc_node_addresses.update(r['address'] for r in received if r.get('address'))
+            _ltc_node_checked.update(addresses)
+        watched = [a for a in addresses if a in _ltc_node_addresses]
+        if not watched:
+            return {}
+        unspent = await rpc_async("listunspent", 0, 9999999, watched)
+        balances = {a: 0.0 for a in watched}
+        for tx in unspent:
+            if tx.get('address') in balances:
+                balances[tx['address']] += float(tx.get('amount', 0))
+        return balances
+
+    async def fetch_one(address):
+        s = await api_get_status(address)
+        return s['confirmed'] + s['unconfirmed']
+
+    return await _gather_balances(addresses, fetch_one)
+
 async def get_ltc_confirmations(tx_hash):
     """
     Robust parallel LTC confirmation checker.
@@ -2665,7 +2694,7 @@ async def get_ltc_confirmations(tx_hash):
             url = f"https://litecoinspace.org/api/tx/{tx_hash}"
             async with session.get(url, proxy=proxy_url, timeout=4) as r:
                 if r.status == 200:
-                    data = await r.json()
+                    data = await r.json(loads=json_codec.loads)
                     status = data.get("status", {})
                     if status.get("confirmed"):
                         block_height = status.get("block_height")
@@ -2681,7 +2710,7 @@ async def get_ltc_confirmations(tx_hash):
             url = f"https://api.blockcypher.com/v1/ltc/main/txs/{tx_hash}"
             async with session.get(url, timeout=4) as r:
                 if r.status == 200:
-                    data = await r.json()
+                    data = await r.json(loads=json_codec.loads)
                     return int(data.get("confirmations", 0))
             return 0
         except: return 0
@@ -2708,7 +2737,7 @@ async def fetch_blockcypher_status(session, address: str):
 
 
 
-            data = await resp.json()
+            data = await resp.json(loads=json_codec.loads)
 
 
 
@@ -2766,7 +2795,7 @@ async def fetch_sochain_status(session, address: str):
 
                 return None
 
-            payload = await resp.json()
+            payload = await resp.json(loads=json_codec.loads)
 
             if payload.get("status") != "success":
 
@@ -2812,7 +2841,7 @@ async def fetch_blockchair_status(session, address: str):
 
                 return None
 
-            data = await resp.json()
+            data = await resp.json(loads=json_codec.loads)
 
             d = data.get("data", {})
 
@@ -2872,7 +2901,7 @@ async def fetch_litecoinspace_txid(session, address: str):
 
                 return None
 
-            data = await r.json()
+            data = await r.json(loads=json_codec.loads)
 
 
 
@@ -2983,7 +3012,7 @@ async def get_ltc_confirmed_balance(address: str):
 
                 if r.status == 200:
 
-                    data = await r.json()
+                    data = await r.json(loads=json_codec.loads)
 
                     confirmed = data["chain_stats"]["funded_txo_sum"] - data["chain_stats"]["spent_txo_sum"]
 
@@ -3007,7 +3036,7 @@ async def get_ltc_confirmed_balance(address: str):
 
                 if r.status == 200:
 
-                    data = await r.json()
+                    data = await r.json(loads=json_codec.loads)
 
                     bal = data.get("balance", 0)
 
@@ -3119,7 +3148,7 @@ async def get_ltc_txid_async(address: str):
         try:
             async with session.get(url, proxy=proxy_url, timeout=1.5) as r:
                 if r.status == 200:
-                    txs = await r.json()
+                    txs = await r.json(loads=json_codec.loads)
                     if txs: return [t["txid"] for t in txs]
         except: pass
         return []
@@ -3129,7 +3158,7 @@ async def get_ltc_txid_async(address: str):
         try:
             async with session.get(url, proxy=proxy_url, timeout=1.5) as r:
                 if r.status == 200:
-                    txs = await r.json()
+                    txs = await r.json(loads=json_codec.loads)
                     if txs: return [t["txid"] for t in txs]
         except: pass
         return []
@@ -3139,7 +3168,7 @@ async def get_ltc_txid_async(address: str):
         try:
             async with session.get(url, proxy=proxy_url, timeout=1.5) as r:
                 if r.status == 200:
-                    d = await r.json()
+                    d = await r.json(loads=json_codec.loads)
                     all_txs = (d.get("unconfirmed_txrefs") or []) + (d.get("txrefs") or []) # Prefer unconfirmed first
                     if all_txs: return [t["tx_hash"] for t in all_txs]
         except: pass
@@ -3149,7 +3178,7 @@ async def get_ltc_txid_async(address: str):
         url = f"https://chain.so/api/v2/address/LTC/{address}"
         try:
             async with session.get(url, proxy=proxy_url, timeout=1.5) as r:
-                d = await r.json()
+                d = await r.json(loads=json_codec.loads)
                 if d.get("status") == "success" and d.get("data") and d["data"].get("txs"): 
                     return [t["txid"] for t in d["data"]["txs"]]
         except: pass
@@ -3179,12 +3208,10 @@ async def get_dynamic_gas_price(currency):
     else:
         return 0
 
-    from web3 import AsyncWeb3, AsyncHTTPProvider
     for rpc in rpc_urls:
         try:
-            w3 = AsyncWeb3(AsyncHTTPProvider(rpc, request_kwargs={"timeout": 5}))
-            if await w3.is_connected():
-                return await w3.eth.gas_price
+            w3 = await evm_providers.get(rpc, timeout=5)
+            return await w3.eth.gas_price
         except:
             continue
     return 0
@@ -3252,7 +3279,7 @@ async def polygon_tatum_rpc(method, params):
         json={"jsonrpc": "2.0", "id": 1, "method": method, "params": params},
         timeout=5
     ) as r:
-        return await r.json()
+        return await r.json(loads=json_codec.loads)
 
 
 
@@ -3260,18 +3287,15 @@ async def polygon_tatum_rpc(method, params):
 
 async def get_usdt_polygon_txid_tatum(address):
     """Fetch USDT Polygon TXID using parallel RPC calls (fastest response wins)."""
-    from web3 import AsyncWeb3, AsyncHTTPProvider
+    from web3 import AsyncWeb3
     import asyncio
     
     address_bare = address.lower().replace("0x", "")
     padded_address = "0x" + address_bare.zfill(64)
     
     async def try_rpc(rpc_url):
-        w3 = None
         try:
-            w3 = AsyncWeb3(AsyncHTTPProvider(rpc_url, request_kwargs={"timeout": 6}))
-            if not await w3.is_connected():
-                return None
+            w3 = await evm_providers.get(rpc_url, timeout=6)
             
             latest = await w3.eth.block_number
             start_block = latest - 1000  # Wider search (~30 mins)
@@ -3292,10 +3316,6 @@ async def get_usdt_polygon_txid_tatum(address):
         except Exception as e:
             # logger.debug(f"[Pol-TXID] RPC {rpc_url} failed: {e}")
             return None
-        finally:
-            if w3 is not None:
-                try: await w3.provider.session.close()
-                except: pass
 
     # Run all RPCs in parallel, return first success
     tasks = [asyncio.create_task(try_rpc(url)) for url in POLYGON_RPC_URLS]
@@ -3349,7 +3369,7 @@ async def tatum_rpc(method, params):
 
         ) as r:
 
-            return await r.json()
+            return await r.json(loads=json_codec.loads)
 
 
 
@@ -3389,18 +3409,15 @@ async def tatum_get_usdt_logs(start_block, end_block, to_address=None):
 
 async def get_usdt_bep20_txid_parallel(address):
     """Fetch USDT BEP20 TXID using parallel RPC calls (fastest response wins)."""
-    from web3 import AsyncWeb3, AsyncHTTPProvider
+    from web3 import AsyncWeb3
     import asyncio
     
     address_bare = address.lower().replace("0x", "")
     padded_address = "0x" + address_bare.zfill(64)
     
     async def try_rpc(rpc_url):
-        w3 = None
         try:
-            w3 = AsyncWeb3(AsyncHTTPProvider(rpc_url, request_kwargs={"timeout": 6}))
-            if not await w3.is_connected():
-                return None
+            w3 = await evm_providers.get(rpc_url, timeout=6)
             
             latest = await w3.eth.block_number
             start_block = latest - 1000  # Wider search (~30 mins)
@@ -3421,10 +3438,6 @@ async def get_usdt_bep20_txid_parallel(address):
         except Exception as e:
             # logger.debug(f"[BEP20-TXID] RPC {rpc_url} failed: {e}")
             return None
-        finally:
-            if w3 is not None:
-                try: await w3.provider.session.close()
-                except: pass
 
     # Run all RPCs in parallel, return first success
     tasks = [asyncio.create_task(try_rpc(url)) for url in BEP20_RPC_URLS]
@@ -3449,6 +3462,20 @@ async def fetch_txid_ultimate(address, currency, max_attempts=8):
 
     for _ in range(max_attempts):
 
+        # ---------------------------
+
+        # USDT DEPOSIT ADDRESS → LOG FOLLOWER (no log scan)
+
+        # ---------------------------
+
+        follower = transfer_logs.get(currency, address)
+        if follower is not None:
+            # RETURNS LIST (newest first)
+            txids = follower.txids(address)
+            if txids:
+                return txids
+            # Nothing followed yet: fall through to the per-chain lookups below
+
 
 
         # ---------------------------
@@ -3634,13 +3661,58 @@ async def ensure_deal_gas(deal_info, status_msg=None):
 
     return True
 
+# A deal in one of these has a payout under way or done; no second payout may start
+PAYOUT_STATUSES = ('releasing', 'refunding', 'released', 'refunded')
+
+async def claim_deal_payout(deal_id, claim):
+    """
+    Move a deal to `claim` ('releasing' / 'refunding') with compare-and-set
+    before any funds are sent, so two payouts can't both start.
+    Returns (claimed, previous_status).
+    """
+    previous = {}
+    def guard(d):
+        previous['status'] = d.get('status')
+        return d.get('status') not in PAYOUT_STATUSES
+    try:
+        claimed = await async_db.database.transition_deal(
+            deal_id, {"status": claim, "last_activity": time.time()}, guard=guard
+        )
+    except KeyError:
+        claimed = False # Deal already closed
+    return claimed, previous.get('status')
+
+async def release_deal_claim(deal_id, claim, previous_status):
+    """Undo claim_deal_payout after a payout that sent nothing."""
+    try:
+        await async_db.database.transition_deal(
+            deal_id, {"status": previous_status}, guard=lambda d: d.get('status') == claim
+        )
+    except Exception as e:
+        logger.error(f"[Payout] Failed to release {claim} claim on deal {deal_id}: {e}")
+
+async def finalize_deal_status(deal_id, claim, status):
+    """Turn a payout claim into its final status ('released' / 'refunded')."""
+    try:
+        applied = await async_db.database.transition_deal(
+            deal_id,
+            {"status": status, "last_activity": time.time()},
+            guard=lambda d: d.get('status') == claim,
+        )
+        if not applied:
+            logger.warning(f"[Payout] Deal {deal_id} is no longer {claim}; not marking it {status}")
+    except KeyError:
+        pass # Deal already closed
+    except Exception as e:
+        logger.error(f"[Payout] Failed to mark deal {deal_id} {status}: {e}")
+
 async def sweep_dust_fees(deal_id, deal_info=None):
     """
     Sweeps remaining native token dust (unused gas) to the fee address.
     Should be called just before deal channel deletion.
     """
     try:
-        from web3 import AsyncWeb3, AsyncHTTPProvider
+        from web3 import AsyncWeb3
         if not deal_info:
             deal_info = load_all_data().get(str(deal_id))
             
@@ -3713,8 +3785,7 @@ async def sweep_dust_fees(deal_id, deal_info=None):
 
             for rpc in rpc_urls:
                 try:
-                    w3 = AsyncWeb3(AsyncHTTPProvider(rpc, request_kwargs={"timeout": 5}))
-                    if not await w3.is_connected(): continue
+                    w3 = await evm_providers.get(rpc, timeout=5)
                     
                     from_addr = AsyncWeb3.to_checksum_address(address)
                     to_addr = AsyncWeb3.to_checksum_address(fee_dest)
@@ -3764,6 +3835,18 @@ async def sweep_dust_fees(deal_id, deal_info=None):
 
 # ========================================
 
+# One watcher per chain for every deal monitor (see check_payment_multicurrency)
+deposit_watcher.register("ltc", fetch_ltc_deposits, ["node", "explorers"])
+deposit_watcher.register("ethereum", get_eth_balances_batch, ETH_RPC_URLS)
+deposit_watcher.register("usdt_bep20", usdt_deposit_fetcher("usdt_bep20", USDT_BEP20_CONTRACT, USDT_BEP20_DECIMALS), BEP20_RPC_URLS)
+deposit_watcher.register("usdt_polygon", usdt_deposit_fetcher("usdt_polygon", USDT_POLYGON_CONTRACT, USDT_POLYGON_DECIMALS), POLYGON_RPC_URLS)
+deposit_watcher.register("solana", fetch_solana_deposits, SOLANA_RPC_URLS)
+
+# USDT Transfer logs of watched deposit addresses (TXIDs and per-transfer amounts)
+transfer_logs.register("usdt_bep20", USDT_BEP20_CONTRACT, BEP20_RPC_URLS)
+transfer_logs.register("usdt_polygon", USDT_POLYGON_CONTRACT, POLYGON_RPC_URLS)
+
+
 async def check_payment_multicurrency(address, channel, expected_amount, deal_info, msg=None):
 
     currency = deal_info.get("currency")
@@ -3780,7 +3863,7 @@ async def check_payment_multicurrency(address, channel, expected_amount, deal_in
             if "expected_crypto_amount" not in deal_info:
                 deal_info["expected_crypto_amount"] = float(expected_amount)
                 data[deal_id]["expected_crypto_amount"] = float(expected_amount)
-                save_all_data(data)
+                await async_db.database.save_all_data(data)
     except: pass
 
     # MONITOR GUARD
@@ -3800,6 +3883,13 @@ async def check_payment_multicurrency(address, channel, expected_amount, deal_in
         bot.active_monitors.discard(lock_key)
         return
 
+    # Watch the deposit address (USDT deals also on the other USDT chain, for auto-switch)
+    watch_currencies = [currency]
+    if currency in ["usdt_bep20", "usdt_polygon"]:
+        watch_currencies.append("usdt_polygon" if currency == "usdt_bep20" else "usdt_bep20")
+    deposit_sub = deposit_watcher.watch(address, watch_currencies, expected_amount)
+    transfer_logs.watch(address, watch_currencies)
+
     monitoring_start_time = time.time()
 
     deal_creation_time = deal_info.get("start_time", monitoring_start_time)
@@ -3868,7 +3958,7 @@ async def check_payment_multicurrency(address, channel, expected_amount, deal_in
             data = load_all_data()
             if deal_id in data:
                 del data[deal_id]
-                save_all_data(data)
+                await async_db.database.save_all_data(data)
             
             await asyncio.sleep(2)
             await channel.delete()
@@ -3909,7 +3999,9 @@ async def check_payment_multicurrency(address, channel, expected_amount, deal_in
         if rescan_message:
             pass # Keep going, do not continue loop
 
-        await asyncio.sleep(1.5)  # Faster detection (1.5s interval)
+        # Balances come from the per-chain deposit watcher (services/deposit_watcher.py);
+        # wake up at least every few seconds for the status/expiry checks above
+        event = await deposit_sub.next(timeout=5)
 
         # RE-CHECK PAID STATUS (PREVENT OVERLAP)
         deal_tuple = get_deal_by_channel(channel.id)
@@ -3934,39 +4026,19 @@ async def check_payment_multicurrency(address, channel, expected_amount, deal_in
 
         # ======================
 
-        try:
-            # Determine tolerance (max 1% or flat 0.0001)
-            tolerance = min(0.0001, expected_amount * 0.01) if expected_amount > 0 else 0.0001
-
-            if currency == "ltc":
-                s = await api_get_status(address)
-                total = float(s["confirmed"] + s["unconfirmed"])
-                is_confirmed = total >= (expected_amount - tolerance)
-            elif currency == "usdt_bep20":
-                total = await get_usdt_balance_parallel(USDT_BEP20_CONTRACT, address, BEP20_RPC_URLS, USDT_BEP20_DECIMALS)
-                is_confirmed = total >= (expected_amount - tolerance) 
-            elif currency == "usdt_polygon":
-                total = await get_usdt_balance_parallel(USDT_POLYGON_CONTRACT, address, POLYGON_RPC_URLS, USDT_POLYGON_DECIMALS)
-                is_confirmed = total >= (expected_amount - tolerance)
-            elif currency == "solana":
-                total = await get_solana_balance_parallel(address)
-                is_confirmed = total >= (expected_amount - tolerance)
-            elif currency == "ethereum":
-                total = await get_eth_balance_parallel(address)
-                is_confirmed = total >= (expected_amount - tolerance)
-            else:
-                total = 0
-                is_confirmed = False
-                
-            # Log every check for debugging
-            if total > 0 or monitoring_elapsed % 30 < 2:
-                logger.debug(f"[MONITOR] Deal {deal_id[:8]} | {currency} | Val: {total} | Expected: {expected_amount} | Confirmed: {is_confirmed}")
-                
-        except Exception as balance_err:
-            print(f"[MONITOR_ERR] Balance check failed for {currency}: {balance_err}")
-            await asyncio.sleep(2)
+        if event is None:
             continue
 
+        if event.currency != currency:
+            # Funds on the other USDT chain only matter while the deal's own chain is empty
+            if deposit_sub.balance(currency) > 0:
+                continue
+        total = event.total
+        is_confirmed = event.kind == FULL
+
+        # Log every check for debugging
+        logger.debug(f"[MONITOR] Deal {deal_id[:8]} | {event.currency} | Val: {total} | Expected: {expected_amount} | Confirmed: {is_confirmed}")
+
         # DISMISS TIMEOUT/EXPIRY if funds found
         if total > 0 and rescan_message:
             try: 
@@ -3978,15 +4050,10 @@ async def check_payment_multicurrency(address, channel, expected_amount, deal_in
         # ======================
         # AUTO-SWITCH CHAIN (USDT)
         # ======================
-        if total == 0 and currency in ["usdt_bep20", "usdt_polygon"]:
+        if event.currency != currency:
             try:
-                alt_currency = "usdt_polygon" if currency == "usdt_bep20" else "usdt_bep20"
-                
-                # Check alternative
-                if alt_currency == "usdt_bep20":
-                     alt_total = await get_usdt_balance_parallel(USDT_BEP20_CONTRACT, address, BEP20_RPC_URLS, USDT_BEP20_DECIMALS)
-                else:
-                     alt_total = await get_usdt_balance_parallel(USDT_POLYGON_CONTRACT, address, POLYGON_RPC_URLS, USDT_POLYGON_DECIMALS)
+                alt_currency = event.currency
+                alt_total = event.total
                 
                 # If valid payment found on other chain
                 if alt_total > 0:
@@ -4004,7 +4071,7 @@ async def check_payment_multicurrency(address, channel, expected_amount, deal_in
                      data = load_all_data()
                      if deal_id in data:
                          data[deal_id]['currency'] = alt_currency
-                         save_all_data(data)
+                         await async_db.database.save_all_data(data)
                          
                      # 4. Notify
                      try:
@@ -4091,7 +4158,7 @@ async def check_payment_multicurrency(address, channel, expected_amount, deal_in
                                     # Update DB (since we need to remember this for next payment)
                                     data = load_all_data()
                                     data[deal_id]["_seen_txids"] = seen_txids
-                                    save_all_data(data)
+                                    await async_db.database.save_all_data(data)
                             else:
                                 temp_txid = temp_txids_list # Legacy/String
 
@@ -4116,7 +4183,7 @@ async def check_payment_multicurrency(address, channel, expected_amount, deal_in
                 # Save
                 data = load_all_data()
                 data[deal_id] = deal_info
-                save_all_data(data)
+                await async_db.database.save_all_data(data)
                 
                 # Calculate difference
                 # Calculate difference
@@ -4175,7 +4242,7 @@ async def check_payment_multicurrency(address, channel, expected_amount, deal_in
                     data = load_all_data()
                     if deal_id in data:
                         data[deal_id]["last_partial_notification_amount"] = float(total)
-                        save_all_data(data)
+                        await async_db.database.save_all_data(data)
 
                     continue
                     
@@ -4331,7 +4398,7 @@ async def handle_partial_payment_fast(channel, deal_info, received, expected, cu
 
     data[deal_id]["amount"] = float(usd_received)
 
-    save_all_data(data)
+    await async_db.database.save_all_data(data)
 
 
 
@@ -4673,11 +4740,14 @@ async def handle_full_payment(
         # Calculate initial USD Value
         usd_val = await currency_to_usd(float(received_amount), currency)
         
-        # Mark as paid in DB
-        data[deal_id]["amount"] = float(usd_val)
-        data[deal_id]["ltc_amount"] = float(received_amount)
-        data[deal_id]["paid"] = True
-        save_all_data(data)
+        # Mark as paid in DB (compare-and-set: only one verifier may credit the deal)
+        marked = await async_db.database.transition_deal(
+            deal_id,
+            {"amount": float(usd_val), "ltc_amount": float(received_amount), "paid": True},
+            guard=lambda d: not d.get('paid') and d.get('status') not in ['completed', 'cancelled', 'awaiting_withdrawal', 'refunded'],
+        )
+        if not marked:
+            return
 
         # UI cleanup: (Removed redundant deletion of the message we use for verification)
 
@@ -4692,8 +4762,8 @@ async def handle_full_payment(
 
         # Update Stats & Roles
         try:
-            update_user_stats(int(buyer_id), float(usd_val), float(received_amount), currency)
-            update_user_stats(int(seller_id), float(usd_val), float(received_amount), currency)
+            await async_db.database.update_user_stats(int(buyer_id), float(usd_val), float(received_amount), currency)
+            await async_db.database.update_user_stats(int(seller_id), float(usd_val), float(received_amount), currency)
             
             # [GAMIFICATION] Check achievements
             try:
@@ -4950,7 +5020,7 @@ async def handle_full_payment(
             deals[deal_id]['status'] = 'escrowed'
             if tx_hash:
                 deals[deal_id]['txid'] = tx_hash
-            save_all_data(deals)
+            await async_db.database.save_all_data(deals)
 
         # Generate Secure Banner
         file_attachment = None
@@ -5208,20 +5278,16 @@ class BuyerSellerModal(Modal, title="Fill properly below!"):
         try:
             # FIX: Global Lock for Ticket Creation to prevent race conditions
             async with TICKET_LOCK:
-                # Get next deal ID
-                counter = load_counter()
-                new_channel_number = counter + 1
+                # Get next deal number (served from the reserved block, no disk I/O)
+                new_channel_number = await deal_counter.allocate()
                 deal_prefix = f"auto-{new_channel_number}"
                 
                 # Check for existing channel with this name (Double safety)
                 existing_channel = discord.utils.get(guild.text_channels, name=deal_prefix)
                 if existing_channel:
                     # If it conflicts, skip ahead
-                    new_channel_number += 1
+                    new_channel_number = await deal_counter.allocate()
                     deal_prefix = f"auto-{new_channel_number}"
-
-                # Save new counter IMMEDIATELY
-                save_counter(new_channel_number)
                 
                 # Safe create with error handling
                 try:
@@ -5266,7 +5332,7 @@ class BuyerSellerModal(Modal, title="Fill properly below!"):
             }
             
             # Efficient save
-            update_deal(channel.id, new_deal)
+            await async_db.database.update_deal(channel.id, new_deal)
 
 
 
@@ -5374,7 +5440,7 @@ class BuyerSellerModal(Modal, title="Fill properly below!"):
             new_deal = load_all_data().get(deal_id)
             if new_deal:
                 new_deal["system_msg_id"] = msg_system.id
-                update_deal(channel.id, new_deal)
+                await async_db.database.update_deal(channel.id, new_deal)
             
             await interaction.followup.send(f"Deal created: {channel.mention}", ephemeral=True)
 
@@ -5496,7 +5562,7 @@ class ToSModal(Modal, title="Please tell properly!"):
                 
                 data = load_all_data()
                 data[deal_id] = deal
-                save_all_data(data)
+                await async_db.database.save_all_data(data)
 
             deal_id, deal = get_deal_by_channel(interaction.channel.id)
 
@@ -5576,7 +5642,7 @@ class ToSCoButtons(View):
                 return
             
             current_deal["tos_sender_agreed"] = True
-            save_all_data(data)
+            await async_db.database.save_all_data(data)
             await interaction.response.defer()
             await interaction.channel.send(
                 embed=discord.Embed(description=f"{interaction.user.mention} (Sender) has agreed.")
@@ -5589,7 +5655,7 @@ class ToSCoButtons(View):
                 return
             
             current_deal["tos_receiver_agreed"] = True
-            save_all_data(data)
+            await async_db.database.save_all_data(data)
             await interaction.response.defer()
             await interaction.channel.send(
                 embed=discord.Embed(description=f"{interaction.user.mention} (Receiver) has agreed.")
@@ -5607,7 +5673,7 @@ class ToSCoButtons(View):
 
         if sender_agreed and receiver_agreed and not tos_concluded:
             current_deal["tos_concluded"] = True
-            save_all_data(data)
+            await async_db.database.save_all_data(data)
             
             await interaction.message.edit(view=None, content=None)
 
@@ -5789,7 +5855,7 @@ class ToSCoButtons(View):
 
                             data[deal_id]["amount"] = amount
 
-                            save_all_data(data)
+                            await async_db.database.save_all_data(data)
 
 
 
@@ -5865,7 +5931,7 @@ class ToSCoButtons(View):
         if deal_id in data:
             data[deal_id]["tos_sender_agreed"] = False
             data[deal_id]["tos_receiver_agreed"] = False
-            save_all_data(data)
+            await async_db.database.save_all_data(data)
 
         tos_embed = discord.Embed(
             title="Product Details",
@@ -6254,7 +6320,7 @@ class ConfButtons(discord.ui.View):
             data[deal_id]["payment_timeout"] = data[deal_id].get("payment_timeout", 1200) + (15 * 60)
             data[deal_id]["extensions"] = current_extensions + 1
             data[deal_id]["last_activity"] = time.time()  # Prevent idle deletion
-            save_all_data(data)
+            await async_db.database.save_all_data(data)
             
         await interaction.response.send_message(f"✅ Payment timer extended by 15 minutes! (Used {current_extensions + 1}/2)", ephemeral=False)
 
@@ -6283,7 +6349,7 @@ class ConfButtons(discord.ui.View):
         deal["conf_receiver_confirmed"] = False
         deal["conf_tos_sent"] = False
         
-        update_deal(interaction.channel.id, deal)
+        await async_db.database.update_deal(interaction.channel.id, deal)
 
         embedd = discord.Embed(title="User Selection", color=0x0000ff)
         embedd.add_field(name="Sender", value="`None`", inline=False)
@@ -6344,7 +6410,7 @@ class ConfButtons(discord.ui.View):
              receiver_conf = True
         
         # Optimized Save: Only update this specific deal
-        update_deal(interaction.channel.id, current_deal)
+        await async_db.database.update_deal(interaction.channel.id, current_deal)
         
         confirm_embed = discord.Embed(
             description=f"{interaction.user.mention} ({'Sender' if uid == str(self.buyer) else 'Receiver'}) has confirmed.",
@@ -6357,7 +6423,7 @@ class ConfButtons(discord.ui.View):
 
         if sender_conf and receiver_conf and not tos_sent:
             current_deal["conf_tos_sent"] = True
-            update_deal(interaction.channel.id, current_deal)
+            await async_db.database.update_deal(interaction.channel.id, current_deal)
 
             embed = discord.Embed(title="User Confirmation", color=0x0000ff)
             embed.add_field(name="Sender", value=get_rich_user_display(interaction.guild, self.buyer), inline=False)
@@ -6427,7 +6493,7 @@ class ExtendButton(View):
         deal["start_time"] = time.time()
         deal["role_warning_sent"] = False
         deal["extension_count"] = extension_count + 1
-        update_deal(interaction.channel.id, deal)
+        await async_db.database.update_deal(interaction.channel.id, deal)
 
         # Update button label
         new_count = deal["extension_count"]
@@ -6473,7 +6539,7 @@ class SendButton(discord.ui.View):
         deal["start_time"] = time.time()
         deal["role_warning_sent"] = False
         deal["extension_count"] = extension_count + 1
-        update_deal(interaction.channel.id, deal)
+        await async_db.database.update_deal(interaction.channel.id, deal)
         
         # Update button label
         new_count = deal["extension_count"]
@@ -6524,7 +6590,7 @@ class SendButton(discord.ui.View):
 
             # Update DB - SENDER = buyer field
             deal["buyer"] = user_id
-            update_deal(channel_id, deal)
+            await async_db.database.update_deal(channel_id, deal)
 
             # Update Embed
             await self.update_message(interaction, deal)
@@ -6561,7 +6627,7 @@ class SendButton(discord.ui.View):
 
             # Update DB - RECEIVER = seller field
             deal["seller"] = user_id
-            update_deal(channel_id, deal)
+            await async_db.database.update_deal(channel_id, deal)
 
             # Update Embed
             await self.update_embed(interaction, deal)
@@ -6587,7 +6653,7 @@ class SendButton(discord.ui.View):
             deal["amt_receiver_confirmed"] = False
             deal["amount_final_embed_sent"] = False
             
-            update_deal(channel_id, deal)
+            await async_db.database.update_deal(channel_id, deal)
             await self.update_embed(interaction, deal)
         except Exception as e:
             print(f"Reset Error: {e}")
@@ -6921,7 +6987,7 @@ class AmountConButton(View):
                         data[deal_id]["amt_receiver_confirmed"] = False
                         data[deal_id]["amount_final_embed_sent"] = False
 
-                        save_all_data(data)
+                        await async_db.database.save_all_data(data)
 
 
 
@@ -7013,7 +7079,7 @@ class AmountConButton(View):
             else:
                 return await interaction.followup.send("You are not authorized to confirm.", ephemeral=True)
 
-            save_all_data(data)
+            await async_db.database.save_all_data(data)
         finally:
             if deal:
                 deal['_processing_confirm'] = False
@@ -7050,7 +7116,7 @@ class AmountConButton(View):
                         "payment_start_time": time.time(),
                         "last_activity": time.time()
                     })
-                    save_all_data(data)
+                    await async_db.database.save_all_data(data)
 
                 # Remove buttons from the confirmation message
                 try:
@@ -7089,7 +7155,7 @@ class AmountConButton(View):
                 # Update DB with flag
                 if deal_id in data:
                     data[deal_id]["amount_final_embed_sent"] = True
-                    save_all_data(data)
+                    await async_db.database.save_all_data(data)
 
                 # Payment Timeout Note
                 timeout_embed = discord.Embed(
@@ -7147,7 +7213,7 @@ class AddyButtons(View):
             data = load_all_data()
             if deal_id in data:
                 data[deal_id]['last_activity'] = time.time()
-                save_all_data(data)
+                await async_db.database.save_all_data(data)
         except: pass
             
         seller_id = deal.get('seller', 'None')
@@ -7185,7 +7251,7 @@ class AddyButtons(View):
             data = load_all_data()
             if deal_id in data:
                 data[deal_id]['last_activity'] = time.time()
-                save_all_data(data)
+                await async_db.database.save_all_data(data)
         except: pass
             
         seller_id = deal.get('seller', 'None')
@@ -7351,7 +7417,7 @@ class ProceedButton(View):
     
                      deal['ltc_amount'] = bal
     
-                     update_deal(interaction.channel.id, deal)
+                     await async_db.database.update_deal(interaction.channel.id, deal)
     
                      
     
@@ -7534,7 +7600,7 @@ class RescanButton(View):
 
         deal['payment_timeout'] = deal.get('payment_timeout', 1 * 1200) + 1 * 60
 
-        update_deal(interaction.channel.id, deal)
+        await async_db.database.update_deal(interaction.channel.id, deal)
 
         
 
@@ -7595,7 +7661,7 @@ class ContactModModal(Modal):
         
         # 1. Lock the deal
         self.deal['mod_locked'] = True
-        update_deal(interaction.channel_id, self.deal)
+        await async_db.database.update_deal(interaction.channel_id, self.deal)
         
         # 2. Notify in ticket channel
         embed = discord.Embed(
@@ -7792,7 +7858,7 @@ class ReleaseButton(View):
 
             deal["release_message_id"] = interaction.message.id
 
-            update_deal(interaction.channel.id, deal)
+            await async_db.database.update_deal(interaction.channel.id, deal)
 
 
 
@@ -7951,7 +8017,7 @@ class PartialPaymentView(View):
              d = load_all_data()
              if self.deal_id in d:
                  d[self.deal_id]['expected_crypto_amount'] = float(current_paid)
-                 save_all_data(d)
+                 await async_db.database.save_all_data(d)
         except: pass
 
         # 2. Trigger Full Payment Flow
@@ -8103,10 +8169,15 @@ class RefundModal(Modal):
         if not await is_valid_address(address, self.currency):
             return await interaction.followup.send(f"Invalid {self.currency_display} address.", ephemeral=True)
             
+        claimed, previous_status = await claim_deal_payout(self.deal_id, 'refunding')
+        if not claimed:
+            return await interaction.followup.send("A payout for this deal is already in progress or done.", ephemeral=True)
+        sent = False
         try:
             # REFUND: Send funds back (MAX - gas)
             # We pass amount=None to send everything
             tx_hash = await send_funds_based_on_currency(self.deal, address, amount=None)
+            sent = True
             
             explorer_url = get_explorer_url(self.currency, tx_hash)
             
@@ -8130,11 +8201,7 @@ class RefundModal(Modal):
             await interaction.followup.send(embed=embed, view=view)
             
             # Mark as finalized for 100s close
-            deals = load_all_data()
-            if self.deal_id in deals:
-                deals[self.deal_id]['status'] = 'refunded'
-                deals[self.deal_id]['last_activity'] = time.time()
-                save_all_data(deals)
+            await finalize_deal_status(self.deal_id, 'refunding', 'refunded')
             
             await interaction.channel.send("Refund complete. Closing channel in 100s...")
             await asyncio.sleep(100)
@@ -8145,6 +8212,8 @@ class RefundModal(Modal):
             await interaction.channel.delete()
 
         except Exception as e:
+            if not sent:
+                await release_deal_claim(self.deal_id, 'refunding', previous_status)
             await interaction.followup.send(f"Failed to process refund: `{str(e)}`", ephemeral=True)
 
 class WithdrawalModal(Modal):
@@ -8171,6 +8240,10 @@ class WithdrawalModal(Modal):
         if not await is_valid_address(address, self.currency):
             return await interaction.followup.send(f"Invalid {self.currency_display} address.", ephemeral=True)
             
+        claimed, previous_status = await claim_deal_payout(self.deal_id, 'releasing')
+        if not claimed:
+            return await interaction.followup.send("A payout for this deal is already in progress or done.", ephemeral=True)
+        sent = False
         try:
             seller_id = int(self.deal['seller'])
             buyer_id = int(self.deal['buyer'])
@@ -8187,6 +8260,7 @@ class WithdrawalModal(Modal):
 
             # Send funds with fee deduction (passes status_msg for gas funding updates)
             result = await send_funds_with_fee(self.deal, address, status_msg=status_msg)
+            sent = bool(result)
             
             # Final Status Update
             try: await status_msg.delete()
@@ -8229,7 +8303,7 @@ class WithdrawalModal(Modal):
             
             # Update user stats
             try:
-                update_user_stats(str(seller_id), usd_amount)
+                await async_db.database.update_user_stats(str(seller_id), usd_amount)
             except:
                 pass
             
@@ -8256,11 +8330,7 @@ class WithdrawalModal(Modal):
             await send_transcript(interaction.channel, seller_id, buyer_id, txid=main_tx)
             
             # Mark as finalized for 100s close
-            deals = load_all_data()
-            if self.deal_id in deals:
-                deals[self.deal_id]['status'] = 'released'
-                deals[self.deal_id]['last_activity'] = time.time()
-                save_all_data(deals)
+            await finalize_deal_status(self.deal_id, 'releasing', 'released')
             
             await asyncio.sleep(100)
             # Sweep Dust
@@ -8268,6 +8338,8 @@ class WithdrawalModal(Modal):
             await interaction.channel.delete()
 
         except Exception as e:
+            if not sent:
+                await release_deal_claim(self.deal_id, 'releasing', previous_status)
             await interaction.followup.send(f"Failed to send {self.currency_display}: `{str(e)}`", ephemeral=True)
 
 
@@ -8322,6 +8394,10 @@ class RefundModal(Modal):
         if not await is_valid_address(address, self.currency):
             return await interaction.followup.send(f"Invalid {self.currency_display} address.", ephemeral=True)
             
+        claimed, previous_status = await claim_deal_payout(self.deal_id, 'refunding')
+        if not claimed:
+            return await interaction.followup.send("A payout for this deal is already in progress or done.", ephemeral=True)
+        sent = False
         try:
             seller_id = int(self.deal['seller'])
             buyer_id = int(self.deal['buyer'])
@@ -8348,10 +8424,12 @@ class RefundModal(Modal):
                 gas_success = await ensure_deal_gas(self.deal, status_msg=status_msg)
                 if not gas_success:
                     await status_msg.delete()
+                    await release_deal_claim(self.deal_id, 'refunding', previous_status)
                     return await interaction.followup.send("Failed to fund gas for refund. Please contact support.", ephemeral=True)
 
             # [LOGGING] Gas funding happens inside send_funds_based_on_currency
             tx_hash = await send_funds_based_on_currency(self.deal, address, status_msg=status_msg)
+            sent = True
             
             # Final Status Update
             try: await status_msg.delete()
@@ -8373,11 +8451,7 @@ class RefundModal(Modal):
             await send_transcript(interaction.channel, seller_id, buyer_id, txid=tx_hash)
             
             # Mark as finalized for 100s close
-            deals = load_all_data()
-            if self.deal_id in deals:
-                deals[self.deal_id]['status'] = 'refunded'
-                deals[self.deal_id]['last_activity'] = time.time()
-                save_all_data(deals)
+            await finalize_deal_status(self.deal_id, 'refunding', 'refunded')
             
             await asyncio.sleep(100)
             # Sweep Dust
@@ -8385,6 +8459,8 @@ class RefundModal(Modal):
             await interaction.channel.delete()
 
         except Exception as e:
+            if not sent:
+                await release_deal_claim(self.deal_id, 'refunding', previous_status)
             await interaction.followup.send(f"Failed to refund {self.currency_display}: `{str(e)}`", ephemeral=True)
 
 
@@ -8495,7 +8571,7 @@ class ReleaseConButton(View):
             deals = load_all_data()
             if deal_id in deals:
                 deals[deal_id]['status'] = 'awaiting_withdrawal'
-                save_all_data(deals)
+                await async_db.database.save_all_data(deals)
 
             await interaction.channel.send(embed=em, view=WithdrawalView())
         
@@ -8747,7 +8823,7 @@ async def is_valid_ltc_address(address: str) -> bool:
 
 async def get_evm_nonce_parallel(address, currency):
     """Fetch current nonce from multiple RPCs for robustness."""
-    from web3 import AsyncWeb3, AsyncHTTPProvider
+    from web3 import AsyncWeb3
     
     # Map currency to correct RPC list
     rpc_urls = []
@@ -8763,10 +8839,9 @@ async def get_evm_nonce_parallel(address, currency):
     
     for rpc in rpc_urls:
         try:
-            w3 = AsyncWeb3(AsyncHTTPProvider(rpc, request_kwargs={"timeout": 5}))
-            if await w3.is_connected():
-                from_addr = AsyncWeb3.to_checksum_address(address)
-                return await w3.eth.get_transaction_count(from_addr)
+            w3 = await evm_providers.get(rpc, timeout=5)
+            from_addr = AsyncWeb3.to_checksum_address(address)
+            return await w3.eth.get_transaction_count(from_addr)
         except:
             continue
     return 0
@@ -8996,15 +9071,13 @@ async def check_txid_cmd(interaction: discord.Interaction, tx_signature: str):
 
             try:
 
-                w3 = Web3(Web3.HTTPProvider(rpc_url))
-
-                if w3.is_connected():
+                w3 = await evm_providers.get(rpc_url)
 
-                    tx_details = w3.eth.get_transaction(tx_signature)
+                tx_details = await w3.eth.get_transaction(tx_signature)
 
-                    if tx_details:
+                if tx_details:
 
-                        break
+                    break
 
             except:
 
@@ -9054,15 +9127,13 @@ async def check_txid_cmd(interaction: discord.Interaction, tx_signature: str):
 
             try:
 
-                w3 = Web3(Web3.HTTPProvider(rpc_url))
+                w3 = await evm_providers.get(rpc_url)
 
-                if w3.is_connected():
+                block = await w3.eth.get_block(block_number)
 
-                    block = w3.eth.get_block(block_number)
+                block_timestamp = block.timestamp
 
-                    block_timestamp = block.timestamp
-
-                    break
+                break
 
             except:
 
@@ -9206,7 +9277,7 @@ async def stats_cmd(interaction: discord.Interaction, user: discord.Member = Non
     await interaction.response.defer() # Not ephemeral, so others can see the flex
     
     target_user = user or interaction.user
-    stats = get_single_user_stats(target_user.id)
+    stats = await async_db.database.get_single_user_stats(target_user.id)
     
     deals = stats.get("deals", 0)
     volume = stats.get("volume", 0.0)
@@ -9453,7 +9524,7 @@ async def mod_lock(interaction: discord.Interaction, deal_id: str = None):
         return
 
     deal['mod_locked'] = True
-    update_deal(interaction.channel_id, deal)
+    await async_db.database.update_deal(interaction.channel_id, deal)
     await interaction.followup.send(f"✅ Deal `{deal_id}` has been locked by a moderator.", ephemeral=True)
     
     embed = discord.Embed(title="⚠️ Deal Locked", description="A moderator has locked the Release and Cancel buttons for this deal.", color=discord.Color.orange())
@@ -9492,7 +9563,7 @@ async def mod_unlock(interaction: discord.Interaction, deal_id: str = None):
         return
 
     deal['mod_locked'] = False
-    update_deal(interaction.channel_id, deal)
+    await async_db.database.update_deal(interaction.channel_id, deal)
     await interaction.followup.send(f"✅ Deal `{deal_id}` has been unlocked.", ephemeral=True)
 
     embed = discord.Embed(title="🔓 Deal Unlocked", description="A moderator has unlocked the Release and Cancel buttons for this deal.", color=discord.Color.green())
@@ -9613,7 +9684,7 @@ async def change_buyer_cmd(interaction: discord.Interaction, user: discord.Membe
 
     # 2. Update Database
     deal["buyer"] = str(user.id)
-    update_deal(deal.get("channel_id", interaction.channel_id), deal)
+    await async_db.database.update_deal(deal.get("channel_id", interaction.channel_id), deal)
     
     # 3. Update Embeds (Visual Sync)
     if channel:
@@ -9667,7 +9738,7 @@ async def change_seller_cmd(interaction: discord.Interaction, user: discord.Memb
 
     # 2. Update Database
     deal["seller"] = str(user.id)
-    update_deal(deal.get("channel_id", interaction.channel_id), deal)
+    await async_db.database.update_deal(deal.get("channel_id", interaction.channel_id), deal)
     
     # 3. Update Embeds (Visual Sync)
     if channel:
@@ -10020,27 +10091,66 @@ async def send_funds_command(interaction: discord.Interaction, deal_id: str, add
 
 
 
+LEADERBOARD_PAGE_SIZE = 10
+
+class LeaderboardView(View):
+    """Keyset-paginated leaderboard (each page starts after the last row of the previous one)."""
+    def __init__(self, viewer_id):
+        super().__init__(timeout=180)
+        self.viewer_id = viewer_id
+        self.cursors = [None] # Cursor that starts each visited page
+        self.next_cursor = None
+
+    async def build_embed(self):
+        after = self.cursors[-1]
+        entries, self.next_cursor = await async_db.database.get_leaderboard_page(after=after, limit=LEADERBOARD_PAGE_SIZE)
+        offset = leaderboard_service.offset_of(after)
+
+        desc = ""
+        for idx, (uid, stats) in enumerate(entries, offset + 1):
+            desc += f"**{idx}.** <@{uid}> - `${stats['volume']:.2f}` ({stats['deals']} deals)\n"
+
+        embed = discord.Embed(
+            title="🏆 RainyDay Leaderboard",
+            description=desc or "No stats available yet.",
+            color=0xffd700
+        )
+        my_rank = await async_db.database.get_user_rank(self.viewer_id)
+        footer = f"RainyDay MM Stats • Page {len(self.cursors)}"
+        if my_rank:
+            footer += f" • Your rank: #{my_rank}"
+        embed.set_footer(text=footer)
+
+        self.prev_page.disabled = len(self.cursors) == 1
+        self.next_page.disabled = self.next_cursor is None
+        return embed, bool(entries)
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary, emoji="◀️")
+    async def prev_page(self, interaction: discord.Interaction, button: Button):
+        if len(self.cursors) > 1:
+            self.cursors.pop()
+        embed, _ = await self.build_embed()
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary, emoji="▶️")
+    async def next_page(self, interaction: discord.Interaction, button: Button):
+        if self.next_cursor is not None:
+            self.cursors.append(self.next_cursor)
+        embed, _ = await self.build_embed()
+        await interaction.response.edit_message(embed=embed, view=self)
+
 @bot.tree.command(name="leaderboard", description="Show top users by volume")
 async def leaderboard(interaction: discord.Interaction):
     try:
         await interaction.response.defer(ephemeral=False)
         
-        top_users = get_top_users(limit=10)
+        view = LeaderboardView(interaction.user.id)
+        embed, has_entries = await view.build_embed()
         
-        if not top_users:
+        if not has_entries:
             return await interaction.followup.send("No stats available yet.", ephemeral=True)
-        
-        desc = ""
-        for idx, (uid, stats) in enumerate(top_users, 1):
-            desc += f"**{idx}.** <@{uid}> - `${stats['volume']:.2f}` ({stats['deals']} deals)\n"
             
-        embed = discord.Embed(
-            title="🏆 RainyDay Leaderboard",
-            description=desc,
-            color=0xffd700
-        )
-        embed.set_footer(text="RainyDay MM Stats")
-        await interaction.followup.send(embed=embed)
+        await interaction.followup.send(embed=embed, view=view)
         
     except Exception as e:
         print(f"[Leaderboard Error] {e}")
@@ -10057,9 +10167,10 @@ async def recover_cmd(interaction: discord.Interaction, deal_id: str):
     if interaction.user.id not in OWNER_IDS:
         return await interaction.followup.send("Not authorized.", ephemeral=True)
         
-    deal_info = get_deal_by_dealid(deal_id)
+    deal_info = await async_db.database.find_deal(deal_id)
     if not deal_info:
         return await interaction.followup.send(f"Deal ID `{deal_id}` not found in database.", ephemeral=True)
+    deal_info.pop('archived_at', None)
         
     guild = interaction.guild
     if not guild:
@@ -10094,7 +10205,7 @@ async def recover_cmd(interaction: discord.Interaction, deal_id: str):
         deal_info['channel_id'] = new_channel.id
         data = load_all_data()
         data[deal_id] = deal_info
-        save_all_data(data)
+        await async_db.database.save_all_data(data)
         
         await interaction.followup.send(f"Recovered channel: {new_channel.mention}", ephemeral=True)
         
@@ -10223,7 +10334,7 @@ async def recover_cmd(interaction: discord.Interaction, deal_id: str):
                     
                     data = load_all_data()
                     data[deal_id] = deal_info
-                    save_all_data(data)
+                    await async_db.database.save_all_data(data)
                 else:
                     # No amount set, show currency selection
                     await new_channel.send(embed=discord.Embed(title="Restored Session", description="Please select currency."), view=CurrencySelectView())
@@ -10351,16 +10462,15 @@ async def vc_stats_loop():
         if not stats_channels:
             return
             
-        data = load_all_data()
-        user_stats = load_user_stats()
+        totals = await async_db.database.get_global_stats()
         
         # Calculate stats
         # Total volume is sum of all user volumes / 2 (since both buyer and seller get credit)
-        raw_volume = sum(u.get('volume', 0.0) for u in user_stats.values())
-        total_volume = raw_volume / 2
-        total_deals = sum(u.get('deals', 0) for u in user_stats.values())
-        active_deals = len([d for d in data.values() if d.get('status') in ['started', 'awaiting_withdrawal']])
-        total_users = len(user_stats)
+        total_volume = totals['total_volume'] / 2
+        total_deals = totals['total_deals']
+        statuses = totals['statuses']
+        active_deals = statuses.get('started', 0) + statuses.get('awaiting_withdrawal', 0)
+        total_users = totals['user_count']
         
         # Update each channel
         updates = [
@@ -10391,24 +10501,35 @@ async def check_idle_deals():
         current_time = time.time()
         
         for deal_id, deal in list(data.items()):
+            # Cached deals are Deal objects: fields are plain slot reads (None when unset)
+            status = deal.status
+
             # 1. SKIP if funds are detected/paid (Never auto-close funded deals)
-            if deal.get('paid') or deal.get('status') in ['escrowed', 'awaiting_withdrawal', 'awaiting_confirmation']:
+            if deal.paid or status in ('escrowed', 'awaiting_withdrawal', 'awaiting_confirmation'):
                 continue
 
-            channel_id = deal.get("channel_id")
+            channel_id = deal.channel_id
             if not channel_id:
                 continue
                 
             channel = bot.get_channel(int(channel_id))
             if not channel:
-                # Channel deleted manually? Clean up data.
-                del data[deal_id]
-                save_all_data(data)
-                continue
+                # A cache miss is not proof of deletion: only clean up when Discord confirms it
+                try:
+                    channel = await bot.fetch_channel(int(channel_id))
+                except discord.NotFound:
+                    print(f"[AutoClose] Channel of deal {deal_id} was deleted, removing deal")
+                    del data[deal_id]
+                    await async_db.database.save_all_data(data)
+                    continue
+                except Exception as e:
+                    print(f"[AutoClose] Could not fetch channel of {deal_id}, retrying next cycle: {e}")
+                    continue
 
-            last_act = deal.get("last_activity", deal.get("start_time", current_time))
+            last_act = deal.last_activity
+            if last_act is None:
+                last_act = deal.start_time if deal.start_time is not None else current_time
             elapsed = current_time - last_act
-            status = deal.get("status")
 
             # 2. FINALIZED CLOSE (100 seconds)
             if status in ['released', 'refunded', 'cancelled']:
@@ -10418,7 +10539,7 @@ async def check_idle_deals():
                         await sweep_dust_fees(deal_id, deal)
                         await channel.delete()
                         del data[deal_id]
-                        save_all_data(data)
+                        await async_db.database.save_all_data(data)
                     except Exception as e:
                         print(f"[AutoClose] Error closing finalized {deal_id}: {e}")
                 continue
@@ -10440,12 +10561,12 @@ async def check_idle_deals():
                     await sweep_dust_fees(deal_id, deal)
                     await channel.delete()
                     del data[deal_id]
-                    save_all_data(data)
+                    await async_db.database.save_all_data(data)
                 except Exception as e:
                     print(f"[AutoClose] Error closing idle {deal_id}: {e}")
             
             # Warning at 50 minutes (3000 seconds)
-            elif elapsed > 3000 and not deal.get("idle_warning_sent"):
+            elif elapsed > 3000 and not deal.idle_warning_sent:
                 try:
                     embed = discord.Embed(
                         title="⏳ Inactivity Warning",
@@ -10456,8 +10577,8 @@ async def check_idle_deals():
                         color=discord.Color.orange()
                     )
                     await channel.send(embed=embed)
-                    deal["idle_warning_sent"] = True
-                    save_all_data(data)
+                    deal.idle_warning_sent = True
+                    await async_db.database.save_all_data(data)
                 except:
                     pass
 
@@ -10577,21 +10698,19 @@ async def find_deal_id_cmd(
 
     if address:
 
-        for deal_id, deal in data.items():
+        found_deal = data.find_by_address(address)
+        if found_deal[0]:
 
-            if deal.get("address") == address:
-
-                found_deals.append((deal_id, deal))
+            found_deals.append(found_deal)
 
     
 
     if channel_id:
 
-        for deal_id, deal in data.items():
-
-            if str(deal.get("channel_id")) == str(channel_id):
+        found_deal = data.find_by_channel(channel_id)
+        if found_deal[0]:
 
-                found_deals.append((deal_id, deal))
+            found_deals.append(found_deal)
 
 
 
@@ -10656,7 +10775,7 @@ async def refresh_deal(interaction: discord.Interaction):
     data = load_all_data()
     if deal_id in data:
         data[deal_id]['last_activity'] = time.time()
-        save_all_data(data)
+        await async_db.database.save_all_data(data)
         
     status = deal.get("status")
     paid = deal.get("paid")
@@ -10791,7 +10910,7 @@ async def change_channel_id_cmd(interaction: discord.Interaction, deal_id: str,
 
     data[deal_id]["channel_id"] = new_channel_id
 
-    save_all_data(data)
+    await async_db.database.save_all_data(data)
 
 
 
@@ -10930,7 +11049,7 @@ async def close_command(interaction: discord.Interaction):
 
 
 
-        if isinstance(deal, dict):
+        if isinstance(deal, (dict, Deal)):
 
             if deal.get("seller") not in ("None", None, ""):
 
@@ -11574,11 +11693,13 @@ async def on_ready():
     # ========== STARTUP RECOVERY: Resume payment monitoring ==========
     print("[Startup Recovery] Checking for pending payment deals...")
     data = load_all_data()
-    print(f"[Startup Recovery] Found {len(data)} total deals in database")
+    # Only deals with a deposit address can be waiting for a payment (address index, no full scan)
+    candidates = data.find_with_address()
+    print(f"[Startup Recovery] Found {len(data)} total deals in database, {len(candidates)} with a deposit address")
     current_time = time.time()
     recovered_count = 0
     
-    for deal_id, deal_info in data.items():
+    for deal_id, deal_info in candidates:
         try:
             # Skip deals without address (not in payment phase)
             address = deal_info.get('address')
@@ -11636,29 +11757,24 @@ async def on_member_join(member):
     Restore access to active deals if a user rejoins.
     """
     guild = member.guild
-    data = load_all_data()
     
     restored_count = 0
     seen_channels = set()
     
-    for deal_id, info in data.items():
-        # Check if user is buyer or seller
-        buyer_id = str(info.get('buyer', ''))
-        seller_id = str(info.get('seller', ''))
-        
-        if str(member.id) in [buyer_id, seller_id]:
-            channel_id = info.get('channel_id')
-            if channel_id and channel_id not in seen_channels:
-                channel = guild.get_channel(int(channel_id))
-                if channel:
-                    try:
-                        await channel.set_permissions(member, read_messages=True, send_messages=True)
-                        await channel.send(f"Welcome back {member.mention}! Access restored.")
-                        restored_count += 1
-                        seen_channels.add(channel_id)
-                    except Exception as e:
-                        print(f"Failed to restore access for {member}: {e}")
-                        
+    # Participant index: only deals where the user is buyer or seller
+    for deal_id, info in get_deals_by_participant(member.id):
+        channel_id = info.get('channel_id')
+        if channel_id and channel_id not in seen_channels:
+            channel = guild.get_channel(int(channel_id))
+            if channel:
+                try:
+                    await channel.set_permissions(member, read_messages=True, send_messages=True)
+                    await channel.send(f"Welcome back {member.mention}! Access restored.")
+                    restored_count += 1
+                    seen_channels.add(channel_id)
+                except Exception as e:
+                    print(f"Failed to restore access for {member}: {e}")
+                    
     if restored_count > 0:
         print(f"Restored {restored_count} channels for returning member {member}")
 
@@ -11800,7 +11916,7 @@ async def on_message(message):
     did, dinfo = get_deal_by_channel(message.channel.id)
     if dinfo:
         dinfo['last_activity'] = time.time()
-        update_deal(message.channel.id, dinfo)
+        await async_db.database.update_deal(message.channel.id, dinfo)
 
     user_id = message.author.id
 
@@ -11974,7 +12090,7 @@ async def send_transcript(channel, seller_id, buyer_id, txid: str | None = None)
 
 
 
-        if isinstance(deal, dict):
+        if isinstance(deal, (dict, Deal)):
 
             creator_raw = deal.get("creator_id", seller_id) or seller_id
 
@@ -12084,7 +12200,7 @@ async def send_transcript(channel, seller_id, buyer_id, txid: str | None = None)
             # 1. Gather Data (from deal dict if available)
             amount = "Unknown"
             currency = "Unknown"
-            if deal and isinstance(deal, dict):
+            if deal and isinstance(deal, (dict, Deal)):
                 amount = deal.get("amount", "0.0")
                 currency = deal.get("currency", "Unknown")
             
@@ -1,7 +1,7 @@
 import discord
 from services.db_manager import db
 from services.notification_service import notification_service
-import database
+from services.async_db import async_db
 
 class AchievementService:
     def __init__(self):
@@ -22,7 +22,7 @@ class AchievementService:
         if not user_obj:
             return
 
-        stats = database.get_gamified_stats(user_id)
+        stats = await async_db.database.get_gamified_stats(user_id)
         current_unlocked = set(stats.get('achievements', []))
         new_unlocked = list(current_unlocked)
         earned_this_time = []
@@ -34,7 +34,7 @@ class AchievementService:
                     earned_this_time.append(info)
 
         if earned_this_time:
-            database.update_achievements(user_id, new_unlocked)
+            await async_db.database.update_achievements(user_id, new_unlocked)
             for ach in earned_this_time:
                 await self.notify_achievement(user_obj, ach)
 
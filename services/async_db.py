@@ -0,0 +1,147 @@
+import asyncio
+import functools
+import importlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from services.db_manager import db
+
+logger = logging.getLogger("AsyncDB")
+
+# Helper names with these prefixes only read; everything else is routed to the writer
+READ_PREFIXES = ("get_", "load_", "is_", "find_", "count_", "query_", "search_")
+
+# Read-named helpers that also write (archive sweep, backfills, create-on-read)
+DATABASE_WRITES = ("load_all_data", "get_gamified_stats")
+REFERRAL_WRITES = ("get_referral_code",)
+
+
+class AsyncFacade:
+    """
+    Awaitable mirror of a sync module or service object.
+
+    `await facade.some_helper(*args)` runs `target.some_helper(*args)` on the
+    reader pool (names starting with READ_PREFIXES) or on the writer
+    executor (everything else, including the names listed in `writes`).
+    Explicit coroutine overrides can be passed for helpers that are mostly
+    in-memory and should stay on the loop.
+    """
+
+    def __init__(self, owner, target, overrides=None, writes=()):
+        self._owner = owner
+        self._target = target
+        self._overrides = overrides or {}
+        self._writes = frozenset(writes)
+        self._wrapped = {}
+
+    def _resolve_target(self):
+        # "module" or "module:attr", imported lazily (services import database, which imports us)
+        if isinstance(self._target, str):
+            module_name, _, attr = self._target.partition(":")
+            target = importlib.import_module(module_name)
+            self._target = getattr(target, attr) if attr else target
+        return self._target
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name in self._overrides:
+            return self._overrides[name]
+        wrapped = self._wrapped.get(name)
+        if wrapped is None:
+            func = getattr(self._resolve_target(), name)
+            if not callable(func):
+                raise AttributeError(f"{name} is not a callable helper")
+            reads = name.startswith(READ_PREFIXES) and name not in self._writes
+            run = self._owner.run_read if reads else self._owner.run_write
+
+            @functools.wraps(func)
+            async def wrapped(*args, **kwargs):
+                return await run(func, *args, **kwargs)
+
+            self._wrapped[name] = wrapped
+        return wrapped
+
+
+class AsyncDB:
+    """
+    Runs blocking sqlite3/psycopg2 work off the discord.py event loop.
+
+    SQLite: one dedicated writer thread (serializes writes, so no two
+    threads fight over the write lock) plus a small reader pool (WAL lets
+    readers run concurrently with the writer).
+    Postgres: a shared worker pool sized to the connection pool.
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        if manager.db_type == "sqlite":
+            readers = int(os.getenv("DB_READER_THREADS", "4"))
+            self.write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+            self.read_executor = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="db-reader")
+        else:
+            workers = int(os.getenv("DB_WORKER_THREADS", "10"))
+            self.write_executor = self.read_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db-worker")
+
+        self.database = AsyncFacade(self, "database", overrides={
+            "update_deal": self._update_deal,
+            "save_all_data": self._save_all_data,
+            "get_deal_by_channel": self._get_deal_by_channel,
+            "get_deal_by_dealid": self._get_deal_by_dealid,
+        }, writes=DATABASE_WRITES)
+        self.audit = AsyncFacade(self, "services.audit_service:audit_service")
+        self.alerts = AsyncFacade(self, "services.alert_service:alert_service")
+        self.tracking = AsyncFacade(self, "services.transaction_tracking_service:tracking_service")
+        self.reputation = AsyncFacade(self, "services.reputation_service:reputation_service")
+        self.blacklist = AsyncFacade(self, "services.blacklist_service:blacklist_service")
+        self.referral = AsyncFacade(self, "services.referral_service:referral_service", writes=REFERRAL_WRITES)
+
+    async def run_read(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.read_executor, functools.partial(func, *args, **kwargs))
+
+    async def run_write(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.write_executor, functools.partial(func, *args, **kwargs))
+
+    # --- Deal cache helpers: in-memory part on the loop, only the flush goes to the writer ---
+    async def _update_deal(self, channel_id, deal_data):
+        import database
+        database._cache_deal(channel_id, deal_data)
+        await self._persist_changes()
+
+    async def _save_all_data(self, data):
+        import database
+        if database.GLOBAL_DEAL_CACHE is None:
+            return await self.run_write(database.save_all_data, data)
+        database.GLOBAL_DEAL_CACHE.replace_all(data)
+        await self._persist_changes()
+
+    async def _persist_changes(self):
+        import database
+        writer = database.deal_writer
+        if writer.has_critical():
+            await self.run_write(writer.flush)
+        else:
+            writer.request_flush()
+
+    async def _get_deal_by_channel(self, channel_id):
+        import database
+        if database.GLOBAL_DEAL_CACHE is None:
+            await self.run_write(database.load_all_data)
+        return database.get_deal_by_channel(channel_id)
+
+    async def _get_deal_by_dealid(self, deal_id):
+        import database
+        if database.GLOBAL_DEAL_CACHE is None:
+            await self.run_write(database.load_all_data)
+        return database.get_deal_by_dealid(deal_id)
+
+    def shutdown(self):
+        self.write_executor.shutdown(wait=True)
+        if self.read_executor is not self.write_executor:
+            self.read_executor.shutdown(wait=True)
+
+
+async_db = AsyncDB(db)
@@ -1,35 +1,354 @@
+import atexit
+import gzip
+import json
 import logging
+import os
+import threading
 import time
-import asyncio
+from collections import deque
+from datetime import datetime, timezone
 from services.db_manager import db
+from services.async_db import async_db
+from services.schema_migrations import create_audit_indexes
 
 logger = logging.getLogger("AuditService")
 
+AUDIT_COLUMNS = "id, action, user_id, target_id, details, timestamp"
+AUDIT_EXPORT_DIR = os.getenv("AUDIT_EXPORT_DIR", "audit_exports")
+
+def _month_start(year, month):
+    return datetime(year, month, 1, tzinfo=timezone.utc)
+
+def _next_month(start):
+    return _month_start(start.year + start.month // 12, start.month % 12 + 1)
+
+def segment_name(start):
+    """Monthly archive table holding the audit rows of the month starting at `start`."""
+    return f"audit_logs_{start.year:04d}{start.month:02d}"
+
 class AuditService:
+    """
+    Buffered audit log.
+
+    `log_action` only appends to a bounded in-memory queue, so it adds no
+    latency to interactions. A background thread drains the queue with one
+    `executemany` transaction every `flush_interval` seconds, or as soon as
+    `batch_size` records are waiting. When the queue is full new records
+    are dropped and counted in `stats["dropped"]`; everything still queued
+    is written on shutdown.
+    """
+
+    def __init__(self, flush_interval=0.25, batch_size=200, max_queue=10000, executor=None):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self._executor = executor             # DB writer thread, if the app has one
+        self._queue = deque()
+        self._lock = threading.Lock()         # guards the queue
+        self._flush_lock = threading.Lock()   # one flush at a time, in order
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._stopped = False
+        self.stats = {"queued": 0, "written": 0, "dropped": 0, "flushes": 0, "errors": 0}
+
     def log_action(self, action, user_id, target_id=None, details=None):
         """
-        Log an action to the database asynchronously (fire and forget wrapper).
+        Queue an action for the audit log (non-blocking, fire and forget).
         """
-        try:
-            # Since we are likely in an async context, ideally we run this in an executor or use asyncpg.
-            # However, our DBManager is sync. For now, running sync in the main thread for simplicity 
-            # as these are quick inserts. If performance suffers, we move to a thread.
-            self._log_sync(action, user_id, target_id, details)
-        except Exception as e:
-            logger.error(f"Failed to log action {action}: {e}")
+        record = (action, str(user_id), str(target_id) if target_id else None, details, time.time())
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                self.stats["dropped"] += 1
+                if self.stats["dropped"] % 1000 == 1:
+                    logger.warning(f"Audit queue full ({self.max_queue}); dropped {self.stats['dropped']} records so far")
+                return
+            self._queue.append(record)
+            self.stats["queued"] += 1
+            size = len(self._queue)
+        if self._thread is None:
+            self.start()
+        if size >= self.batch_size:
+            self._wakeup.set()
 
-    def _log_sync(self, action, user_id, target_id, details):
-        try:
-            with db.session() as conn:
-                cursor = conn.cursor()
+    def pending(self):
+        return len(self._queue)
+
+    def flush(self):
+        """Synchronously write every queued record. Returns False if a batch failed (it stays queued)."""
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    if not self._queue:
+                        return True
+                    batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
                 try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    logger.error(f"DB Error logging {len(batch)} actions: {e}")
+                    with self._lock:
+                        # Put the batch back in front, as far as the bound allows
+                        room = max(self.max_queue - len(self._queue), 0)
+                        self.stats["dropped"] += len(batch) - min(room, len(batch))
+                        self._queue.extendleft(reversed(batch[:room]))
+                    return False
+                self.stats["written"] += len(batch)
+                self.stats["flushes"] += 1
+
+    def _write_batch(self, batch):
+        with db.session() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.executemany(f"""
+                    INSERT INTO audit_logs (action, user_id, target_id, details, timestamp)
+                    VALUES ({db.p}, {db.p}, {db.p}, {db.p}, {db.p})
+                """, batch)
+            finally:
+                cursor.close()
+
+    # --- Queries ---
+    def _segment_tables(self, since=None, until=None):
+        # Rolled-over months overlapping [since, until) that still exist as tables
+        sql = "SELECT name FROM audit_segments WHERE dropped = 0"
+        params = []
+        if since is not None:
+            sql += f" AND month_end > {db.p}"
+            params.append(since)
+        if until is not None:
+            sql += f" AND month_start < {db.p}"
+            params.append(until)
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql + " ORDER BY month_start DESC", params)
+                return [row[0] for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+
+    def query_actions(self, user_id=None, target_id=None, action=None, since=None, until=None,
+                      before=None, limit=25, archived=False):
+        """
+        Newest-first audit records matching every given filter.
+
+        Keyset paginated: pass the returned cursor as `before` for the next
+        page. Each filter is served by a (column, timestamp) index. With
+        `archived=True` rolled-over monthly tables in the time range are
+        searched too. Returns (records, next_cursor); next_cursor is None
+        on the last page. Records still in the write queue are not visible.
+        """
+        conditions, params = [], []
+        for column, value in (("user_id", user_id), ("target_id", target_id), ("action", action)):
+            if value is not None:
+                conditions.append(f"{column} = {db.p}")
+                params.append(str(value))
+        if since is not None:
+            conditions.append(f"timestamp >= {db.p}")
+            params.append(since)
+        if until is not None:
+            conditions.append(f"timestamp < {db.p}")
+            params.append(until)
+        if before is not None:
+            conditions.append(f"(timestamp < {db.p} OR (timestamp = {db.p} AND id < {db.p}))")
+            params.extend((before[0], before[0], before[1]))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = f"ORDER BY timestamp DESC, id DESC LIMIT {int(limit) + 1}"
+
+        tables = ["audit_logs"]
+        if archived:
+            tables += self._segment_tables(since, until)
+        parts = [f"SELECT * FROM (SELECT {AUDIT_COLUMNS} FROM {table} {where} {order}) AS s{i}" for i, table in enumerate(tables)]
+        sql = " UNION ALL ".join(parts) + (f" {order}" if len(parts) > 1 else "")
+
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql, params * len(parts))
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+
+        records = [
+            {"id": r[0], "action": r[1], "user_id": r[2], "target_id": r[3], "details": r[4], "timestamp": r[5]}
+            for r in rows[:limit]
+        ]
+        next_cursor = (records[-1]["timestamp"], records[-1]["id"]) if len(rows) > limit else None
+        return records, next_cursor
+
+    def get_segments(self):
+        """Rolled-over monthly segments, newest first."""
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    SELECT name, month_start, month_end, row_count, export_path, exported_at, dropped
+                    FROM audit_segments ORDER BY month_start DESC
+                """)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+        keys = ("name", "month_start", "month_end", "row_count", "export_path", "exported_at", "dropped")
+        return [dict(zip(keys, row)) for row in rows]
+
+    # --- Retention ---
+    def rollover(self, live_months=1, now=None):
+        """
+        Move records older than the current month and the `live_months`
+        before it into monthly tables (audit_logs_YYYYMM), one transaction
+        per month. Safe to re-run. Returns the segment names written to.
+        """
+        self.flush()
+        today = datetime.fromtimestamp(now or time.time(), tz=timezone.utc)
+        index = today.year * 12 + today.month - 1 - live_months
+        cutoff = _month_start(index // 12, index % 12 + 1)
+
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(f"SELECT MIN(timestamp) FROM audit_logs WHERE timestamp < {db.p}", (cutoff.timestamp(),))
+                oldest = cursor.fetchone()[0]
+            finally:
+                cursor.close()
+        if oldest is None:
+            return []
+
+        first = datetime.fromtimestamp(oldest, tz=timezone.utc)
+        start = _month_start(first.year, first.month)
+        written = []
+        while start < cutoff:
+            end = _next_month(start)
+            name = segment_name(start)
+            moved = self._roll_month(name, start.timestamp(), end.timestamp())
+            if moved:
+                written.append(name)
+                logger.info(f"Rolled {moved} audit records over to {name}")
+            start = end
+        return written
+
+    def _roll_month(self, name, start, end):
+        insert = "INSERT OR IGNORE INTO" if db.db_type == "sqlite" else "INSERT INTO"
+        conflict = "" if db.db_type == "sqlite" else " ON CONFLICT (id) DO NOTHING"
+        with db.session() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {name} (
+                        id INTEGER PRIMARY KEY,
+                        action TEXT,
+                        user_id TEXT,
+                        target_id TEXT,
+                        details TEXT,
+                        timestamp REAL
+                    )
+                """)
+                create_audit_indexes(cursor, name)
+                cursor.execute(f"""
+                    {insert} {name} ({AUDIT_COLUMNS})
+                    SELECT {AUDIT_COLUMNS} FROM audit_logs WHERE timestamp >= {db.p} AND timestamp < {db.p}{conflict}
+                """, (start, end))
+                cursor.execute(f"DELETE FROM audit_logs WHERE timestamp >= {db.p} AND timestamp < {db.p}", (start, end))
+                moved = cursor.rowcount
+                if moved:
                     cursor.execute(f"""
-                        INSERT INTO audit_logs (action, user_id, target_id, details, timestamp)
-                        VALUES ({db.p}, {db.p}, {db.p}, {db.p}, {db.p})
-                    """, (action, str(user_id), str(target_id) if target_id else None, details, time.time()))
-                finally:
-                    cursor.close()
-        except Exception as e:
-            logger.error(f"DB Error logging action: {e}")
-
-audit_service = AuditService()
+                        INSERT INTO audit_segments (name, month_start, month_end, row_count)
+                        VALUES ({db.p}, {db.p}, {db.p}, {db.p})
+                        ON CONFLICT(name) DO UPDATE SET row_count = audit_segments.row_count + EXCLUDED.row_count,
+                                                        exported_at = NULL, dropped = 0
+                    """, (name, start, end, moved))
+                return moved
+            finally:
+                cursor.close()
+
+    def export_segment(self, name, directory=AUDIT_EXPORT_DIR, drop=False):
+        """
+        Stream a rolled-over segment to `<directory>/<name>.jsonl.gz` (one JSON
+        record per line). With `drop=True` the table is dropped once the file
+        is complete. Returns the export path, or None for an unknown segment.
+        """
+        segment = next((s for s in self.get_segments() if s["name"] == name and not s["dropped"]), None)
+        if segment is None:
+            return None
+
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{name}.jsonl.gz")
+        if os.path.exists(path):
+            # Late rows re-created an already exported month; never overwrite the earlier file
+            path = os.path.join(directory, f"{name}.{int(time.time())}.jsonl.gz")
+        tmp_path = path + ".tmp"
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(f"SELECT {AUDIT_COLUMNS} FROM {name} ORDER BY timestamp, id")
+                with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+                    while True:
+                        rows = cursor.fetchmany(1000)
+                        if not rows:
+                            break
+                        for r in rows:
+                            f.write(json.dumps({"id": r[0], "action": r[1], "user_id": r[2], "target_id": r[3],
+                                                "details": r[4], "timestamp": r[5]}) + "\n")
+            finally:
+                cursor.close()
+        os.replace(tmp_path, path)
+
+        with db.session() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(
+                    f"UPDATE audit_segments SET export_path = {db.p}, exported_at = {db.p}, dropped = {db.p} WHERE name = {db.p}",
+                    (path, time.time(), 1 if drop else 0, name)
+                )
+                if drop:
+                    cursor.execute(f"DROP TABLE IF EXISTS {name}")
+            finally:
+                cursor.close()
+        logger.info(f"Exported audit segment {name} to {path}{' and dropped it' if drop else ''}")
+        return path
+
+    def export_pending(self, directory=AUDIT_EXPORT_DIR, drop=False):
+        """Export every segment that changed since its last export. Returns the export paths."""
+        paths = []
+        for segment in self.get_segments():
+            if segment["exported_at"] is None and not segment["dropped"]:
+                try:
+                    paths.append(self.export_segment(segment["name"], directory, drop))
+                except Exception as e:
+                    logger.error(f"Failed to export audit segment {segment['name']}: {e}")
+        return paths
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if not self._queue:
+                continue
+            if self._executor is not None:
+                try:
+                    self._executor.submit(self.flush).result()
+                    continue
+                except RuntimeError:
+                    pass # Executor already shut down
+            self.flush()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Stop the background thread and write everything still queued."""
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+audit_service = AuditService(
+    flush_interval=float(os.getenv("AUDIT_FLUSH_MS", "250")) / 1000,
+    batch_size=int(os.getenv("AUDIT_BATCH_SIZE", "200")),
+    max_queue=int(os.getenv("AUDIT_QUEUE_MAX", "10000")),
+    executor=async_db.write_executor,
+)
@@ -1,15 +1,18 @@
 try:
     import psycopg2
     import psycopg2.pool
+    import psycopg2.extras
 except ImportError:
     psycopg2 = None
 import sqlite3
 import json
 import logging
 import os
+import threading
 from datetime import datetime
 from contextlib import contextmanager
 from dotenv import load_dotenv
+from services.schema_migrations import apply_migrations
 
 load_dotenv()
 
@@ -17,12 +20,178 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("DBManager")
 
+class PooledSQLiteConnection:
+    """
+    Checkout of a pooled per-thread sqlite3 connection.
+
+    Behaves like the sqlite3.Connection it wraps, except that `close()`
+    hands the connection back to the pool instead of closing it, and
+    `with db.get_connection() as conn:` commits/rolls back and then
+    releases (plain sqlite3 only commits and leaks the connection).
+
+    A checkout taken while the thread already holds one (a helper called
+    inside another helper's `session()`) shares its connection, so it runs
+    inside a SAVEPOINT: its commit() releases the savepoint and its
+    rollback() undoes only its own work. Only the outermost checkout
+    commits or rolls back the transaction. Uncommitted work of a checkout
+    is discarded when it is closed, nested or not.
+    """
+
+    def __init__(self, pool, conn, depth=1):
+        self._pool = pool
+        self._conn = conn
+        self._released = False
+        self._savepoint = None
+        if depth > 1:
+            self._savepoint = f"nested_{depth}"
+            conn.execute(f"SAVEPOINT {self._savepoint}")
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def commit(self):
+        if self._savepoint is None:
+            self._conn.commit()
+        elif not self._released:
+            self._conn.execute(f"RELEASE SAVEPOINT {self._savepoint}")
+            self._conn.execute(f"SAVEPOINT {self._savepoint}") # Later work in this checkout stays undoable
+
+    def rollback(self):
+        if self._savepoint is None:
+            self._conn.rollback()
+        elif not self._released:
+            self._conn.execute(f"ROLLBACK TO SAVEPOINT {self._savepoint}")
+
+    def close(self):
+        if not self._released:
+            if self._savepoint is not None:
+                try:
+                    self.rollback() # Nothing after the last commit() is kept
+                    self._conn.execute(f"RELEASE SAVEPOINT {self._savepoint}")
+                except sqlite3.Error:
+                    pass # Savepoint already gone (the outer transaction ended)
+            self._released = True
+            self._pool.release(self._conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.commit()
+            else:
+                self.rollback()
+        finally:
+            self.close()
+        return False
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class SQLitePool:
+    """
+    One long-lived sqlite3 connection per thread, PRAGMAs applied once.
+
+    The event loop thread and each DB executor thread keep their own
+    connection for the life of the thread, so the tiny queries the bot
+    runs all day no longer pay for connect + PRAGMA setup. Connections
+    owned by threads that have exited are closed on the next checkout.
+    """
+
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        # Negative cache_size is in KiB (SQLite convention)
+        self.cache_size = int(os.getenv("SQLITE_CACHE_SIZE", "-16000"))
+        self.mmap_size = int(os.getenv("SQLITE_MMAP_SIZE", str(64 * 1024 * 1024)))
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns = {}  # thread ident -> (thread, connection)
+        self._counters = {"opened": 0, "closed": 0, "checkouts": 0, "reused": 0}
+
+    def _open(self):
+        # Increase timeout to 30s to prevent "database is locked"
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=self.timeout)
+        # Enable WAL mode for high-concurrency
+        conn.execute("PRAGMA journal_mode=WAL;")
+        # Enable foreign keys
+        conn.execute("PRAGMA foreign_keys=ON;")
+        # Performance optimization for WAL mode
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        conn.execute(f"PRAGMA cache_size={self.cache_size};")
+        conn.execute(f"PRAGMA mmap_size={self.mmap_size};")
+        conn.execute("PRAGMA temp_store=MEMORY;")
+        return conn
+
+    def _prune(self):
+        # Caller holds self._lock
+        for ident, (thread, conn) in list(self._conns.items()):
+            if not thread.is_alive():
+                del self._conns[ident]
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+                self._counters["closed"] += 1
+
+    def acquire(self):
+        conn = getattr(self._local, "conn", None)
+        with self._lock:
+            self._counters["checkouts"] += 1
+            if conn is None:
+                self._prune()
+                conn = self._open()
+                self._local.conn = conn
+                self._local.depth = 0
+                self._conns[threading.get_ident()] = (threading.current_thread(), conn)
+                self._counters["opened"] += 1
+            else:
+                self._counters["reused"] += 1
+        self._local.depth += 1
+        return PooledSQLiteConnection(self, conn, self._local.depth)
+
+    def release(self, conn):
+        if getattr(self._local, "conn", None) is not conn:
+            return  # Released from another thread; the owner keeps it
+        self._local.depth = max(0, self._local.depth - 1)
+        if self._local.depth == 0 and conn.in_transaction:
+            # Uncommitted work was discarded on close() before pooling too
+            conn.rollback()
+
+    def stats(self):
+        with self._lock:
+            self._prune()
+            stats = dict(self._counters)
+            stats["open"] = len(self._conns)
+        checkouts = stats["checkouts"]
+        stats["reuse_rate"] = round(stats["reused"] / checkouts, 4) if checkouts else 0.0
+        stats.update(backend="sqlite", cache_size=self.cache_size, mmap_size=self.mmap_size)
+        return stats
+
+    def close_all(self):
+        with self._lock:
+            for _, conn in self._conns.values():
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+                self._counters["closed"] += 1
+            self._conns.clear()
+        self._local = threading.local()
+
+
 class DBManager:
     def __init__(self):
         # Supabase/Postgres Connection String
         self.database_url = os.getenv("DATABASE_URL")
         self.db_type = "postgres"
         self._pool = None
+        self._sqlite_pool = None
 
         # Check if DATABASE_URL is set and looks valid (not the placeholder)
         if not self.database_url or "postgres.xxx" in self.database_url:
@@ -31,6 +200,9 @@ class DBManager:
             self.database_url = "rainyday.db"
         elif self.db_type == "postgres":
             self._init_pool()
+
+        if self.db_type == "sqlite":
+            self._sqlite_pool = SQLitePool(self.database_url)
         
         self._initialize_tables()
 
@@ -38,6 +210,9 @@ class DBManager:
         try:
             # Min 1, Max 20 connections in pool
             self._pool = psycopg2.pool.ThreadedConnectionPool(1, 20, self.database_url)
+            # Parse JSONB columns (deal payloads) with the fast codec
+            from utils import json_codec
+            psycopg2.extras.register_default_jsonb(globally=True, loads=json_codec.loads)
             logger.info("PostgreSQL connection pool initialized (Max 20).")
         except Exception as e:
             logger.error(f"Failed to initialize pool: {e}")
@@ -55,258 +230,26 @@ class DBManager:
                 logger.error(f"Pool error: {e}. Attempting direct connection.")
                 return psycopg2.connect(self.database_url)
         else:
-            # SQLite connection
-            # Increase timeout to 30s to prevent "database is locked"
-            conn = sqlite3.connect(self.database_url, check_same_thread=False, timeout=30.0)
-            
-            # Enable WAL mode for high-concurrency
-            conn.execute("PRAGMA journal_mode=WAL;")
-            # Enable foreign keys
-            conn.execute("PRAGMA foreign_keys=ON;")
-            # Performance optimization for WAL mode
-            conn.execute("PRAGMA synchronous=NORMAL;")
-            
-            return conn
+            return self._sqlite_pool.acquire()
+
+    def pool_stats(self):
+        """Connection pool statistics for health checks."""
+        if self.db_type == "postgres" and self._pool:
+            return {
+                "backend": "postgres",
+                "max": self._pool.maxconn,
+                "in_use": len(getattr(self._pool, "_used", {})),
+                "idle": len(getattr(self._pool, "_pool", [])),
+            }
+        return self._sqlite_pool.stats()
 
     def _initialize_tables(self):
         try:
             conn = self.get_connection()
             try:
-                cursor = conn.cursor()
-                
-                if self.db_type == "postgres":
-                    # --- PostgreSQL Schema ---
-                    
-                    # Deals Table
-                    cursor.execute("""
-                        CREATE TABLE IF NOT EXISTS deals (
-                            deal_id TEXT PRIMARY KEY,
-                            channel_id TEXT UNIQUE,
-                            buyer_id TEXT,
-                            seller_id TEXT,
-                            amount REAL,
-                            currency TEXT,
-                            status TEXT,
-                            created_at REAL,
-                            other_data JSONB
-                        )
-                    """)
-
-                    # Users Table (Stats)
-                    cursor.execute("""
-                        CREATE TABLE IF NOT EXISTS users (
-                            user_id TEXT PRIMARY KEY,
-                            deals_completed INTEGER DEFAULT 0,
-                            volume_usd REAL DEFAULT 0.0,
-                            reputation_score INTEGER DEFAULT 0,
-                            referral_code TEXT,
-                            referrer_id TEXT,
-                            first_seen REAL,
-                            last_active REAL,
-                            current_streak INTEGER DEFAULT 0,
-                            highest_streak INTEGER DEFAULT 0,
-                            last_deal_date TEXT,
-                            achievements TEXT DEFAULT '[]',
-                            badges TEXT DEFAULT '[]',
-                            xp INTEGER DEFAULT 0
-                        )
-                    """)
-
-                    # Ensure columns exist if table was already created
-                    cols_to_add = [
-                        ('current_streak', 'INTEGER DEFAULT 0'),
-                        ('highest_streak', 'INTEGER DEFAULT 0'),
-                        ('last_deal_date', 'TEXT'),
-                        ('achievements', "TEXT DEFAULT '[]'"),
-                        ('badges', "TEXT DEFAULT '[]'"),
-                        ('xp', 'INTEGER DEFAULT 0'),
-                        ('used_chains', "TEXT DEFAULT '[]'"),
-                        ('languages_used', 'INTEGER DEFAULT 1'),
-                        ('fast_deals', 'INTEGER DEFAULT 0'),
-                        ('last_deal_info', 'TEXT'),
-                        ('last_achievement', 'TEXT')
-                    ]
-                    for col_name, col_def in cols_to_add:
-                        try:
-                            cursor.execute(f"ALTER TABLE users ADD COLUMN IF NOT EXISTS {col_name} {col_def}")
-                        except: pass
-
-                    # Global Counters/Config
-                    cursor.execute("""
-                        CREATE TABLE IF NOT EXISTS config (
-                            key TEXT PRIMARY KEY,
-                            value TEXT
-                        )
-                    """) 
-
-                    # Blacklist Table
-                    cursor.execute("""
-                        CREATE TABLE IF NOT EXISTS blacklist (
-                            user_id TEXT PRIMARY KEY,
-                            reason TEXT,
-                            added_at REAL,
-                            added_by TEXT
-                        )
-                    """)
-
-                    # Audit Logs
-                    cursor.execute("""
-                        CREATE TABLE IF NOT EXISTS audit_logs (
-                            id SERIAL PRIMARY KEY,
-                            action TEXT,
-                            user_id TEXT,
-                            target_id TEXT,
-                            details TEXT,
-                            timestamp REAL
-                        )
-                    """)
-
-                    # Price Alerts Table
-                    cursor.execute("""
-                        CREATE TABLE IF NOT EXISTS price_alerts (
-                            id SERIAL PRIMARY KEY,
-                            user_id TEXT,
-                            currency TEXT,
-                            target_price REAL,
-                            condition TEXT,
-                            fiat TEXT DEFAULT 'usd',
-                            created_at REAL
-                        )
-                    """)
-
-                    # Transaction Tracking Table
-                    cursor.execute("""
-                        CREATE TABLE IF NOT EXISTS transaction_tracking (
-                            id SERIAL PRIMARY KEY,
-                            user_id TEXT,
-                            txid TEXT,
-                            currency TEXT,
-                            target_confs INTEGER DEFAULT 1,
-                            status TEXT DEFAULT 'pending',
-                            created_at REAL
-                        )
-                    """)
-                    
-                else:
-                    # --- SQLite Schema ---
-                    
-                    # Deals Table (other_data stored as TEXT)
-                    cursor.execute("""
-                        CREATE TABLE IF NOT EXISTS deals (
-                            deal_id TEXT PRIMARY KEY,
-                            channel_id TEXT UNIQUE,
-                            buyer_id TEXT,
-                            seller_id TEXT,
-                            amount REAL,
-                            currency TEXT,
-                            status TEXT,
-                            created_at REAL,
-                            other_data TEXT
-                        )
-                    """)
-
-                    # Users Table
-                    cursor.execute("""
-                        CREATE TABLE IF NOT EXISTS users (
-                            user_id TEXT PRIMARY KEY,
-                            deals_completed INTEGER DEFAULT 0,
-                            volume_usd REAL DEFAULT 0.0,
-                            reputation_score INTEGER DEFAULT 0,
-                            referral_code TEXT,
-                            referrer_id TEXT,
-                            first_seen REAL,
-                            last_active REAL,
-                            current_streak INTEGER DEFAULT 0,
-                            highest_streak INTEGER DEFAULT 0,
-                            last_deal_date TEXT,
-                            achievements TEXT DEFAULT '[]',
-                            badges TEXT DEFAULT '[]',
-                            xp INTEGER DEFAULT 0
-                        )
-                    """)
-
-                    # Ensure columns exist if table was already created
-                    cols_to_add = [
-                        ('current_streak', 'INTEGER DEFAULT 0'),
-                        ('highest_streak', 'INTEGER DEFAULT 0'),
-                        ('last_deal_date', 'TEXT'),
-                        ('achievements', "TEXT DEFAULT '[]'"),
-                        ('badges', "TEXT DEFAULT '[]'"),
-                        ('xp', 'INTEGER DEFAULT 0'),
-                        ('used_chains', "TEXT DEFAULT '[]'"),
-                        ('languages_used', 'INTEGER DEFAULT 1'),
-                        ('fast_deals', 'INTEGER DEFAULT 0'),
-                        ('last_deal_info', 'TEXT'),
-                        ('last_achievement', 'TEXT')
-                    ]
-                    for col_name, col_def in cols_to_add:
-                        try:
-                            cursor.execute(f"ALTER TABLE users ADD COLUMN {col_name} {col_def}")
-                        except: pass
-
-                    # Global Counters/Config
-                    cursor.execute("""
-                        CREATE TABLE IF NOT EXISTS config (
-                            key TEXT PRIMARY KEY,
-                            value TEXT
-                        )
-                    """) 
-
-                    # Blacklist Table
-                    cursor.execute("""
-                        CREATE TABLE IF NOT EXISTS blacklist (
-                            user_id TEXT PRIMARY KEY,
-                            reason TEXT,
-                            added_at REAL,
-                            added_by TEXT
-                        )
-                    """)
-
-                    # Audit Logs
-                    cursor.execute("""
-                        CREATE TABLE IF NOT EXISTS audit_logs (
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            action TEXT,
-                            user_id TEXT,
-                            target_id TEXT,
-                            details TEXT,
-                            timestamp REAL
-                        )
-                    """)
-
-                    # Price Alerts Table
-                    cursor.execute("""
-                        CREATE TABLE IF NOT EXISTS price_alerts (
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            user_id TEXT,
-                            currency TEXT,
-                            target_price REAL,
-                            condition TEXT,
-                            fiat TEXT DEFAULT 'usd',
-                            created_at REAL
-                        )
-                    """)
-
-                    # Transaction Tracking Table
-                    cursor.execute("""
-                        CREATE TABLE IF NOT EXISTS transaction_tracking (
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            user_id TEXT,
-                            txid TEXT,
-                            currency TEXT,
-                            target_confs INTEGER DEFAULT 1,
-                            status TEXT DEFAULT 'pending',
-                            created_at REAL
-                        )
-                    """)
-
-                    # Optimization Indexes
-                    cursor.execute("CREATE INDEX IF NOT EXISTS idx_deals_channel ON deals(channel_id)")
-                    cursor.execute("CREATE INDEX IF NOT EXISTS idx_deals_status ON deals(status)")
-                    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_volume ON users(volume_usd)")
-                    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_deals ON users(deals_completed)")
-
-                conn.commit()
+                # Every schema change, including the baseline tables, is a versioned
+                # migration; a database that is up to date costs one SELECT here
+                apply_migrations(conn, self.db_type)
             except Exception as e:
                 conn.rollback()
                 logger.error(f"Init error: {e}")
@@ -0,0 +1,128 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from services.db_manager import db
+from services.async_db import async_db
+
+logger = logging.getLogger("DealCounter")
+
+
+class DealCounter:
+    """
+    Ticket number allocator.
+
+    Numbers are reserved from the `config` row in blocks of `block_size`
+    with one atomic read-modify-write, then handed out from memory, so
+    only one ticket in `block_size` touches the database. The stored value
+    is the highest number reserved so far; numbers left in a block when
+    the process exits are skipped (ticket numbers stay unique and
+    increasing, not gapless). The last number handed out is mirrored to
+    `mirror_path` in the background (best effort, latest value wins).
+    """
+
+    def __init__(self, key="deal_counter", block_size=50, mirror_path="counter.json"):
+        self.key = key
+        self.block_size = block_size
+        self.mirror_path = mirror_path
+        self._lock = threading.Lock()
+        self._next = 1
+        self._high = 0                        # Last number of the current reservation
+        self._last = None                     # Last number handed out
+        self._mirror_value = None
+        self._mirror_scheduled = False
+        self._mirror_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="counter-mirror")
+        self.stats = {"allocated": 0, "reservations": 0}
+
+    def _file_value(self):
+        # Legacy counter.json may be ahead of the DB (it was the only store before)
+        try:
+            if os.path.exists(self.mirror_path):
+                with open(self.mirror_path, "r") as f:
+                    content = f.read().strip()
+                    if content:
+                        return int(content)
+        except Exception as e:
+            logger.error(f"Failed to read {self.mirror_path}: {e}")
+        return 0
+
+    def _reserve(self, floor=0):
+        """Atomically move the stored counter forward by one block; returns the block's last number."""
+        as_int = "CAST(value AS INTEGER)" if db.db_type == "sqlite" else "CAST(value AS BIGINT)"
+        greatest = "MAX" if db.db_type == "sqlite" else "GREATEST"
+        with db.session() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(f"""
+                    INSERT INTO config (key, value) VALUES ({db.p}, '0')
+                    ON CONFLICT (key) DO NOTHING
+                """, (self.key,))
+                # The UPDATE takes the row/write lock, so the SELECT below sees exactly our reservation
+                cursor.execute(f"""
+                    UPDATE config SET value = CAST({greatest}({as_int}, {db.p}) + {db.p} AS TEXT)
+                    WHERE key = {db.p}
+                """, (floor, self.block_size, self.key))
+                cursor.execute(f"SELECT value FROM config WHERE key = {db.p}", (self.key,))
+                high = int(cursor.fetchone()[0])
+            finally:
+                cursor.close()
+        self.stats["reservations"] += 1
+        return high
+
+    def next(self):
+        """Next ticket number (blocks on the DB only when a new block must be reserved)."""
+        with self._lock:
+            if self._next > self._high:
+                floor = self._file_value() if self.stats["reservations"] == 0 else 0
+                high = self._reserve(floor)
+                self._next, self._high = high - self.block_size + 1, high
+            number = self._next
+            self._next += 1
+            self._last = number
+            self.stats["allocated"] += 1
+        self._schedule_mirror(number)
+        return number
+
+    async def allocate(self):
+        """`next()` for the event loop: served from memory, reservations run on the DB writer thread."""
+        if self._next <= self._high:
+            return self.next()
+        return await async_db.run_write(self.next)
+
+    def warm(self):
+        """Reserve the first block up front so the first ticket does not wait on the DB."""
+        with self._lock:
+            if self._next > self._high:
+                high = self._reserve(self._file_value())
+                self._next, self._high = high - self.block_size + 1, high
+
+    def current(self):
+        """Last number handed out (or reserved, before the first allocation)."""
+        return self._last if self._last is not None else max(self._next - 1, 0)
+
+    # --- counter.json mirror ---
+    def _schedule_mirror(self, number):
+        with self._lock:
+            self._mirror_value = number
+            if self._mirror_scheduled:
+                return # The pending write will pick up the newest value
+            self._mirror_scheduled = True
+        try:
+            self._mirror_executor.submit(self._write_mirror)
+        except RuntimeError:
+            self._mirror_scheduled = False # Shutting down
+
+    def _write_mirror(self):
+        with self._lock:
+            value = self._mirror_value
+            self._mirror_scheduled = False
+        try:
+            tmp_path = self.mirror_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                f.write(str(value))
+            os.replace(tmp_path, self.mirror_path)
+        except Exception as e:
+            logger.error(f"Failed to write {self.mirror_path}: {e}")
+
+
+deal_counter = DealCounter(block_size=int(os.getenv("DEAL_COUNTER_BLOCK", "50")))
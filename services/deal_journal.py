@@ -0,0 +1,258 @@
+import logging
+import marshal
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from utils import json_codec
+
+logger = logging.getLogger("DealJournal")
+
+SNAPSHOT_FORMAT = 2
+_LENGTH = struct.Struct("<I")
+_FILE_MODE = 0o600
+
+# Never written to disk; database.py reads them back from the deals table on restore
+SECRET_FIELDS = frozenset({"private_key"})
+
+# Journal ops: ("put", deal_id, deal) created/rewritten, ("set", deal_id, (field, value)),
+# ("del", deal_id, field), ("close", deal_id, None) left the live table
+PUT, SET, DEL, CLOSE = "put", "set", "del", "close"
+
+
+def _copy(value):
+    """Deep copy of a JSON-style value (marshal round trip; JSON as fallback)."""
+    try:
+        return marshal.loads(marshal.dumps(value))
+    except ValueError:
+        return json_codec.loads(json_codec.dumps(value))
+
+
+def _public(deal):
+    return {k: v for k, v in deal.items() if k not in SECRET_FIELDS}
+
+
+def _open_private(path, mode):
+    """open() for files only the bot user may read (the umask can only remove bits)."""
+    flags = os.O_WRONLY | os.O_CREAT | (os.O_APPEND if mode == "ab" else os.O_TRUNC)
+    fd = os.open(path, flags, _FILE_MODE)
+    try:
+        os.chmod(path, _FILE_MODE) # Files created before this mode was used
+        return os.fdopen(fd, mode)
+    except BaseException:
+        os.close(fd)
+        raise
+
+
+class DealJournal:
+    """
+    Warm-start cache for the live deal set: a compact binary snapshot plus an
+    append-only journal of deal events written after each committed flush.
+
+    The journal keeps its own copy of the committed state (what the DB holds,
+    never unflushed edits), so snapshots can be taken at any time without
+    stopping writers. On boot `restore()` maps the snapshot, replays the
+    journal tail and hands back the deals in milliseconds; database.py only
+    trusts the result if the live table still has the same row count and
+    version sum (every deal write bumps `version`), so writes made by
+    anything that bypassed the journal fall back to a full load.
+
+    Files are only a cache: any I/O or decoding problem disables the journal
+    and removes them, and the next start does a full load. SECRET_FIELDS are
+    left out of both files, which are created readable by the owner only.
+    """
+
+    def __init__(self, directory="deal_cache", snapshot_interval=300, snapshot_events=5000):
+        self.directory = directory
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_events = snapshot_events
+        self.snapshot_path = os.path.join(directory, "deals.snapshot")
+        self.journal_path = os.path.join(directory, "deals.journal")
+        self._lock = threading.Lock()
+        self._state = None          # deal_id -> committed deal (own copies)
+        self._seq = 0
+        self._file = None
+        self._events = 0            # Events since the last snapshot
+        self._last_snapshot = 0.0
+        self.enabled = True
+        self.stats = {"events": 0, "snapshots": 0, "restored": 0, "replayed": 0}
+
+    # --- Startup ---
+    def restore(self):
+        """
+        {deal_id: deal} rebuilt from snapshot + journal tail, or None if there
+        is nothing usable. The returned deals are the caller's to mutate.
+        """
+        if not self.enabled or not os.path.exists(self.snapshot_path):
+            return None
+        started = time.perf_counter()
+        try:
+            with open(self.snapshot_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                fmt, python, seq, state = marshal.loads(mm)
+            if fmt != SNAPSHOT_FORMAT or tuple(python) != tuple(sys.version_info[:2]):
+                logger.info("Deal snapshot was written by another format/Python version; ignoring it.")
+                return None
+            replayed = 0
+            for event_seq, op, deal_id, payload in self._read_journal():
+                if event_seq <= seq:
+                    continue # Already in the snapshot
+                self._apply(state, op, deal_id, payload)
+                seq = event_seq
+                replayed += 1
+        except Exception as e:
+            logger.warning(f"Deal snapshot/journal unreadable ({e}); doing a full load.")
+            return None
+
+        with self._lock:
+            self._state = state
+            self._seq = seq
+            self._events = replayed
+            self._last_snapshot = time.time()
+        self.stats["restored"] = len(state)
+        self.stats["replayed"] = replayed
+        logger.info(f"Deal cache restored from snapshot: {len(state)} deals, {replayed} journal events "
+                    f"({(time.perf_counter() - started) * 1000:.1f}ms)")
+        return _copy(state)
+
+    def _read_journal(self):
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, "rb") as f:
+            data = f.read()
+        pos = 0
+        while pos + _LENGTH.size <= len(data):
+            (length,) = _LENGTH.unpack_from(data, pos)
+            end = pos + _LENGTH.size + length
+            if end > len(data):
+                break # Torn write at the tail (crash mid-append)
+            yield marshal.loads(data[pos + _LENGTH.size:end])
+            pos = end
+
+    @staticmethod
+    def _apply(state, op, deal_id, payload):
+        if op == PUT:
+            state[deal_id] = payload
+        elif op == SET:
+            deal = state.get(deal_id)
+            if deal is not None:
+                deal[payload[0]] = payload[1]
+        elif op == DEL:
+            deal = state.get(deal_id)
+            if deal is not None:
+                deal.pop(payload, None)
+        elif op == CLOSE:
+            state.pop(deal_id, None)
+
+    def reset(self, deals):
+        """Start over from a full load: snapshot `deals` and truncate the journal."""
+        if not self.enabled:
+            return
+        try:
+            state = {deal_id: _copy(_public(dict(deal))) for deal_id, deal in deals.items()}
+            with self._lock:
+                self._state = state
+                self._write_snapshot()
+        except Exception as e:
+            self._disable(e)
+
+    # --- Recording (called by the write-behind engine after a commit) ---
+    def record_flush(self, items, removed, versions):
+        """Journal one committed batch: `(deal_id, snapshot, fields)` items and `(deal_id, snapshot)` removals."""
+        events = []
+        for deal_id, snapshot, fields in items:
+            if fields is None or self._state is None or deal_id not in self._state:
+                events.append((PUT, deal_id, dict(_public(snapshot), deal_id=deal_id)))
+                continue
+            for field in fields:
+                if field in SECRET_FIELDS:
+                    continue
+                if field in snapshot:
+                    events.append((SET, deal_id, (field, snapshot[field])))
+                else:
+                    events.append((DEL, deal_id, field))
+            if deal_id in versions:
+                events.append((SET, deal_id, ("version", versions[deal_id])))
+        events.extend((CLOSE, deal_id, None) for deal_id, _ in removed)
+        self._record(events)
+
+    def record_put(self, deal_id, deal):
+        """Journal a deal written outside a flush (compare-and-swap, reload from the DB)."""
+        self._record([(PUT, deal_id, dict(_public(deal), deal_id=deal_id))])
+
+    def record_close(self, deal_ids):
+        self._record([(CLOSE, deal_id, None) for deal_id in deal_ids])
+
+    def _record(self, events):
+        if not self.enabled or self._state is None or not events:
+            return
+        try:
+            with self._lock:
+                if self._file is None:
+                    self._file = _open_private(self.journal_path, "ab")
+                chunks = []
+                for op, deal_id, payload in events:
+                    payload = _copy(payload) # Own copy; the app keeps mutating its dicts
+                    self._apply(self._state, op, deal_id, payload)
+                    self._seq += 1
+                    record = marshal.dumps((self._seq, op, deal_id, payload))
+                    chunks.append(_LENGTH.pack(len(record)) + record)
+                self._file.write(b"".join(chunks))
+                self._file.flush()
+                self._events += len(events)
+                self.stats["events"] += len(events)
+                if self._events >= self.snapshot_events or (
+                    self._events and time.time() - self._last_snapshot >= self.snapshot_interval
+                ):
+                    self._write_snapshot()
+        except Exception as e:
+            self._disable(e)
+
+    # --- Snapshots ---
+    def _write_snapshot(self):
+        # Caller holds self._lock
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        tmp_path = self.snapshot_path + ".tmp"
+        with _open_private(tmp_path, "wb") as f:
+            marshal.dump((SNAPSHOT_FORMAT, tuple(sys.version_info[:2]), self._seq, self._state), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        # Events up to self._seq are in the snapshot now; start a fresh journal
+        if self._file is not None:
+            self._file.close()
+        self._file = _open_private(self.journal_path, "wb")
+        self._events = 0
+        self._last_snapshot = time.time()
+        self.stats["snapshots"] += 1
+
+    def snapshot(self):
+        """Write a snapshot now (e.g. at shutdown)."""
+        if not self.enabled or self._state is None:
+            return
+        try:
+            with self._lock:
+                self._write_snapshot()
+        except Exception as e:
+            self._disable(e)
+
+    def _disable(self, error):
+        logger.error(f"Deal journal disabled ({error}); the next start does a full load.")
+        self.enabled = False
+        self._state = None
+        try:
+            if self._file is not None:
+                self._file.close()
+            for path in (self.snapshot_path, self.journal_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        except OSError:
+            pass
+
+
+deal_journal = DealJournal(
+    directory=os.getenv("DEAL_JOURNAL_DIR", "deal_cache"),
+    snapshot_interval=float(os.getenv("DEAL_SNAPSHOT_INTERVAL", "300")),
+    snapshot_events=int(os.getenv("DEAL_SNAPSHOT_EVENTS", "5000")),
+)
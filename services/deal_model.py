@@ -0,0 +1,205 @@
+from collections.abc import MutableMapping
+
+# Keys stored in slots; anything else goes to the per-deal overflow dict
+DEAL_FIELDS = (
+    # Row columns
+    "deal_id", "channel_id", "buyer", "seller", "amount", "currency", "status", "start_time", "version",
+    # Promoted hot columns (schema_migrations.HOT_DEAL_FIELDS)
+    "address", "paid", "last_activity", "expected_crypto_amount", "payment_start_time",
+    # Ticket lifecycle
+    "creator_id", "other_user_id", "role_warning_sent", "idle_warning_sent", "rescan_count",
+    "payment_timeout", "extension_count", "extensions", "mod_locked", "system_msg_id", "release_message_id",
+    # Terms and confirmations
+    "product_name", "product_tos", "tos_sender_agreed", "tos_receiver_agreed", "tos_concluded",
+    "conf_tos_sent", "conf_sender_confirmed", "conf_receiver_confirmed",
+    "amt_sender_confirmed", "amt_receiver_confirmed", "amount_final_embed_sent",
+    # Payment
+    "private_key", "ltc_amount", "txid", "last_partial_msg_id", "last_partial_notification_amount",
+    "fee_deducted", "gas_required", "gas_paid",
+)
+
+_INTERNAL = frozenset({"_extra", "_owner", "_deal_id"})
+
+
+class Deal(MutableMapping):
+    """
+    A cached deal: known fields live in `__slots__`, rare keys in a small
+    overflow dict that is only created when needed.
+
+    Hot paths read known fields as plain attributes (`deal.status`,
+    `deal.paid`); a field the deal does not have reads as None, and storing
+    None in a known field is the same as deleting it. The mapping interface
+    (`deal["paid"]`, `deal.get(...)`, `in`, `dict(deal)`, `**deal`) behaves
+    like the dict it replaces, so existing call sites keep working.
+
+    Edits (item or attribute assignment, deletion, update/pop/...) are
+    reported to the owning DealStore, which keeps its indexes current and
+    marks the deal dirty for the write-behind engine. `set_quiet`,
+    `discard_quiet` and `replace(..., notify=False)` change a deal without
+    reporting it (the change is already stored).
+
+    `keys()`/`items()`/`values()` return views of a snapshot, and `copy()`
+    returns a plain dict.
+    """
+    __slots__ = DEAL_FIELDS + tuple(_INTERNAL)
+
+    def __init__(self, source=(), **kwargs):
+        for setter in _SETTERS.values():
+            setter(self, None)
+        object.__setattr__(self, "_extra", None)
+        object.__setattr__(self, "_owner", None)
+        object.__setattr__(self, "_deal_id", None)
+        self._fill(source)
+        if kwargs:
+            self._fill(kwargs)
+
+    # --- Raw access (no change reporting) ---
+    def _fill(self, source):
+        for key, value in (source.items() if hasattr(source, "items") else source):
+            self._set(key, value)
+
+    def _set(self, key, value):
+        setter = _SETTERS.get(key)
+        if setter is not None:
+            setter(self, value)
+        elif self._extra is None:
+            object.__setattr__(self, "_extra", {key: value})
+        else:
+            self._extra[key] = value
+
+    def _delete(self, key):
+        getter = _GETTERS.get(key)
+        if getter is not None:
+            if getter(self) is None:
+                raise KeyError(key)
+            _SETTERS[key](self, None)
+        elif self._extra and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def _changed(self, field=None):
+        if self._owner is not None:
+            self._owner._deal_touched(self._deal_id, self, field)
+
+    def set_quiet(self, key, value):
+        self._set(key, value)
+
+    def discard_quiet(self, key):
+        try:
+            self._delete(key)
+        except KeyError:
+            pass
+
+    def replace(self, source, notify=True):
+        """Make this deal's contents equal to `source` (in place, so references stay valid)."""
+        if isinstance(source, Deal):
+            source = source.to_dict()
+        for setter in _SETTERS.values():
+            setter(self, None)
+        object.__setattr__(self, "_extra", None)
+        self._fill(source)
+        if notify:
+            self._changed()
+
+    def to_dict(self):
+        result = {}
+        for name, getter in _GETTERS.items():
+            value = getter(self)
+            if value is not None:
+                result[name] = value
+        if self._extra:
+            result.update(self._extra)
+        return result
+
+    # --- Attribute interface (reads are plain slot reads) ---
+    def __setattr__(self, name, value):
+        if name in _INTERNAL:
+            object.__setattr__(self, name, value)
+        else:
+            self[name] = value
+
+    def __delattr__(self, name):
+        try:
+            del self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    # --- Mapping interface ---
+    def __getitem__(self, key):
+        getter = _GETTERS.get(key)
+        if getter is not None:
+            value = getter(self)
+            if value is None:
+                raise KeyError(key)
+            return value
+        if self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        getter = _GETTERS.get(key)
+        if getter is not None:
+            value = getter(self)
+            return default if value is None else value
+        extra = self._extra
+        return extra.get(key, default) if extra else default
+
+    def __contains__(self, key):
+        getter = _GETTERS.get(key)
+        if getter is not None:
+            return getter(self) is not None
+        return bool(self._extra) and key in self._extra
+
+    def __setitem__(self, key, value):
+        self._set(key, value)
+        self._changed(key)
+
+    def __delitem__(self, key):
+        self._delete(key)
+        self._changed(key)
+
+    def __iter__(self):
+        return iter(self.to_dict())
+
+    def __len__(self):
+        return len(self.to_dict())
+
+    def keys(self):
+        return self.to_dict().keys()
+
+    def items(self):
+        return self.to_dict().items()
+
+    def values(self):
+        return self.to_dict().values()
+
+    def copy(self):
+        return self.to_dict()
+
+    def update(self, *args, **kwargs):
+        changes = dict(*args, **kwargs)
+        for key, value in changes.items():
+            self._set(key, value)
+        for key in changes:
+            self._changed(key)
+
+    def clear(self):
+        self.replace(())
+
+    def __eq__(self, other):
+        if isinstance(other, Deal):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Deal({self.to_dict()!r})"
+
+    def __reduce__(self):
+        return (Deal, (self.to_dict(),))
+
+
+_GETTERS = {name: Deal.__dict__[name].__get__ for name in DEAL_FIELDS}
+_SETTERS = {name: Deal.__dict__[name].__set__ for name in DEAL_FIELDS}
@@ -0,0 +1,247 @@
+import threading
+from services.deal_model import Deal
+
+# Deal fields that feed a secondary index
+INDEXED_FIELDS = frozenset({"channel_id", "address", "buyer", "seller", "status"})
+
+
+class DealStore(dict):
+    """
+    In-memory deal cache (deal_id -> Deal) with secondary indexes.
+
+    Behaves exactly like the plain dict it replaces, so existing
+    `data = load_all_data(); data[deal_id][...] = ...; save_all_data(data)`
+    call sites keep working. Lookups by channel, deposit address,
+    participant and status are O(1) dictionary reads instead of full scans.
+
+    Values are always `Deal` objects, which report their own in-place edits
+    so indexes stay current without a full rescan. A plain dict assigned to
+    the store is converted: it is copied into the deal already cached under
+    that id (so existing references stay valid) or into a new Deal.
+
+    An optional listener (the write-behind engine) is told about every
+    changed and removed deal via `deal_changed(deal_id, deal, field=None)` and
+    `deal_removed(deal_id, deal)`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self._lock = threading.RLock()
+        self._listener = None
+        self._keys = {}             # deal_id -> (channel, address, buyer, seller, status)
+        self._by_channel = {}       # channel_id -> {deal_id: None}
+        self._by_address = {}       # lowercased address -> {deal_id: None}
+        self._by_participant = {}   # user_id -> {deal_id: None}
+        self._by_status = {}        # status -> {deal_id: None}
+        self.update(*args, **kwargs)
+
+    # --- Index maintenance ---
+    @staticmethod
+    def _index_keys(deal):
+        channel = deal.get("channel_id")
+        address = deal.get("address")
+        buyer = deal.get("buyer")
+        seller = deal.get("seller")
+        return (
+            str(channel) if channel else None,
+            str(address).lower() if address else None,
+            str(buyer) if buyer else None,
+            str(seller) if seller else None,
+            deal.get("status"),
+        )
+
+    @staticmethod
+    def _add(index, key, deal_id):
+        if key is not None:
+            index.setdefault(key, {})[deal_id] = None
+
+    @staticmethod
+    def _discard(index, key, deal_id):
+        if key is None:
+            return
+        bucket = index.get(key)
+        if bucket is not None:
+            bucket.pop(deal_id, None)
+            if not bucket:
+                del index[key]
+
+    def _unindex(self, deal_id):
+        old = self._keys.pop(deal_id, None)
+        if old is None:
+            return
+        channel, address, buyer, seller, status = old
+        self._discard(self._by_channel, channel, deal_id)
+        self._discard(self._by_address, address, deal_id)
+        self._discard(self._by_participant, buyer, deal_id)
+        self._discard(self._by_participant, seller, deal_id)
+        self._discard(self._by_status, status, deal_id)
+
+    def _index(self, deal_id, deal):
+        keys = self._index_keys(deal) if isinstance(deal, Deal) else (None,) * 5
+        if self._keys.get(deal_id) == keys:
+            return
+        self._unindex(deal_id)
+        channel, address, buyer, seller, status = keys
+        self._add(self._by_channel, channel, deal_id)
+        self._add(self._by_address, address, deal_id)
+        self._add(self._by_participant, buyer, deal_id)
+        if seller != buyer:
+            self._add(self._by_participant, seller, deal_id)
+        self._add(self._by_status, status, deal_id)
+        self._keys[deal_id] = keys
+
+    def set_listener(self, listener):
+        self._listener = listener
+
+    def _deal_touched(self, deal_id, deal, field):
+        if dict.get(self, deal_id) is not deal:
+            return # Stale reference to a replaced/removed deal
+        if field is None or field in INDEXED_FIELDS:
+            with self._lock:
+                self._index(deal_id, deal)
+        if self._listener is not None:
+            self._listener.deal_changed(deal_id, deal, field)
+
+    def _attach(self, deal_id, deal):
+        if isinstance(deal, Deal):
+            deal._owner, deal._deal_id = self, deal_id
+
+    def _detach(self, deal_id):
+        old = dict.get(self, deal_id)
+        if isinstance(old, Deal) and old._owner is self:
+            old._owner = None
+        return old
+
+    def _adopt(self, deal_id, deal):
+        """The Deal to store for `deal` (plain dicts are copied into the cached Deal or a new one)."""
+        if not isinstance(deal, dict):
+            return deal
+        current = dict.get(self, deal_id)
+        if isinstance(current, Deal):
+            current.replace(deal, notify=False)
+            return current
+        return Deal(deal)
+
+    def load(self, deal_id, deal):
+        """Insert a deal hydrated from the DB without notifying the listener."""
+        if isinstance(deal, dict):
+            deal = Deal(deal)
+        with self._lock:
+            self._detach(deal_id)
+            dict.__setitem__(self, deal_id, deal)
+            self._attach(deal_id, deal)
+            self._index(deal_id, deal)
+        return deal
+
+    def reindex(self, deal_id=None):
+        """Refresh indexes for one deal (after an in-place edit) or for all deals."""
+        with self._lock:
+            if deal_id is None:
+                for did in list(self._keys):
+                    if not dict.__contains__(self, did):
+                        self._unindex(did)
+                for did, deal in list(dict.items(self)):
+                    self._index(did, deal)
+            elif dict.__contains__(self, deal_id):
+                self._index(deal_id, dict.__getitem__(self, deal_id))
+            else:
+                self._unindex(deal_id)
+
+    # --- Mapping mutations ---
+    def __setitem__(self, deal_id, deal):
+        with self._lock:
+            deal = self._adopt(deal_id, deal)
+            if dict.get(self, deal_id) is not deal:
+                self._detach(deal_id)
+                dict.__setitem__(self, deal_id, deal)
+                self._attach(deal_id, deal)
+            self._index(deal_id, deal)
+        if self._listener is not None:
+            self._listener.deal_changed(deal_id, deal)
+
+    def __delitem__(self, deal_id):
+        with self._lock:
+            old = self._detach(deal_id)
+            dict.__delitem__(self, deal_id)
+            self._unindex(deal_id)
+        if self._listener is not None:
+            self._listener.deal_removed(deal_id, old)
+
+    def pop(self, deal_id, *default):
+        with self._lock:
+            if not dict.__contains__(self, deal_id):
+                return dict.pop(self, deal_id, *default)
+            deal = dict.__getitem__(self, deal_id)
+            del self[deal_id]
+            return deal
+
+    def popitem(self):
+        with self._lock:
+            deal_id = next(reversed(self.keys()))
+            return deal_id, self.pop(deal_id)
+
+    def setdefault(self, deal_id, default=None):
+        with self._lock:
+            if not dict.__contains__(self, deal_id):
+                self[deal_id] = default
+            return dict.__getitem__(self, deal_id)
+
+    def update(self, *args, **kwargs):
+        with self._lock:
+            for deal_id, deal in dict(*args, **kwargs).items():
+                self[deal_id] = deal
+
+    def clear(self):
+        with self._lock:
+            for deal_id in list(dict.keys(self)):
+                del self[deal_id]
+
+    def replace_all(self, data):
+        """Sync the store with `data` (legacy full-dict saves)."""
+        with self._lock:
+            if data is self:
+                return # Deals index themselves and report their own edits
+            for deal_id in [did for did in dict.keys(self) if did not in data]:
+                del self[deal_id]
+            self.update(data)
+
+    # --- Lookups ---
+    def _first(self, index, key):
+        bucket = index.get(key)
+        if not bucket:
+            return None, None
+        for deal_id in bucket:
+            deal = dict.get(self, deal_id)
+            if deal is not None:
+                return deal_id, deal
+        return None, None
+
+    def find_by_channel(self, channel_id):
+        if channel_id is None:
+            return None, None
+        return self._first(self._by_channel, str(channel_id))
+
+    def find_by_address(self, address):
+        if not address:
+            return None, None
+        return self._first(self._by_address, str(address).lower())
+
+    def find_by_participant(self, user_id):
+        """All (deal_id, deal) pairs where the user is buyer or seller."""
+        bucket = self._by_participant.get(str(user_id), {})
+        return [(did, dict.__getitem__(self, did)) for did in list(bucket) if dict.__contains__(self, did)]
+
+    def find_with_address(self):
+        """All (deal_id, deal) pairs that have a deposit address (deals in or past the payment phase)."""
+        deal_ids = [did for bucket in list(self._by_address.values()) for did in list(bucket)]
+        return [(did, dict.__getitem__(self, did)) for did in deal_ids if dict.__contains__(self, did)]
+
+    def find_by_status(self, *statuses):
+        result = []
+        for status in statuses:
+            bucket = self._by_status.get(status, {})
+            result.extend((did, dict.__getitem__(self, did)) for did in list(bucket) if dict.__contains__(self, did))
+        return result
+
+    def count_by_status(self, *statuses):
+        return sum(len(self._by_status.get(status, ())) for status in statuses)
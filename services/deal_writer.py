@@ -0,0 +1,283 @@
+import atexit
+import logging
+import threading
+from services.deal_model import Deal
+
+logger = logging.getLogger("DealWriter")
+
+# Status transitions that move money; persisted synchronously instead of write-behind
+CRITICAL_STATUSES = frozenset({
+    "escrowed", "awaiting_withdrawal", "awaiting_confirmation",
+    "releasing", "released", "refunding", "refunded", "completed",
+})
+
+
+class DealVersionConflict(Exception):
+    """The deal changed since the version the caller read it at."""
+    def __init__(self, deal_id, expected, actual):
+        super().__init__(f"Deal {deal_id} is at version {actual}, expected {expected}")
+        self.deal_id = deal_id
+        self.expected = expected
+        self.actual = actual
+
+
+class DealBatchConflict(DealVersionConflict):
+    """Deals in a write-behind batch were changed by another writer; the batch was rolled back."""
+    def __init__(self, conflicts):
+        first = conflicts[0]
+        super().__init__(first.deal_id, first.expected, first.actual)
+        self.conflicts = conflicts
+
+
+class DealWriteBehind:
+    """
+    Write-behind persistence for the deal cache.
+
+    Changed deals are collected in a coalescing dirty set (many edits of the
+    same deal become one row write, and deals that are already stored only
+    have their changed fields patched) and a single background thread flushes
+    them in one batched transaction every `flush_interval` seconds or as
+    soon as `request_flush()` is called. `flush()` persists synchronously
+    for money-critical transitions (payment detected, released, refunded).
+
+    `write_batch(items, removed, status_deltas)` receives `(deal_id, snapshot, fields)`
+    triples for live deals (`fields` is the set of changed keys, or None
+    when the whole row must be written) and `(deal_id, snapshot)` pairs for
+    deals that left the cache (closed; archived by the callee), plus the
+    resulting {status: +/-n} change in open deals per status. It must
+    write them in one transaction and return {deal_id: new row version};
+    it is provided by database.py. Snapshots carry the version this process
+    last wrote so the callee can compare-and-swap: if a row was changed by
+    another writer it raises DealBatchConflict and writes nothing. The
+    batch is then re-queued, `merge(deal_id, fields)` reloads each
+    conflicted deal and returns the fields still to write, and the flush is
+    retried once.
+    With an `executor` (the single SQLite writer thread) background flushes
+    run there, so deal writes never race other DB writes. An optional
+    `journal` (services.deal_journal) is told about every committed change.
+    """
+
+    def __init__(self, write_batch, flush_interval=0.5, executor=None, journal=None, merge=None):
+        self._write_batch = write_batch
+        self._merge = merge                   # Reload-and-merge for deals another writer changed
+        self._executor = executor             # DB writer thread, if the app has one
+        self.journal = journal                # Warm-start journal of committed changes
+        self.flush_interval = flush_interval
+        self._store = None
+        self._lock = threading.Lock()         # guards the dirty/removed sets
+        self._flush_lock = threading.RLock()  # one flush at a time, in order
+        self._wakeup = threading.Event()
+        self._dirty = {}                      # deal_id -> set of changed fields, or None for the whole row
+        self._removed = {}                    # deal_id -> final snapshot
+        self._persisted = {}                  # deal_id -> (status, paid) last written
+        self._versions = {}                   # deal_id -> row version last written/loaded
+        self._critical = False
+        self._thread = None
+        self._stopped = False
+        self.stats = {"flushes": 0, "rows_written": 0, "coalesced": 0, "errors": 0, "conflicts": 0, "stale_writes": 0}
+
+    # --- Store wiring ---
+    def attach(self, store):
+        self._store = store
+        for deal_id, deal in store.items():
+            self._persisted[deal_id] = self._money_state(deal)
+            self._versions[deal_id] = deal.get("version", 0)
+        store.set_listener(self)
+        self.start()
+        atexit.register(self.stop)
+
+    @staticmethod
+    def _money_state(deal):
+        return (deal.get("status"), bool(deal.get("paid")))
+
+    def _is_critical(self, deal_id, deal):
+        status, paid = self._money_state(deal)
+        old_status, old_paid = self._persisted.get(deal_id, (None, False))
+        return (paid and not old_paid) or (status != old_status and status in CRITICAL_STATUSES)
+
+    def deal_changed(self, deal_id, deal, field=None):
+        with self._lock:
+            if deal_id in self._dirty:
+                self.stats["coalesced"] += 1
+                fields = self._dirty[deal_id]
+                if fields is not None:
+                    if field is None:
+                        self._dirty[deal_id] = None
+                    else:
+                        fields.add(field)
+            else:
+                self._dirty[deal_id] = None if field is None else {field}
+            self._removed.pop(deal_id, None)
+            if self._is_critical(deal_id, deal):
+                self._critical = True
+
+    def deal_removed(self, deal_id, deal):
+        with self._lock:
+            self._dirty.pop(deal_id, None)
+            if isinstance(deal, Deal):
+                # Persist the final state the deal had when it left the cache
+                self._removed[deal_id] = deal.to_dict()
+
+    def has_critical(self):
+        return self._critical
+
+    # --- Flushing ---
+    def request_flush(self):
+        self._wakeup.set()
+
+    def pending(self):
+        return len(self._dirty) + len(self._removed)
+
+    def flush(self, deal_ids=None, retry_conflicts=True):
+        """
+        Synchronously write dirty deals (all, or only `deal_ids`).
+        Returns False if the batch failed; failed deals stay dirty.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if deal_ids is None:
+                    dirty = self._dirty
+                    removed = self._removed
+                    self._dirty, self._removed = {}, {}
+                    self._critical = False
+                else:
+                    dirty = {did: self._dirty.pop(did) for did in deal_ids if did in self._dirty}
+                    removed = {did: self._removed.pop(did) for did in deal_ids if did in self._removed}
+
+            items = []
+            for deal_id, fields in dirty.items():
+                deal = self._store.get(deal_id) if self._store is not None else None
+                if deal is not None:
+                    # Rows never written need a full insert; stored rows only get their changed fields
+                    if deal_id not in self._persisted:
+                        fields = None
+                    snapshot = deal.to_dict()
+                    snapshot["version"] = self._versions.get(deal_id)
+                    items.append((deal_id, snapshot, fields))
+            removed_items = list(removed.items())
+            if not items and not removed_items:
+                return True
+
+            # Per-status open deal counts move with status transitions and closes
+            status_deltas = {}
+            for deal_id, snapshot, _ in items:
+                old = self._persisted[deal_id][0] if deal_id in self._persisted else None
+                new = snapshot.get("status")
+                if old != new:
+                    status_deltas[old] = status_deltas.get(old, 0) - 1
+                    status_deltas[new] = status_deltas.get(new, 0) + 1
+            for deal_id, _ in removed_items:
+                if deal_id in self._persisted:
+                    old = self._persisted[deal_id][0]
+                    status_deltas[old] = status_deltas.get(old, 0) - 1
+            status_deltas.pop(None, None)
+
+            try:
+                versions = self._write_batch(items, removed_items, status_deltas) or {}
+            except DealVersionConflict as e:
+                conflicts = getattr(e, "conflicts", [e])
+                self.stats["conflicts"] += len(conflicts)
+                self._requeue(items, removed_items)
+                if self._merge is None or not retry_conflicts:
+                    logger.warning(f"Deal flush hit {len(conflicts)} version conflict(s); will retry")
+                    return False
+                for conflict in conflicts:
+                    try:
+                        with self._lock:
+                            fields = self._dirty.get(conflict.deal_id)
+                        fields = self._merge(conflict.deal_id, fields)
+                        with self._lock:
+                            if conflict.deal_id in self._dirty:
+                                self._dirty[conflict.deal_id] = fields
+                    except Exception as merge_error:
+                        logger.error(f"Merging deal {conflict.deal_id} failed: {merge_error}")
+                return self.flush(deal_ids, retry_conflicts=False)
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Deal flush failed ({len(items) + len(removed_items)} deals): {e}")
+                self._requeue(items, removed_items)
+                return False
+
+            for deal_id, _ in removed_items:
+                self._persisted.pop(deal_id, None)
+                self._versions.pop(deal_id, None)
+            for deal_id, snapshot, _ in items:
+                expected = snapshot["version"]
+                new_version = versions.get(deal_id)
+                if new_version is not None:
+                    self._set_version(deal_id, snapshot, expected, new_version)
+                self.mark_persisted(deal_id, snapshot, record=False)
+            if self.journal is not None:
+                self.journal.record_flush(items, removed_items, versions)
+            self.stats["flushes"] += 1
+            self.stats["rows_written"] += len(items) + len(removed_items)
+            return True
+
+    def _requeue(self, items, removed_items):
+        # Put a batch that was not written back, keeping field sets (edits made meanwhile are merged in)
+        with self._lock:
+            for deal_id, snapshot, fields in items:
+                if deal_id in self._removed:
+                    continue # Closed meanwhile; its final state is queued for the archive
+                pending = self._dirty.get(deal_id, set())
+                self._dirty[deal_id] = None if pending is None or fields is None else pending | fields
+                if self._is_critical(deal_id, snapshot):
+                    self._critical = True
+            for deal_id, snapshot in removed_items:
+                self._removed.setdefault(deal_id, snapshot)
+
+    def _set_version(self, deal_id, snapshot, expected, new_version):
+        snapshot["version"] = new_version
+        self._versions[deal_id] = new_version
+        live = self._store.get(deal_id) if self._store is not None else None
+        # Also covers contents replaced mid-flush by a whole-deal assignment (they carry the old version)
+        if isinstance(live, Deal) and live.get("version") in (expected, None):
+            live.set_quiet("version", new_version)
+
+    def mark_persisted(self, deal_id, snapshot, record=True):
+        """Record `snapshot` as the stored state of a deal (written outside a flush, e.g. a CAS update)."""
+        if record and self.journal is not None:
+            self.journal.record_put(deal_id, snapshot)
+        self._persisted[deal_id] = self._money_state(snapshot)
+        if "version" in snapshot:
+            self._versions[deal_id] = snapshot["version"]
+
+    def persisted_money_state(self, deal_id):
+        """(status, paid) last written for a deal, or None."""
+        return self._persisted.get(deal_id)
+
+    def persisted_version(self, deal_id):
+        return self._versions.get(deal_id)
+
+    def exclusive(self):
+        """Hold off background flushes (re-entrant), e.g. around a compare-and-swap update."""
+        return self._flush_lock
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._dirty or self._removed:
+                if self._executor is not None:
+                    try:
+                        self._executor.submit(self.flush).result()
+                    except RuntimeError:
+                        self.flush() # Executor already shut down
+                else:
+                    self.flush()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="deal-write-behind", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the background thread and write everything still pending."""
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+        if self.journal is not None:
+            self.journal.snapshot()
@@ -0,0 +1,201 @@
+"""
+Deposit Watcher
+One polling loop per chain for every deal's deposit address, instead of one loop per deal.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import namedtuple
+
+logger = logging.getLogger("DepositWatcher")
+
+# Event kinds: funds below / at the expected amount
+PARTIAL, FULL = "partial", "full"
+
+# `first` is True for the first funds seen on the address (any watched chain)
+DepositEvent = namedtuple("DepositEvent", "kind currency address total expected first")
+
+
+class DepositSubscription:
+    """
+    One deal's view of its deposit address: the watcher pushes balance
+    increases, the deal's monitor pulls them with `next()`.
+
+    Only the newest balance per chain is kept, so a monitor that was busy
+    (sending embeds, sleeping through an expiry check) resumes on the current
+    total rather than replaying every intermediate one. The subscription
+    ends when `close()` is called or when the task that opened it finishes,
+    whichever comes first.
+    """
+
+    def __init__(self, address, currencies, expected, tolerance):
+        self.address = address
+        self.currencies = tuple(currencies)
+        self.expected = float(expected or 0)
+        self.tolerance = tolerance
+        self.balances = {}          # currency -> highest balance delivered
+        self._pending = {}          # currency -> newest undelivered event
+        self._wakeup = asyncio.Event()
+        self._closed = False
+        try:
+            self._owner = asyncio.current_task()
+        except RuntimeError:
+            self._owner = None
+
+    @property
+    def closed(self):
+        return self._closed or (self._owner is not None and self._owner.done())
+
+    def balance(self, currency):
+        return self.balances.get(currency, 0.0)
+
+    def _offer(self, currency, total):
+        if total <= self.balances.get(currency, 0.0):
+            return
+        first = not any(self.balances.values())
+        self.balances[currency] = total
+        kind = FULL if self.expected > 0 and total >= self.expected - self.tolerance else PARTIAL
+        self._pending[currency] = DepositEvent(kind, currency, self.address, total, self.expected, first)
+        self._wakeup.set()
+
+    async def next(self, timeout=None):
+        """Next balance increase (primary chain first), or None after `timeout` seconds."""
+        if not self._pending:
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        for currency in self.currencies:
+            if currency in self._pending:
+                return self._pending.pop(currency)
+        return None
+
+    def close(self):
+        self._closed = True
+
+
+class ChainWatcher:
+    """
+    Polls every watched address on one chain once per cycle.
+
+    `fetch(endpoint, addresses)` returns `{address: balance}` for the
+    addresses it could read from one endpoint. Each cycle starts on the next
+    endpoint in the rotation and only falls over to further endpoints for
+    the addresses still missing, so a cycle costs one endpoint's worth of
+    requests however many endpoints are configured. Reported balances are
+    kept as a high-water mark per address: a lagging endpoint cannot make a
+    seen deposit disappear, and rotating endpoints gives the same "highest
+    balance wins" result the per-deal fan-out used to.
+    """
+
+    def __init__(self, currency, fetch, endpoints, interval):
+        self.currency = currency
+        self.fetch = fetch
+        self.endpoints = list(endpoints) or [None]
+        self.interval = interval
+        self._subs = {}             # address -> [DepositSubscription]
+        self._balances = {}         # address -> highest balance reported
+        self._cursor = 0
+        self._task = None
+        self.stats = {"cycles": 0, "fetches": 0, "failovers": 0, "last_cycle_ms": 0.0}
+
+    def watch(self, subscription):
+        self._subs.setdefault(subscription.address, []).append(subscription)
+        known = self._balances.get(subscription.address)
+        if known:
+            subscription._offer(self.currency, known)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def _prune(self):
+        for address in list(self._subs):
+            subs = [s for s in self._subs[address] if not s.closed]
+            if subs:
+                self._subs[address] = subs
+            else:
+                del self._subs[address]
+                self._balances.pop(address, None)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._prune()
+            if not self._subs:
+                break
+            started = loop.time()
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.error(f"[{self.currency}] Deposit poll failed: {e}")
+            await asyncio.sleep(max(self.interval - (loop.time() - started), 0.1))
+        self._task = None
+
+    async def poll(self):
+        started = time.perf_counter()
+        pending = list(self._subs)
+        count = len(self.endpoints)
+        for attempt in range(count):
+            endpoint = self.endpoints[(self._cursor + attempt) % count]
+            self.stats["fetches"] += 1
+            if attempt:
+                self.stats["failovers"] += 1
+            try:
+                found = await self.fetch(endpoint, pending)
+            except Exception as e:
+                logger.debug(f"[{self.currency}] {endpoint} failed for {len(pending)} addresses: {e}")
+                found = {}
+            for address, total in found.items():
+                self._update(address, float(total))
+            pending = [a for a in pending if a not in found]
+            if not pending:
+                break
+        self._cursor = (self._cursor + 1) % count
+        self.stats["cycles"] += 1
+        self.stats["last_cycle_ms"] = (time.perf_counter() - started) * 1000
+
+    def _update(self, address, total):
+        if total <= self._balances.get(address, 0.0):
+            return
+        self._balances[address] = total
+        for sub in self._subs.get(address, ()):
+            if not sub.closed:
+                sub._offer(self.currency, total)
+
+    @property
+    def watched(self):
+        return len(self._subs)
+
+
+class DepositWatcher:
+    """
+    Registry of per-chain watchers.
+
+    main.py registers one bulk fetcher per currency at import time; deal
+    monitors call `watch()` with their deposit address and wait on the
+    returned subscription instead of polling balances themselves.
+    """
+
+    def __init__(self, interval=1.5, tolerance=0.0001):
+        self.interval = interval
+        self.tolerance = tolerance
+        self.chains = {}
+
+    def register(self, currency, fetch, endpoints, interval=None):
+        self.chains[currency] = ChainWatcher(currency, fetch, endpoints, interval or self.interval)
+
+    def watch(self, address, currencies, expected):
+        """Subscribe to balance increases of `address` on `currencies` (the first is the deal's own)."""
+        currencies = [c for c in currencies if c in self.chains]
+        subscription = DepositSubscription(address, currencies, expected, self.tolerance)
+        for currency in currencies:
+            self.chains[currency].watch(subscription)
+        return subscription
+
+    def stats(self):
+        return {currency: dict(chain.stats, watched=chain.watched) for currency, chain in self.chains.items()}
+
+
+deposit_watcher = DepositWatcher(interval=float(os.getenv("DEPOSIT_WATCH_INTERVAL", "1.5")))
@@ -0,0 +1,107 @@
+"""
+EVM Provider Registry
+One long-lived AsyncWeb3 client per RPC endpoint, shared by every EVM helper.
+"""
+
+import asyncio
+import logging
+import os
+import aiohttp
+from web3 import AsyncWeb3, AsyncHTTPProvider
+from utils import json_codec
+
+logger = logging.getLogger("EVMProviders")
+
+
+class EVMProviderRegistry:
+    """
+    Process-wide AsyncWeb3 registry.
+
+    Each endpoint gets one keep-alive aiohttp session (bounded connection
+    pool, cached DNS), and each (endpoint, timeout) pair one AsyncWeb3
+    instance whose provider reuses that session, so a monitor tick costs a
+    request on a warm connection instead of a TCP+TLS handshake. web3's own
+    sessions close the connection after every request.
+
+    There is no `is_connected()` probe: callers make their real call and fail
+    over to the next endpoint when it raises. Contract objects are cached per
+    client, address and ABI (`contract()`), which skips re-parsing the ABI on
+    every balance check.
+    """
+
+    def __init__(self, limit=100, limit_per_host=8, dns_ttl=300, keepalive_timeout=60):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self._sessions = {}     # endpoint -> aiohttp.ClientSession
+        self._clients = {}      # (endpoint, timeout) -> (AsyncWeb3, session it is bound to)
+        self._owned = set()     # id() of clients created here (contract cache keys)
+        self._contracts = {}    # (id(w3), address, abi key) -> contract
+        self._lock = asyncio.Lock()
+        self.stats = {"clients": 0, "sessions": 0, "contracts": 0, "contract_hits": 0}
+
+    def session(self, url):
+        """Keep-alive aiohttp session for `url` (also used for raw/batched JSON-RPC posts)."""
+        session = self._sessions.get(url)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+                enable_cleanup_closed=True,
+            )
+            session = aiohttp.ClientSession(connector=connector, json_serialize=json_codec.dumps)
+            self._sessions[url] = session
+            self.stats["sessions"] += 1
+            logger.debug(f"Opened keep-alive RPC session for {url}")
+        return session
+
+    async def get(self, url, timeout=5):
+        """Shared AsyncWeb3 client for `url` with a per-request `timeout` (seconds)."""
+        key = (url, timeout)
+        entry = self._clients.get(key)
+        if entry is not None and entry[1] is self._sessions.get(url) and not entry[1].closed:
+            return entry[0]
+        async with self._lock:
+            entry = self._clients.get(key)
+            if entry is not None and entry[1] is self._sessions.get(url) and not entry[1].closed:
+                return entry[0]
+            if entry is not None:
+                self._drop_contracts(entry[0])
+            session = self.session(url)
+            provider = AsyncHTTPProvider(url, request_kwargs={"timeout": aiohttp.ClientTimeout(total=timeout)})
+            # Must be cached before the first request, or web3 opens its own per-request session
+            await provider.cache_async_session(session)
+            w3 = AsyncWeb3(provider)
+            self._clients[key] = (w3, session)
+            self._owned.add(id(w3))
+            self.stats["clients"] += 1
+            return w3
+
+    def contract(self, w3, address, abi):
+        """Contract object for `address` on client `w3`, cached for registry clients."""
+        address = AsyncWeb3.to_checksum_address(address)
+        if id(w3) not in self._owned:
+            return w3.eth.contract(address=address, abi=abi)
+        key = (id(w3), address, json_codec.dumps(abi))
+        contract = self._contracts.get(key)
+        if contract is None:
+            contract = w3.eth.contract(address=address, abi=abi)
+            self._contracts[key] = contract
+            self.stats["contracts"] += 1
+        else:
+            self.stats["contract_hits"] += 1
+        return contract
+
+    def _drop_contracts(self, w3):
+        self._owned.discard(id(w3))
+        for key in [k for k in self._contracts if k[0] == id(w3)]:
+            del self._contracts[key]
+
+
+evm_providers = EVMProviderRegistry(
+    limit=int(os.getenv("EVM_RPC_POOL_LIMIT", "100")),
+    limit_per_host=int(os.getenv("EVM_RPC_POOL_PER_HOST", "8")),
+)
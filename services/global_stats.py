@@ -0,0 +1,69 @@
+import logging
+from services.db_manager import db
+from services.schema_migrations import rebuild_global_stats
+
+logger = logging.getLogger("GlobalStats")
+
+# Keys in the global_stats table; per-status deal counts are stored as "status:<status>"
+TOTAL_VOLUME = "total_volume"   # Sum of users.volume_usd (both sides of a deal are credited)
+TOTAL_DEALS = "total_deals"     # Sum of users.deals_completed
+USER_COUNT = "user_count"       # Rows in users
+STATUS_PREFIX = "status:"
+
+
+class GlobalStats:
+    """
+    Materialized aggregate counters (global_stats table).
+
+    Writers add deltas inside their own transaction via `bump(cursor, ...)`,
+    so totals stay consistent with the rows they summarize; readers get
+    every counter with one small SELECT instead of scanning users/deals.
+    """
+
+    def _upsert_sql(self):
+        return f"""
+            INSERT INTO global_stats (key, value) VALUES ({db.p}, {db.p})
+            ON CONFLICT(key) DO UPDATE SET value = global_stats.value + EXCLUDED.value
+        """
+
+    def bump(self, cursor, deltas):
+        """Add {key: delta} to the counters using the caller's cursor/transaction."""
+        params = [(key, delta) for key, delta in deltas.items() if key and delta]
+        if params:
+            cursor.executemany(self._upsert_sql(), params)
+
+    def bump_statuses(self, cursor, status_deltas):
+        self.bump(cursor, {f"{STATUS_PREFIX}{status}": delta for status, delta in status_deltas.items() if status})
+
+    def get(self):
+        """{"total_volume", "total_deals", "user_count", "statuses": {status: open deals}}"""
+        stats = {TOTAL_VOLUME: 0.0, TOTAL_DEALS: 0, USER_COUNT: 0, "statuses": {}}
+        try:
+            with db.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT key, value FROM global_stats")
+                rows = cursor.fetchall()
+                cursor.close()
+        except Exception as e:
+            logger.error(f"Failed to read global stats: {e}")
+            return stats
+
+        for key, value in rows:
+            if key.startswith(STATUS_PREFIX):
+                if value:
+                    stats["statuses"][key[len(STATUS_PREFIX):]] = int(value)
+            elif key == TOTAL_VOLUME:
+                stats[key] = float(value or 0.0)
+            else:
+                stats[key] = int(value or 0)
+        return stats
+
+    def rebuild(self):
+        """Recompute every counter from users/deals (repair after manual DB edits)."""
+        with db.session() as conn:
+            cursor = conn.cursor()
+            rebuild_global_stats(cursor)
+            cursor.close()
+
+
+global_stats = GlobalStats()
@@ -0,0 +1,111 @@
+import bisect
+import logging
+import threading
+from services.db_manager import db
+
+logger = logging.getLogger("LeaderboardService")
+
+
+class LeaderboardService:
+    """
+    In-memory volume leaderboard (order-statistics over a sorted array).
+
+    Hydrated once from `users`, then kept current by `update()` from
+    update_user_stats. Entries are sorted by (-volume, user_id), so:
+      - top(k) is a slice,
+      - page(after=cursor) is keyset pagination (bisect past the cursor),
+      - rank(user_id) is an O(log n) bisect: 1 + users with strictly more volume.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys = []     # sorted [(-volume, user_id)]
+        self._users = {}    # user_id -> (volume, deals)
+        self._loaded = False
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                with db.get_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("SELECT user_id, deals_completed, volume_usd FROM users")
+                    rows = cursor.fetchall()
+                    cursor.close()
+            except Exception as e:
+                logger.error(f"Failed to hydrate leaderboard: {e}")
+                return
+            self._users = {str(uid): (float(volume or 0.0), int(deals or 0)) for uid, deals, volume in rows}
+            self._keys = sorted((-volume, uid) for uid, (volume, _) in self._users.items())
+            self._loaded = True
+            logger.info(f"Leaderboard hydrated with {len(self._keys)} users.")
+
+    def update(self, user_id, volume, deals):
+        """Set a user's absolute volume/deal count (call after the users row was written)."""
+        if not self._loaded:
+            return  # Hydration will read the new row anyway
+        uid = str(user_id)
+        volume = float(volume or 0.0)
+        with self._lock:
+            old = self._users.get(uid)
+            if old is not None:
+                i = bisect.bisect_left(self._keys, (-old[0], uid))
+                if i < len(self._keys) and self._keys[i] == (-old[0], uid):
+                    del self._keys[i]
+            bisect.insort(self._keys, (-volume, uid))
+            self._users[uid] = (volume, int(deals or 0))
+
+    def _entry(self, key):
+        volume, deals = self._users[key[1]]
+        return key[1], {"deals": deals, "volume": volume}
+
+    def top(self, k=10):
+        """[(user_id, {"deals", "volume"})] for the k highest volumes."""
+        self._ensure_loaded()
+        with self._lock:
+            return [self._entry(key) for key in self._keys[:k]]
+
+    def page(self, after=None, limit=10):
+        """
+        Keyset page: entries after the `after` cursor ((volume, user_id) of the
+        last row shown, None for the first page). Returns (entries, next_cursor);
+        next_cursor is None on the last page.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            start = 0
+            if after is not None:
+                start = bisect.bisect_right(self._keys, (-float(after[0]), str(after[1])))
+            keys = self._keys[start:start + limit]
+            entries = [self._entry(key) for key in keys]
+            more = start + limit < len(self._keys)
+        next_cursor = (-keys[-1][0], keys[-1][1]) if keys and more else None
+        return entries, next_cursor
+
+    def rank(self, user_id):
+        """Exact 1-based rank by volume (ties share a rank), or None if the user has no stats."""
+        self._ensure_loaded()
+        uid = str(user_id)
+        with self._lock:
+            entry = self._users.get(uid)
+            if entry is None:
+                return None
+            return bisect.bisect_left(self._keys, (-entry[0], "")) + 1
+
+    def offset_of(self, cursor):
+        """Number of entries before the row after `cursor` (for numbering keyset pages)."""
+        if cursor is None:
+            return 0
+        self._ensure_loaded()
+        with self._lock:
+            return bisect.bisect_right(self._keys, (-float(cursor[0]), str(cursor[1])))
+
+    def size(self):
+        self._ensure_loaded()
+        return len(self._keys)
+
+
+leaderboard_service = LeaderboardService()
@@ -0,0 +1,240 @@
+"""
+Transfer Log Follower
+Follows a token's Transfer logs block by block for every watched deposit address.
+"""
+
+import asyncio
+import logging
+import os
+from collections import namedtuple
+from services.rpc_batch import rpc_batch, JSONRPCError
+
+logger = logging.getLogger("LogFollower")
+
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+
+# amount is in token base units
+Transfer = namedtuple("Transfer", "txid block log_index sender amount")
+
+
+def _topic(address):
+    return "0x" + address[2:].rjust(64, "0")
+
+
+class TransferLogFollower:
+    """
+    Keeps the incoming Transfers of the watched addresses for one token.
+
+    Each cycle reads the chain tip and runs one `eth_getLogs` over the new
+    blocks, with the watched recipients as an OR filter on the `to` topic
+    (split into groups of `topic_chunk`, all in the same batched POST). The
+    last `reorg_depth` blocks are scanned again every cycle and their
+    transfers replaced, so transfers dropped or moved by a reorg are
+    corrected. A newly watched address gets a one-off scan of the last
+    `lookback` blocks. Until that scan is done `covers()` is False and
+    callers use their own lookup.
+
+    A watch ends when the task that started it finishes. This mirrors
+    DepositSubscription in services/deposit_watcher.py.
+    """
+
+    def __init__(self, name, token, endpoints, interval=3.0, max_range=500, reorg_depth=15,
+                 lookback=1000, topic_chunk=500):
+        self.name = name
+        self.token = token
+        self.endpoints = list(endpoints)
+        self.interval = interval
+        self.max_range = max_range
+        self.reorg_depth = reorg_depth
+        self.lookback = lookback
+        self.topic_chunk = topic_chunk
+        self._watched = {}          # address (lowercase) -> [tasks watching it]
+        self._ready = set()         # addresses whose lookback scan is done
+        self._transfers = {}        # address -> {(txid, log_index): Transfer}
+        self._head = None           # last block scanned
+        self._cursor = 0
+        self._task = None
+        self.stats = {"cycles": 0, "get_logs": 0, "transfers": 0, "reorged": 0, "failovers": 0, "head": None}
+
+    # --- Watching ---
+    def watch(self, address):
+        key = address.lower()
+        try:
+            owner = asyncio.current_task()
+        except RuntimeError:
+            owner = None
+        self._watched.setdefault(key, []).append(owner)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def _prune(self):
+        for key in list(self._watched):
+            owners = [t for t in self._watched[key] if t is None or not t.done()]
+            if owners:
+                self._watched[key] = owners
+            else:
+                del self._watched[key]
+                self._ready.discard(key)
+                self._transfers.pop(key, None)
+
+    # --- Lookups (dictionary reads) ---
+    def covers(self, address):
+        return address.lower() in self._ready
+
+    def transfers(self, address):
+        """Incoming transfers, oldest first."""
+        found = self._transfers.get(address.lower(), {})
+        return sorted(found.values(), key=lambda t: (t.block, t.log_index))
+
+    def txids(self, address):
+        """Transaction hashes of incoming transfers, newest first."""
+        seen = []
+        for transfer in reversed(self.transfers(address)):
+            if transfer.txid not in seen:
+                seen.append(transfer.txid)
+        return seen
+
+    def received(self, address):
+        """Sum of incoming transfers in base units."""
+        return sum(t.amount for t in self._transfers.get(address.lower(), {}).values())
+
+    # --- Following ---
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._prune()
+            if not self._watched:
+                break
+            started = loop.time()
+            await self.poll()
+            await asyncio.sleep(max(self.interval - (loop.time() - started), 0.1))
+        self._head = None
+        self._task = None
+
+    async def poll(self):
+        count = len(self.endpoints)
+        for attempt in range(count):
+            url = self.endpoints[(self._cursor + attempt) % count]
+            if attempt:
+                self.stats["failovers"] += 1
+            try:
+                await self._sync(url)
+                break
+            except Exception as e:
+                logger.debug(f"[{self.name}] Log sync via {url} failed: {e}")
+        self._cursor = (self._cursor + 1) % count
+        self.stats["cycles"] += 1
+
+    async def _sync(self, url):
+        tip = int(await rpc_batch.call_one(url, "eth_blockNumber", []), 16)
+        if self._head is not None and tip < self._head:
+            raise RuntimeError(f"endpoint behind ({tip} < {self._head})")
+        head = tip if self._head is None else self._head
+        addresses = list(self._watched)
+        new = [a for a in addresses if a not in self._ready]
+
+        # Fetch everything first; state only changes once every range came back
+        backfill = await self._get_logs(url, max(tip - self.lookback, 0), head, new) if new else []
+        start = max(head - self.reorg_depth + 1, 0)
+        window = await self._get_logs(url, start, tip, addresses)
+
+        for log in backfill:
+            self._add(log)
+        self._ready.update(new)
+        self._replace_window(start, addresses, window)
+        self._head = tip
+        self.stats["head"] = tip
+        self.stats["transfers"] = sum(len(found) for found in self._transfers.values())
+
+    async def _get_logs(self, url, start, end, addresses):
+        calls = []
+        for frm in range(start, end + 1, self.max_range):
+            to = min(frm + self.max_range - 1, end)
+            for i in range(0, len(addresses), self.topic_chunk):
+                recipients = [_topic(a) for a in addresses[i:i + self.topic_chunk]]
+                calls.append(("eth_getLogs", [{
+                    "fromBlock": hex(frm),
+                    "toBlock": hex(to),
+                    "address": self.token,
+                    "topics": [TRANSFER_TOPIC, None, recipients],
+                }]))
+        if not calls:
+            return []
+        self.stats["get_logs"] += len(calls)
+        results = await rpc_batch.call(url, calls)
+        logs = []
+        for result in results:
+            if isinstance(result, JSONRPCError) or not isinstance(result, list):
+                raise RuntimeError(f"eth_getLogs failed: {result}")
+            logs.extend(log for log in result if not log.get("removed"))
+        return logs
+
+    def _add(self, log):
+        topics = log.get("topics") or []
+        if len(topics) < 3:
+            return False
+        recipient = "0x" + topics[2][-40:].lower()
+        if recipient not in self._watched:
+            return False
+        transfer = Transfer(
+            txid=log["transactionHash"],
+            block=int(log["blockNumber"], 16),
+            log_index=int(log["logIndex"], 16),
+            sender="0x" + topics[1][-40:].lower(),
+            amount=int(log["data"], 16) if log.get("data") not in (None, "0x") else 0,
+        )
+        self._transfers.setdefault(recipient, {})[(transfer.txid, transfer.log_index)] = transfer
+        return True
+
+    def _replace_window(self, start, addresses, logs):
+        before = {}
+        for address in addresses:
+            found = self._transfers.get(address)
+            if not found:
+                continue
+            before[address] = {k for k, t in found.items() if t.block >= start}
+            for key in before[address]:
+                del found[key]
+        for log in logs:
+            self._add(log)
+        # Transfers that were in the window and are gone now were reorged out (or moved)
+        for address, keys in before.items():
+            gone = keys - set(self._transfers.get(address, {}))
+            if gone:
+                self.stats["reorged"] += len(gone)
+                logger.warning(f"[{self.name}] {len(gone)} transfer(s) to {address} dropped by a reorg")
+
+
+class TransferLogs:
+    """Registry of followers by currency (main.py registers the USDT chains)."""
+
+    def __init__(self, **options):
+        self.options = options
+        self.followers = {}
+
+    def register(self, currency, token, endpoints):
+        self.followers[currency] = TransferLogFollower(currency, token, endpoints, **self.options)
+
+    def watch(self, address, currencies):
+        for currency in currencies:
+            follower = self.followers.get(currency)
+            if follower is not None:
+                follower.watch(address)
+
+    def get(self, currency, address):
+        """The follower for `currency` if it already has every transfer to `address`, else None."""
+        follower = self.followers.get(currency)
+        if follower is not None and follower.covers(address):
+            return follower
+        return None
+
+    def stats(self):
+        return {currency: dict(f.stats, watched=len(f._watched)) for currency, f in self.followers.items()}
+
+
+transfer_logs = TransferLogs(
+    interval=float(os.getenv("LOG_FOLLOW_INTERVAL", "3")),
+    max_range=int(os.getenv("LOG_FOLLOW_MAX_RANGE", "500")),
+    reorg_depth=int(os.getenv("LOG_FOLLOW_REORG_DEPTH", "15")),
+    lookback=int(os.getenv("LOG_FOLLOW_LOOKBACK", "1000")),
+)
@@ -0,0 +1,168 @@
+"""
+Multicall3 Aggregator
+Reads token and native balances of many wallets in one eth_call.
+"""
+
+import logging
+import os
+from eth_abi import encode, decode
+from services.rpc_batch import rpc_batch, JSONRPCError
+
+logger = logging.getLogger("Multicall")
+
+# Same deployment address on Ethereum, BSC and Polygon
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+AGGREGATE3_SELECTOR = bytes.fromhex("82ad56cb")       # aggregate3((address,bool,bytes)[])
+GET_ETH_BALANCE_SELECTOR = bytes.fromhex("4d2301cc")  # getEthBalance(address)
+BALANCE_OF_SELECTOR = bytes.fromhex("70a08231")       # balanceOf(address)
+
+
+# Error messages that mean the aggregate3 call was too big (calldata size or gas)
+SIZE_ERROR_HINTS = ("gas", "too large", "too big", "exceeds", "size", "oversized")
+
+
+def _is_size_error(error):
+    """True for an eth_call rejected for its size, not for rate limits or outages."""
+    if isinstance(error, Exception):
+        return getattr(error, "status", None) == 413
+    message = str(error.get("message", "") if isinstance(error, dict) else error).lower()
+    if "rate" in message or "too many" in message:
+        return False
+    return any(hint in message for hint in SIZE_ERROR_HINTS)
+
+
+def _address_arg(address):
+    return bytes.fromhex(address.lower()[2:].rjust(64, "0"))
+
+
+class Multicall3:
+    """
+    Multicall3 `aggregate3` reader.
+
+    `aggregate(url, calls)` runs `[(target, calldata), ...]` as sub-calls of
+    one eth_call per chunk (every chunk in the same batched POST) and returns
+    each sub-call's return data, or None for a sub-call that reverted.
+
+    Endpoints cap eth_call calldata and gas differently. When a chunk is
+    rejected for its size or gas its endpoint's chunk size is halved and
+    kept for later reads; other errors (rate limits, outages) leave the
+    chunk unanswered so the caller fails over. Reads of fewer than
+    `min_calls` sub-calls, endpoints whose chunk size shrank below it, and
+    endpoints where the contract is missing use plain batched requests
+    instead (`eth_call` to the target, `eth_getBalance` for `getEthBalance`).
+    """
+
+    def __init__(self, address=MULTICALL3_ADDRESS, max_calls=500, min_calls=16):
+        self.address = address
+        self.max_calls = max_calls
+        self.min_calls = min_calls
+        self._limits = {}           # url -> sub-calls per aggregate3 the endpoint accepted
+        self._unsupported = set()   # urls where Multicall3 is not deployed
+        self.stats = {"aggregates": 0, "subcalls": 0, "shrinks": 0, "fallback_calls": 0}
+
+    # --- Balance reads ---
+    async def balances(self, url, wallets, token=None, native=False):
+        """
+        {wallet: (token_raw, native_raw)} in base units, for the wallets the
+        endpoint answered. A value the caller did not ask for is None.
+        """
+        calls = []
+        for wallet in wallets:
+            arg = _address_arg(wallet)
+            if token:
+                calls.append((token, BALANCE_OF_SELECTOR + arg))
+            if native:
+                calls.append((self.address, GET_ETH_BALANCE_SELECTOR + arg))
+        data = await self.aggregate(url, calls)
+
+        result = {}
+        it = iter(data)
+        for wallet in wallets:
+            token_raw = _uint(next(it)) if token else None
+            native_raw = _uint(next(it)) if native else None
+            if (token and token_raw is None) or (native and native_raw is None):
+                continue
+            result[wallet] = (token_raw, native_raw)
+        return result
+
+    # --- Generic aggregation ---
+    async def aggregate(self, url, calls):
+        results = [None] * len(calls)
+        if calls:
+            await self._run(url, calls, list(range(len(calls))), results)
+        return results
+
+    async def _run(self, url, calls, indexes, results):
+        limit = self._limits.get(url, self.max_calls)
+        if url in self._unsupported or limit < self.min_calls or len(indexes) < self.min_calls:
+            await self._plain(url, calls, indexes, results)
+            return
+
+        chunks = [indexes[i:i + limit] for i in range(0, len(indexes), limit)]
+        requests = []
+        for chunk in chunks:
+            payload = encode(["(address,bool,bytes)[]"], [[(calls[i][0], True, calls[i][1]) for i in chunk]])
+            data = "0x" + (AGGREGATE3_SELECTOR + payload).hex()
+            requests.append(("eth_call", [{"to": self.address, "data": data}, "latest"]))
+        self.stats["aggregates"] += len(chunks)
+        self.stats["subcalls"] += len(indexes)
+        replies = await rpc_batch.call(url, requests)
+
+        failed = []
+        for chunk, reply in zip(chunks, replies):
+            if isinstance(reply, JSONRPCError):
+                if _is_size_error(reply.error):
+                    failed.extend(chunk)
+                # Anything else (rate limit, outage): leave these unanswered, the caller fails over
+                continue
+            if not isinstance(reply, str):
+                continue
+            if len(reply) <= 2:
+                # Empty return data: nothing deployed at the Multicall3 address
+                if url not in self._unsupported:
+                    logger.info(f"Multicall3 not available on {url}; using plain batched calls")
+                    self._unsupported.add(url)
+                failed.extend(chunk)
+                continue
+            (decoded,) = decode(["(bool,bytes)[]"], bytes.fromhex(reply[2:]))
+            for i, (success, return_data) in zip(chunk, decoded):
+                results[i] = return_data if success else None
+
+        if failed:
+            if url not in self._unsupported:
+                smaller = min(limit, len(failed)) // 2
+                self._limits[url] = smaller
+                self.stats["shrinks"] += 1
+                logger.info(f"{url} rejected aggregate3 with {min(limit, len(failed))} calls; trying {smaller}")
+            await self._run(url, calls, failed, results)
+
+    async def _plain(self, url, calls, indexes, results):
+        requests = []
+        for i in indexes:
+            target, data = calls[i]
+            if target == self.address and data[:4] == GET_ETH_BALANCE_SELECTOR:
+                requests.append(("eth_getBalance", ["0x" + data[-20:].hex(), "latest"]))
+            else:
+                requests.append(("eth_call", [{"to": target, "data": "0x" + data.hex()}, "latest"]))
+        self.stats["fallback_calls"] += len(requests)
+        replies = await rpc_batch.call(url, requests)
+        for i, (method, _), reply in zip(indexes, requests, replies):
+            if not isinstance(reply, str) or len(reply) <= 2:
+                continue
+            if method == "eth_getBalance":
+                results[i] = int(reply, 16).to_bytes(32, "big")
+            else:
+                results[i] = bytes.fromhex(reply[2:])
+
+
+def _uint(data):
+    if data is None or len(data) < 32:
+        return None
+    return int.from_bytes(data[:32], "big")
+
+
+multicall = Multicall3(
+    address=os.getenv("MULTICALL3_ADDRESS", MULTICALL3_ADDRESS),
+    max_calls=int(os.getenv("MULTICALL_MAX_CALLS", "500")),
+)
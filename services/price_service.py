@@ -7,6 +7,7 @@ Optimized for high-performance with global session management and parallel fetch
 import time
 import asyncio
 import aiohttp
+from utils import json_codec
 
 # Price cache (shared across calls)
 price_cache = {}
@@ -17,7 +18,7 @@ async def get_session():
     """Get or create a persistent aiohttp session"""
     global GLOBAL_SESSION
     if GLOBAL_SESSION is None or GLOBAL_SESSION.closed:
-        GLOBAL_SESSION = aiohttp.ClientSession()
+        GLOBAL_SESSION = aiohttp.ClientSession(json_serialize=json_codec.dumps)
     return GLOBAL_SESSION
 
 async def get_coingecko_price(currency_key, vs_currency="usd"):
@@ -47,7 +48,7 @@ async def get_coingecko_price(currency_key, vs_currency="usd"):
     try:
         async with session.get(url, timeout=5) as r:
             if r.status == 200:
-                data = await r.json()
+                data = await r.json(loads=json_codec.loads)
                 if cg_id in data:
                     return float(data[cg_id][vs_curr])
             elif r.status == 429:
@@ -72,7 +73,7 @@ async def get_ltc_price(vs_currency="usd"):
         try:
             async with session.get(url, timeout=3) as r:
                 if r.status == 200:
-                    d = await r.json()
+                    d = await r.json(loads=json_codec.loads)
                     if "price" in d: return float(d["price"])
                     if "litecoin" in d: return float(d["litecoin"]["usd"])
                     if "USD" in d: return float(d["USD"])
@@ -107,7 +108,7 @@ async def get_solana_price(vs_currency="usd"):
         try:
             async with session.get(url, timeout=3) as r:
                 if r.status == 200:
-                    d = await r.json()
+                    d = await r.json(loads=json_codec.loads)
                     if "price" in d: return float(d["price"])
                     if "solana" in d: return float(d["solana"]["usd"])
                     if "USD" in d: return float(d["USD"])
@@ -142,7 +143,7 @@ async def get_ethereum_price(vs_currency="usd"):
         try:
             async with session.get(url, timeout=3) as r:
                 if r.status == 200:
-                    d = await r.json()
+                    d = await r.json(loads=json_codec.loads)
                     if "price" in d: return float(d["price"])
                     if "ethereum" in d: return float(d["ethereum"]["usd"])
                     if "USD" in d: return float(d["USD"])
@@ -177,7 +178,7 @@ async def get_usdt_price(vs_currency="usd"):
         try:
             async with session.get(url, timeout=3) as r:
                 if r.status == 200:
-                    d = await r.json()
+                    d = await r.json(loads=json_codec.loads)
                     if "price" in d: return float(d["price"])
                     if "tether" in d: return float(d["tether"]["usd"])
                     if "USD" in d: return float(d["USD"])
@@ -1,5 +1,7 @@
 
 from services.db_manager import db
+from services.global_stats import global_stats, USER_COUNT
+from database import invalidate_user_stats
 import string
 import random
 import logging
@@ -31,9 +33,13 @@ class ReferralService:
                             referral_code = EXCLUDED.referral_code,
                             first_seen = COALESCE(users.first_seen, EXCLUDED.first_seen)
                     """, (str(user_id), new_code, timestamp))
-                    return new_code
+                    if not row:
+                        global_stats.bump(cursor, {USER_COUNT: 1})
                 finally:
                     cursor.close()
+            # After the commit, so a concurrent read can't re-cache the old row
+            invalidate_user_stats(user_id)
+            return new_code
         except Exception as e:
             raise e
 
@@ -70,9 +76,12 @@ class ReferralService:
                         VALUES ({db.p}, {db.p})
                         ON CONFLICT(user_id) DO UPDATE SET referrer_id = EXCLUDED.referrer_id
                     """, (str(user_id), referrer_id))
-                    return True, "Referrer set successfully!"
+                    if not current:
+                        global_stats.bump(cursor, {USER_COUNT: 1})
                 finally:
                     cursor.close()
+            invalidate_user_stats(user_id)
+            return True, "Referrer set successfully!"
         except Exception as e:
             raise e
 
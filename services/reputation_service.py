@@ -1,5 +1,5 @@
 from services.db_manager import db
-from database import load_user_stats
+from database import load_user_stats, USER_STATS_CACHE, user_cache_tag
 
 class ReputationService:
     def get_badges(self, user_id):
@@ -24,6 +24,11 @@ class ReputationService:
         return badges
 
     def _get_user_stats(self, user_id):
+        return USER_STATS_CACHE.get_or_load(
+            ("reputation", str(user_id)), lambda: self._load_user_stats(user_id), tags=(user_cache_tag(user_id),)
+        )
+
+    def _load_user_stats(self, user_id):
         try:
             with db.get_connection() as conn:
                 cursor = conn.cursor()
@@ -0,0 +1,141 @@
+"""
+JSON-RPC Batch Client
+Sends many JSON-RPC calls to one endpoint as a single array POST.
+"""
+
+import asyncio
+import logging
+import os
+import aiohttp
+from utils import json_codec
+from services.evm_provider import evm_providers
+
+logger = logging.getLogger("RPCBatch")
+
+
+class JSONRPCError(Exception):
+    """A call in a batch that failed, also after its individual retry."""
+
+    def __init__(self, method, error):
+        self.method = method
+        self.error = error
+        super().__init__(f"{method}: {error}")
+
+
+class JSONRPCBatchClient:
+    """
+    Batched JSON-RPC over the shared keep-alive sessions.
+
+    `call(url, calls)` takes `[(method, params), ...]` and returns one entry
+    per call, in order: the call's result, or a `JSONRPCError` for a call
+    that failed. Responses are matched to calls by id, since providers may
+    answer a batch in any order.
+
+    Batches are cut to `max_batch` calls. When an endpoint rejects a batch as
+    a whole (HTTP 413, an error object instead of an array, or a batch
+    without batching support) its limit is halved and the calls are sent
+    again in smaller batches. The learned limit is kept for later batches.
+    Calls that come back with an error or without a response (some providers
+    rate-limit inside a batch) are retried once as single requests.
+    """
+
+    def __init__(self, max_batch=100, timeout=6):
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._limits = {}           # url -> largest batch the endpoint accepted
+        self.stats = {"posts": 0, "calls": 0, "splits": 0, "retries": 0, "failed": 0}
+
+    async def call(self, url, calls, session=None, timeout=None):
+        if not calls:
+            return []
+        session = session or evm_providers.session(url)
+        timeout = aiohttp.ClientTimeout(total=timeout or self.timeout)
+        self.stats["calls"] += len(calls)
+        results = [None] * len(calls)
+        await self._run(url, session, timeout, calls, list(range(len(calls))), results)
+        return results
+
+    async def call_one(self, url, method, params, session=None, timeout=None):
+        """Single call; raises JSONRPCError on failure."""
+        (result,) = await self.call(url, [(method, params)], session, timeout)
+        if isinstance(result, JSONRPCError):
+            raise result
+        return result
+
+    async def _run(self, url, session, timeout, calls, indexes, results):
+        limit = self._limits.get(url, self.max_batch)
+        if limit == 1:
+            # Endpoint without batch support: plain requests
+            await asyncio.gather(*(self._post_single(url, session, timeout, calls, i, results) for i in indexes))
+            return
+        chunks = [indexes[i:i + limit] for i in range(0, len(indexes), limit)]
+        outcomes = await asyncio.gather(
+            *(self._post_batch(url, session, timeout, calls, chunk) for chunk in chunks),
+            return_exceptions=True,
+        )
+        rejected, retry = [], []
+        for chunk, outcome in zip(chunks, outcomes):
+            if outcome is _REJECTED:
+                # A lone call that is too large says nothing about the batch limit
+                (retry if len(chunk) == 1 else rejected).extend(chunk)
+                continue
+            if isinstance(outcome, BaseException):
+                # Transport failure: the whole chunk is lost, nothing to salvage
+                for i in chunk:
+                    results[i] = JSONRPCError(calls[i][0], outcome)
+                continue
+            for i in chunk:
+                response = outcome.get(i)
+                if response is not None and "error" not in response and "result" in response:
+                    results[i] = response["result"]
+                else:
+                    retry.append(i)
+
+        if rejected:
+            smaller = max(min(limit, len(rejected)) // 2, 1)
+            self._limits[url] = smaller
+            self.stats["splits"] += 1
+            logger.info(f"{url} rejected a batch of {min(limit, len(rejected))}; using batches of {smaller}")
+            await self._run(url, session, timeout, calls, rejected, results)
+
+        if retry:
+            self.stats["retries"] += len(retry)
+            await asyncio.gather(*(self._post_single(url, session, timeout, calls, i, results) for i in retry))
+
+    async def _post_batch(self, url, session, timeout, calls, chunk):
+        """{index: response object} for one array POST, or _REJECTED."""
+        payload = [{"jsonrpc": "2.0", "id": i, "method": calls[i][0], "params": calls[i][1]} for i in chunk]
+        self.stats["posts"] += 1
+        async with session.post(url, json=payload, timeout=timeout) as resp:
+            if resp.status == 413:
+                return _REJECTED
+            resp.raise_for_status()
+            data = await json_codec.read_json(resp)
+        if not isinstance(data, list):
+            return _REJECTED
+        return {item.get("id"): item for item in data if isinstance(item, dict)}
+
+    async def _post_single(self, url, session, timeout, calls, index, results):
+        method, params = calls[index]
+        try:
+            self.stats["posts"] += 1
+            payload = {"jsonrpc": "2.0", "id": index, "method": method, "params": params}
+            async with session.post(url, json=payload, timeout=timeout) as resp:
+                resp.raise_for_status()
+                data = await json_codec.read_json(resp)
+            if "result" in data and "error" not in data:
+                results[index] = data["result"]
+                return
+            error = data.get("error")
+        except Exception as e:
+            error = e
+        self.stats["failed"] += 1
+        results[index] = JSONRPCError(method, error)
+
+
+_REJECTED = object()
+
+rpc_batch = JSONRPCBatchClient(
+    max_batch=int(os.getenv("RPC_BATCH_MAX", "100")),
+    timeout=float(os.getenv("RPC_BATCH_TIMEOUT", "6")),
+)
@@ -4,6 +4,7 @@ import logging
 from typing import List, Any
 import aiohttp
 import time
+from utils import json_codec
 
 logger = logging.getLogger("RPCManager")
 
@@ -28,10 +29,10 @@ class RPCManager:
         for i, url in enumerate(urls):
             try:
                 # exponential backoff if retrying same URL, but here we rotate
-                async with aiohttp.ClientSession() as session:
+                async with aiohttp.ClientSession(json_serialize=json_codec.dumps) as session:
                     async with session.post(url, json=payload, timeout=5) as resp:
                         if resp.status == 200:
-                            data = await resp.json()
+                            data = await resp.json(loads=json_codec.loads)
                             if "result" in data:
                                 return data["result"]
                             if "error" in data:
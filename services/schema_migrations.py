@@ -0,0 +1,343 @@
+import logging
+import time
+
+logger = logging.getLogger("SchemaMigrations")
+
+# Deal fields read on every monitor tick, stored as real columns instead of inside other_data.
+# field -> (sqlite type, postgres type)
+HOT_DEAL_FIELDS = {
+    "address": ("TEXT", "TEXT"),
+    "paid": ("INTEGER", "BOOLEAN"),
+    "last_activity": ("REAL", "DOUBLE PRECISION"),
+    "expected_crypto_amount": ("REAL", "DOUBLE PRECISION"),
+    "payment_start_time": ("REAL", "DOUBLE PRECISION"),
+}
+
+# Ordered list of (version, name, func(cursor, db_type)); see @migration below
+MIGRATIONS = []
+
+
+def migration(version, name):
+    """
+    Register a schema migration. Each version is applied exactly once per
+    database, in version order. Released migrations must never be edited;
+    schema changes (columns, indexes, tables) always go in a new version.
+    """
+    def decorator(func):
+        if any(v == version for v, _, _ in MIGRATIONS):
+            raise ValueError(f"Duplicate schema migration version {version}")
+        MIGRATIONS.append((version, name, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return decorator
+
+
+def _p(db_type):
+    return "?" if db_type == "sqlite" else "%s"
+
+
+def _columns(cursor, db_type, table):
+    if db_type == "sqlite":
+        cursor.execute(f"PRAGMA table_info({table})")
+        return {row[1] for row in cursor.fetchall()}
+    cursor.execute("SELECT column_name FROM information_schema.columns WHERE table_name = %s", (table,))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def add_column(cursor, db_type, table, name, definition):
+    """Idempotent ADD COLUMN (SQLite DDL autocommits, so a half-applied migration must be re-runnable)."""
+    if name not in _columns(cursor, db_type, table):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+
+def applied_versions(cursor):
+    cursor.execute("SELECT version FROM schema_version")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def _read_applied(conn, cursor):
+    # The single read a fully migrated database costs at startup; creates the table on first run
+    try:
+        applied = applied_versions(cursor)
+        conn.commit() # Don't leave a read transaction open on a pooled connection
+        return applied
+    except Exception:
+        conn.rollback() # Postgres aborts the transaction on the failed SELECT
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT,
+            applied_at REAL
+        )
+    """)
+    conn.commit()
+    return set()
+
+
+def apply_migrations(conn, db_type):
+    """Apply every registered migration that this database has not recorded yet."""
+    cursor = conn.cursor()
+    try:
+        applied = _read_applied(conn, cursor)
+        for version, name, func in MIGRATIONS:
+            if version in applied:
+                continue
+            try:
+                func(cursor, db_type)
+                cursor.execute(
+                    f"INSERT INTO schema_version (version, name, applied_at) VALUES ({_p(db_type)}, {_p(db_type)}, {_p(db_type)})",
+                    (version, name, time.time())
+                )
+                conn.commit()
+                logger.info(f"Applied schema migration {version}: {name}")
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"Schema migration {version} ({name}) failed: {e}")
+                raise
+    finally:
+        cursor.close()
+
+
+# =====================================================
+# MIGRATIONS
+# =====================================================
+
+# Users columns added after the table was first released (older databases lack them)
+LEGACY_USER_COLUMNS = [
+    ('current_streak', 'INTEGER DEFAULT 0'),
+    ('highest_streak', 'INTEGER DEFAULT 0'),
+    ('last_deal_date', 'TEXT'),
+    ('achievements', "TEXT DEFAULT '[]'"),
+    ('badges', "TEXT DEFAULT '[]'"),
+    ('xp', 'INTEGER DEFAULT 0'),
+    ('used_chains', "TEXT DEFAULT '[]'"),
+    ('languages_used', 'INTEGER DEFAULT 1'),
+    ('fast_deals', 'INTEGER DEFAULT 0'),
+    ('last_deal_info', 'TEXT'),
+    ('last_achievement', 'TEXT')
+]
+
+
+@migration(0, "baseline")
+def _baseline(cursor, db_type):
+    # The schema as it stood before versioned migrations; a no-op on databases that already have it
+    json_type = "TEXT" if db_type == "sqlite" else "JSONB"
+    id_type = "INTEGER PRIMARY KEY AUTOINCREMENT" if db_type == "sqlite" else "SERIAL PRIMARY KEY"
+
+    # Deals Table
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS deals (
+            deal_id TEXT PRIMARY KEY,
+            channel_id TEXT UNIQUE,
+            buyer_id TEXT,
+            seller_id TEXT,
+            amount REAL,
+            currency TEXT,
+            status TEXT,
+            created_at REAL,
+            other_data {json_type}
+        )
+    """)
+
+    # Users Table (Stats)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id TEXT PRIMARY KEY,
+            deals_completed INTEGER DEFAULT 0,
+            volume_usd REAL DEFAULT 0.0,
+            reputation_score INTEGER DEFAULT 0,
+            referral_code TEXT,
+            referrer_id TEXT,
+            first_seen REAL,
+            last_active REAL,
+            current_streak INTEGER DEFAULT 0,
+            highest_streak INTEGER DEFAULT 0,
+            last_deal_date TEXT,
+            achievements TEXT DEFAULT '[]',
+            badges TEXT DEFAULT '[]',
+            xp INTEGER DEFAULT 0
+        )
+    """)
+    for col_name, col_def in LEGACY_USER_COLUMNS:
+        add_column(cursor, db_type, "users", col_name, col_def)
+
+    # Global Counters/Config
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS config (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """)
+
+    # Blacklist Table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS blacklist (
+            user_id TEXT PRIMARY KEY,
+            reason TEXT,
+            added_at REAL,
+            added_by TEXT
+        )
+    """)
+
+    # Audit Logs
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS audit_logs (
+            id {id_type},
+            action TEXT,
+            user_id TEXT,
+            target_id TEXT,
+            details TEXT,
+            timestamp REAL
+        )
+    """)
+
+    # Price Alerts Table
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS price_alerts (
+            id {id_type},
+            user_id TEXT,
+            currency TEXT,
+            target_price REAL,
+            condition TEXT,
+            fiat TEXT DEFAULT 'usd',
+            created_at REAL
+        )
+    """)
+
+    # Transaction Tracking Table
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS transaction_tracking (
+            id {id_type},
+            user_id TEXT,
+            txid TEXT,
+            currency TEXT,
+            target_confs INTEGER DEFAULT 1,
+            status TEXT DEFAULT 'pending',
+            created_at REAL
+        )
+    """)
+
+    # Optimization Indexes
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_deals_channel ON deals(channel_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_deals_status ON deals(status)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_volume ON users(volume_usd)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_deals ON users(deals_completed)")
+
+
+@migration(1, "promote_hot_deal_fields")
+def _promote_hot_deal_fields(cursor, db_type):
+    for field, (sqlite_type, pg_type) in HOT_DEAL_FIELDS.items():
+        add_column(cursor, db_type, "deals", field, sqlite_type if db_type == "sqlite" else pg_type)
+
+    # Move values out of the JSON blob; values of an unexpected type stay in other_data
+    for field, (sqlite_type, _) in HOT_DEAL_FIELDS.items():
+        if db_type == "sqlite":
+            path = f"'$.{field}'"
+            allowed = {"TEXT": "('text')", "INTEGER": "('true', 'false')", "REAL": "('integer', 'real')"}[sqlite_type]
+            cursor.execute(f"""
+                UPDATE deals SET {field} = json_extract(other_data, {path}),
+                                 other_data = json_remove(other_data, {path})
+                WHERE json_valid(other_data) AND json_type(other_data, {path}) IN {allowed}
+            """)
+        else:
+            pg_type = HOT_DEAL_FIELDS[field][1]
+            json_type = {"TEXT": "string", "BOOLEAN": "boolean", "DOUBLE PRECISION": "number"}[pg_type]
+            cursor.execute(f"""
+                UPDATE deals SET {field} = (other_data ->> '{field}')::{pg_type},
+                                 other_data = other_data - '{field}'
+                WHERE jsonb_typeof(other_data -> '{field}') = '{json_type}'
+            """)
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_deals_address ON deals(address)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_deals_status ON deals(status)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_deals_status_paid ON deals(status, paid)")
+
+
+@migration(2, "deals_archive")
+def _deals_archive(cursor, db_type):
+    # Closed deals leave the live table; same layout as deals plus when it was archived
+    json_type = "TEXT" if db_type == "sqlite" else "JSONB"
+    hot_columns = ",\n".join(
+        f"                {field} {sqlite_type if db_type == 'sqlite' else pg_type}"
+        for field, (sqlite_type, pg_type) in HOT_DEAL_FIELDS.items()
+    )
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS deals_archive (
+            deal_id TEXT PRIMARY KEY,
+            channel_id TEXT,
+            buyer_id TEXT,
+            seller_id TEXT,
+            amount REAL,
+            currency TEXT,
+            status TEXT,
+            created_at REAL,
+            other_data {json_type},
+{hot_columns},
+            archived_at REAL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_archive_channel ON deals_archive(channel_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_archive_address ON deals_archive(address)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_archive_buyer ON deals_archive(buyer_id, archived_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_archive_seller ON deals_archive(seller_id, archived_at)")
+
+
+@migration(3, "deal_versions")
+def _deal_versions(cursor, db_type):
+    # Optimistic concurrency: every write bumps version and only applies if it still matches
+    add_column(cursor, db_type, "deals", "version", "INTEGER NOT NULL DEFAULT 0")
+    add_column(cursor, db_type, "deals_archive", "version", "INTEGER NOT NULL DEFAULT 0")
+
+
+def rebuild_global_stats(cursor):
+    """Recompute the global_stats counters from users and deals."""
+    cursor.execute("DELETE FROM global_stats")
+    cursor.execute("""
+        INSERT INTO global_stats (key, value)
+        SELECT 'total_volume', COALESCE(SUM(volume_usd), 0) FROM users
+        UNION ALL SELECT 'total_deals', COALESCE(SUM(deals_completed), 0) FROM users
+        UNION ALL SELECT 'user_count', COUNT(*) FROM users
+    """)
+    cursor.execute("""
+        INSERT INTO global_stats (key, value)
+        SELECT 'status:' || status, COUNT(*) FROM deals WHERE status IS NOT NULL GROUP BY status
+    """)
+
+
+@migration(4, "global_stats")
+def _global_stats(cursor, db_type):
+    # Aggregate counters kept up to date incrementally (see services/global_stats.py)
+    value_type = "REAL" if db_type == "sqlite" else "DOUBLE PRECISION"
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS global_stats (
+            key TEXT PRIMARY KEY,
+            value {value_type} DEFAULT 0
+        )
+    """)
+    rebuild_global_stats(cursor)
+
+
+AUDIT_INDEXES = (("user", "user_id"), ("target", "target_id"), ("action", "action"))
+
+
+def create_audit_indexes(cursor, table):
+    """(column, timestamp) indexes used by the audit query API, on the live table or a monthly segment."""
+    for suffix, column in AUDIT_INDEXES:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{suffix} ON {table}({column}, timestamp)")
+
+
+@migration(5, "audit_indexes")
+def _audit_indexes(cursor, db_type):
+    create_audit_indexes(cursor, "audit_logs")
+    # Rolled-over monthly tables (audit_logs_YYYYMM) and their export state
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS audit_segments (
+            name TEXT PRIMARY KEY,
+            month_start REAL,
+            month_end REAL,
+            row_count INTEGER DEFAULT 0,
+            export_path TEXT,
+            exported_at REAL,
+            dropped INTEGER DEFAULT 0
+        )
+    """)
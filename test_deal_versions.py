@@ -0,0 +1,55 @@
+import pytest
+
+import database
+from database import db, DealVersionConflict
+
+def _new_deal(deal_id):
+    data = database.load_all_data()
+    data[deal_id] = {"channel_id": hash(deal_id) % 100000, "status": "active", "currency": "ltc"}
+    database.save_all_data(data)
+    database.flush_deals()
+    return data[deal_id]
+
+def _bump_row(deal_id, **fields):
+    # A write from another process: the row moves on, this process's cache doesn't
+    sets = ", ".join(f"{k} = {db.p}" for k in fields)
+    with db.session() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"UPDATE deals SET {sets}, version = version + 1 WHERE deal_id = {db.p}", (*fields.values(), deal_id))
+        cursor.close()
+
+def test_stale_version_conflicts():
+    deal = _new_deal("v1")
+    version = deal["version"]
+    assert database.compare_and_set_deal("v1", version, {"status": "escrowed"}) == version + 1
+    with pytest.raises(DealVersionConflict) as e:
+        database.compare_and_set_deal("v1", version, {"status": "released"})
+    assert (e.value.expected, e.value.actual) == (version, version + 1)
+    assert deal["status"] == "escrowed"
+
+def test_row_changed_elsewhere_conflicts():
+    deal = _new_deal("v2")
+    version = deal["version"]
+    _bump_row("v2", status="cancelled")
+    with pytest.raises(DealVersionConflict) as e:
+        database.compare_and_set_deal("v2", version, {"status": "released"})
+    assert e.value.actual == version + 1
+    assert deal["status"] == "active" # Nothing applied to the cache either
+
+def test_modify_deal_retries_on_latest_version():
+    deal = _new_deal("v3")
+    _bump_row("v3", status="escrowed")
+    seen = []
+    def mutate(draft):
+        seen.append(draft["status"])
+        draft["paid"] = True
+    database.modify_deal("v3", mutate)
+    assert seen == ["active", "escrowed"] # Re-run after reloading the row
+    assert deal["paid"] and deal["status"] == "escrowed"
+
+def test_transition_guard_checked_on_latest_version():
+    deal = _new_deal("v4")
+    _bump_row("v4", status="released")
+    guard = lambda d: d.get("status") not in ("released", "refunded")
+    assert not database.transition_deal("v4", {"status": "refunded"}, guard=guard)
+    assert deal["status"] == "released"
@@ -0,0 +1,116 @@
+import asyncio
+import threading
+
+from services.deal_store import DealStore
+from services.deal_writer import DealWriteBehind
+
+class RecordingBatch:
+    """write_batch stand-in that records each call and can be told to fail."""
+    def __init__(self):
+        self.calls = []
+        self.fail = 0
+
+    def __call__(self, items, removed, status_deltas):
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("database is locked")
+        self.calls.append((items, removed, status_deltas))
+        return {deal_id: (snapshot["version"] or 0) + 1 for deal_id, snapshot, _ in items}
+
+def _writer(deals):
+    batch = RecordingBatch()
+    writer = DealWriteBehind(batch, flush_interval=3600)
+    store = DealStore()
+    for deal_id, deal in deals.items():
+        store.load(deal_id, dict(deal, version=1))
+    writer.attach(store)
+    return writer, store, batch
+
+def test_edits_coalesce_into_one_patch():
+    writer, store, batch = _writer({"d1": {"status": "active", "channel_id": 1}})
+    deal = store["d1"]
+    deal["last_activity"] = 1.0
+    deal["last_activity"] = 2.0
+    deal["rescan_count"] = 3
+    assert writer.pending() == 1
+    assert writer.stats["coalesced"] == 2
+    assert not writer.has_critical()
+
+    assert writer.flush()
+    assert len(batch.calls) == 1
+    items, removed, _ = batch.calls[0]
+    assert [(i[0], i[2]) for i in items] == [("d1", {"last_activity", "rescan_count"})]
+    assert items[0][1]["last_activity"] == 2.0
+    assert removed == []
+    assert deal["version"] == 2
+    writer.stop()
+
+def test_money_transition_is_critical():
+    writer, store, batch = _writer({"d1": {"status": "active"}, "d2": {"status": "active"}})
+    store["d1"]["status"] = "awaiting_payment"
+    assert not writer.has_critical()
+    store["d2"]["status"] = "released"
+    assert writer.has_critical()
+    assert writer.flush()
+    assert not writer.has_critical()
+    assert batch.calls[0][2] == {"active": -2, "awaiting_payment": 1, "released": 1}
+
+    store["d1"]["paid"] = True
+    assert writer.has_critical()
+    writer.stop()
+
+def test_failed_flush_requeues_deals():
+    writer, store, batch = _writer({"d1": {"status": "active"}})
+    store["d1"]["last_activity"] = 5.0
+    store["d2"] = {"status": "active", "channel_id": 2}
+    del store["d1"]
+    store["d3"] = {"status": "active"}
+    batch.fail = 1
+
+    assert not writer.flush()
+    assert writer.stats["errors"] == 1
+    assert writer.pending() == 3 # d2, d3 live and d1's close
+
+    assert writer.flush()
+    items, removed, _ = batch.calls[0]
+    assert sorted(i[0] for i in items) == ["d2", "d3"]
+    assert all(fields is None for _, _, fields in items) # Retried as full rows
+    assert [deal_id for deal_id, _ in removed] == ["d1"]
+    assert writer.pending() == 0
+    writer.stop()
+
+def test_critical_save_flushes_synchronously():
+    import database
+    data = database.load_all_data()
+    data["w1"] = {"channel_id": 10, "status": "active", "currency": "ltc"}
+    database.save_all_data(data)
+    database.flush_deals()
+
+    data["w1"]["last_activity"] = 1.0
+    database.save_all_data(data)
+    assert database.deal_writer.pending() == 1 # Left to the background flush
+
+    data["w1"]["status"] = "released"
+    database.save_all_data(data)
+    assert database.deal_writer.pending() == 0
+    assert database.deal_writer.persisted_version("w1") == data["w1"]["version"]
+
+def test_async_critical_save_flushes_on_writer_thread(monkeypatch):
+    import database
+    from services.async_db import async_db
+    data = database.load_all_data()
+    data["w2"] = {"channel_id": 11, "status": "active", "currency": "ltc"}
+    database.save_all_data(data)
+    database.flush_deals()
+
+    threads = []
+    flush = database.deal_writer.flush
+    def recording_flush(*args, **kwargs):
+        threads.append(threading.current_thread().name)
+        return flush(*args, **kwargs)
+    monkeypatch.setattr(database.deal_writer, "flush", recording_flush)
+
+    data["w2"]["status"] = "released"
+    asyncio.run(async_db.database.save_all_data(data))
+    assert threads and all(name.startswith("db-writer") for name in threads)
+    assert database.deal_writer.pending() == 0
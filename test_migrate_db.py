@@ -0,0 +1,35 @@
+import json
+
+from utils.migrate_db import iter_json_object
+
+CHUNK_SIZES = (1, 2, 3, 7, 64, 1 << 16)
+
+def _write(name, text):
+    with open(name, "w") as f:
+        f.write(text)
+    return name
+
+def _check(name):
+    with open(name) as f:
+        expected = json.load(f)
+    for chunk_size in CHUNK_SIZES:
+        actual = dict(iter_json_object(name, chunk_size=chunk_size))
+        assert actual == expected, f"chunk_size={chunk_size}: {actual!r} != {expected!r}"
+
+def test_numbers_at_chunk_edge():
+    _check(_write("numbers.json", '{"a":3.2, "b": -10, "c":1e-5,"d" :12345678901234567890}'))
+
+def test_nested_values():
+    _check(_write("nested.json", json.dumps({
+        "1001": {"amount": 12.5, "status": "completed", "tags": ["x", "y,}"], "fee": 0.0001},
+        "1002": {"amount": 100, "ok": True, "note": None, "text": "quote \" and : colon"},
+        "1003": [],
+        "1004": {},
+    }, indent=2)))
+
+def test_generated_file():
+    data = {str(i): {"amount": i * 1.25, "rate": i / 7, "buyer": i * 31, "flag": i % 2 == 0} for i in range(500)}
+    _check(_write("deals.json", json.dumps(data)))
+
+def test_empty_object():
+    _check(_write("empty.json", "  { }  "))
@@ -0,0 +1,84 @@
+import asyncio
+
+import aiohttp
+from aiohttp import web
+from services.rpc_batch import JSONRPCBatchClient, JSONRPCError
+
+class FakeNode:
+    """Local JSON-RPC endpoint: caps batch size, answers out of order, drops calls once."""
+    def __init__(self, max_batch=None, reject_as="413", drop_once=()):
+        self.max_batch = max_batch
+        self.reject_as = reject_as
+        self.drop_once = set(drop_once)
+        self.batches = []
+        self.singles = []
+
+    def answer(self, call):
+        if call["method"] == "eth_fail":
+            return {"jsonrpc": "2.0", "id": call["id"], "error": {"code": -32000, "message": "execution reverted"}}
+        return {"jsonrpc": "2.0", "id": call["id"], "result": hex(call["params"][0])}
+
+    async def handle(self, request):
+        body = await request.json()
+        if not isinstance(body, list):
+            self.singles.append(body["params"][0])
+            return web.json_response(self.answer(body))
+        self.batches.append(len(body))
+        if self.max_batch is not None and len(body) > self.max_batch:
+            if self.reject_as == "413":
+                return web.Response(status=413)
+            return web.json_response({"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "batch too large"}})
+        replies = []
+        for call in body:
+            if call["params"][0] in self.drop_once:
+                self.drop_once.discard(call["params"][0])
+                continue # Rate-limited inside the batch: no response for this id
+            replies.append(self.answer(call))
+        return web.json_response(list(reversed(replies)))
+
+def _run(node, calls, client):
+    async def main():
+        app = web.Application()
+        app.router.add_post("/", node.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/"
+        try:
+            async with aiohttp.ClientSession() as session:
+                first = await client.call(url, calls, session=session)
+                second = await client.call(url, calls, session=session)
+            return url, first, second
+        finally:
+            await runner.cleanup()
+    return asyncio.run(main())
+
+def _calls(n):
+    return [("eth_getBalance", [i]) for i in range(n)]
+
+def test_results_aligned_with_calls():
+    node = FakeNode()
+    _, first, _ = _run(node, _calls(250), JSONRPCBatchClient(max_batch=100))
+    assert first == [hex(i) for i in range(250)]
+    assert node.batches == [100, 100, 50, 100, 100, 50]
+
+def test_rejected_batch_splits_and_remembers_limit():
+    for reject_as in ("413", "error"):
+        node = FakeNode(max_batch=30, reject_as=reject_as)
+        client = JSONRPCBatchClient(max_batch=100)
+        url, first, second = _run(node, _calls(100), client)
+        assert first == second == [hex(i) for i in range(100)]
+        assert client._limits[url] == 25
+        assert client.stats["splits"] == 2 # 100 -> 50 -> 25, then kept
+        assert node.batches[-4:] == [25, 25, 25, 25] # Second call: no rejected POSTs
+
+def test_missing_and_failed_calls_retried_singly():
+    node = FakeNode(drop_once={3, 7})
+    client = JSONRPCBatchClient(max_batch=100)
+    calls = _calls(10) + [("eth_fail", [10])]
+    _, first, _ = _run(node, calls, client)
+    assert first[:10] == [hex(i) for i in range(10)]
+    assert isinstance(first[10], JSONRPCError) and first[10].method == "eth_fail"
+    assert sorted(node.singles) == [3, 7, 10, 10] # eth_fail is retried on both calls
+    assert client.stats["failed"] == 2
@@ -0,0 +1,60 @@
+import sqlite3
+
+import pytest
+
+from services import schema_migrations
+from services.schema_migrations import MIGRATIONS, apply_migrations, migration
+
+def _recorded(conn):
+    return [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY applied_at, version")]
+
+@pytest.fixture
+def registry():
+    """Lets a test register extra migrations; the module list is restored afterwards."""
+    saved = list(MIGRATIONS)
+    yield MIGRATIONS
+    MIGRATIONS[:] = saved
+
+def test_fresh_database_applies_all_in_order():
+    conn = sqlite3.connect(":memory:")
+    apply_migrations(conn, "sqlite")
+    assert _recorded(conn) == [v for v, _, _ in MIGRATIONS]
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(deals)")}
+    assert set(schema_migrations.HOT_DEAL_FIELDS) <= columns and "version" in columns
+
+    apply_migrations(conn, "sqlite") # Second boot: nothing left to do
+    assert _recorded(conn) == [v for v, _, _ in MIGRATIONS]
+
+def test_registration_order_does_not_matter(registry):
+    ran = []
+    top = registry[-1][0]
+    migration(top + 2, "second")(lambda cursor, db_type: ran.append(top + 2))
+    migration(top + 1, "first")(lambda cursor, db_type: ran.append(top + 1))
+    conn = sqlite3.connect(":memory:")
+    apply_migrations(conn, "sqlite")
+    assert ran == [top + 1, top + 2]
+    assert _recorded(conn)[-2:] == [top + 1, top + 2]
+
+    with pytest.raises(ValueError):
+        migration(top + 1, "again")(lambda cursor, db_type: None)
+
+def test_failed_migration_stops_and_reruns(registry):
+    top = registry[-1][0]
+    state = {"fail": True}
+    def flaky(cursor, db_type):
+        cursor.execute("CREATE TABLE flaky_probe (id INTEGER)")
+        if state["fail"]:
+            raise RuntimeError("boom")
+    later = []
+    migration(top + 1, "flaky")(flaky)
+    migration(top + 2, "later")(lambda cursor, db_type: later.append(True))
+
+    conn = sqlite3.connect(":memory:")
+    with pytest.raises(RuntimeError):
+        apply_migrations(conn, "sqlite")
+    assert top + 1 not in _recorded(conn) and not later
+
+    state["fail"] = False
+    conn.execute("DROP TABLE IF EXISTS flaky_probe") # SQLite DDL may have committed
+    apply_migrations(conn, "sqlite")
+    assert _recorded(conn)[-2:] == [top + 1, top + 2] and later == [True]
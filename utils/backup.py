@@ -1,78 +1,372 @@
-
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 import os
+import sys
+import gzip
+import io
+import json
+import glob
+import time
 import shutil
+import sqlite3
+import hashlib
+import logging
 import datetime
 import subprocess
-import glob
+
+# Add project root to sys.path to allow imports when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logger = logging.getLogger("Backup")
 
 # Configuration
 BACKUP_DIR = "backups"
 DB_FILE_SQLITE = "rainyday.db"
 POSTGRES_DB = "rainyday"
 MAX_BACKUPS = 10
+INCREMENTAL_STATE = "incremental_state.json"
+
+# Deal tables covered by the incremental change journal
+JOURNAL_TABLES = ("deals", "deals_archive")
 
 def ensure_backup_dir():
     if not os.path.exists(BACKUP_DIR):
         os.makedirs(BACKUP_DIR)
 
+def _timestamp():
+    # Microseconds keep names unique when runs land in the same second
+    return datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+
+# --- Compression (zstd when the zstandard package is installed, gzip otherwise) ---
+def _compressed_ext():
+    return ".zst" if zstandard else ".gz"
+
+def _open_compressed(path, mode):
+    # Format follows the final name; files are written as "<name>.tmp" and renamed when complete
+    name = path[:-len(".tmp")] if path.endswith(".tmp") else path
+    if name.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"{path} needs the zstandard package")
+        if "r" in mode:
+            return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        return zstandard.ZstdCompressor(level=10).stream_writer(open(path, "wb"), closefd=True)
+    return gzip.open(path, mode)
+
+def _compress_file(src, dest):
+    """Stream `src` into compressed `dest`; returns the sha256 of the uncompressed data."""
+    digest = hashlib.sha256()
+    tmp = dest + ".tmp"
+    with open(src, "rb") as fin, _open_compressed(tmp, "wb") as fout:
+        while True:
+            chunk = fin.read(1 << 20)
+            if not chunk:
+                break
+            digest.update(chunk)
+            fout.write(chunk)
+    os.replace(tmp, dest)
+    return digest.hexdigest()
+
+def _decompress_file(src, dest):
+    digest = hashlib.sha256()
+    with _open_compressed(src, "rb") as fin, open(dest, "wb") as fout:
+        while True:
+            chunk = fin.read(1 << 20)
+            if not chunk:
+                break
+            digest.update(chunk)
+            fout.write(chunk)
+    return digest.hexdigest()
+
+def _manifest_path(backup_path):
+    return backup_path + ".json"
+
+def _read_manifest(backup_path):
+    try:
+        with open(_manifest_path(backup_path), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_manifest(backup_path, manifest):
+    with open(_manifest_path(backup_path), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+# --- Retention ---
+def _full_backups():
+    """Full backups (any format, including legacy zips), oldest first."""
+    files = [f for f in glob.glob(os.path.join(BACKUP_DIR, "backup_*"))
+             if not f.endswith((".json", ".tmp"))]
+    return sorted(files, key=os.path.getmtime)
+
+def _journals():
+    """Incremental journals, oldest first."""
+    files = [f for f in glob.glob(os.path.join(BACKUP_DIR, "journal_*"))
+             if not f.endswith((".json", ".tmp"))]
+    return sorted(files, key=os.path.getmtime)
+
 def cleanup_old_backups():
-    files = sorted(glob.glob(os.path.join(BACKUP_DIR, "backup_*.zip")))
+    files = _full_backups()
     if len(files) > MAX_BACKUPS:
         for f in files[:-MAX_BACKUPS]:
-            print(f"Deleting old backup: {f}")
+            logger.info(f"Deleting old backup: {f}")
             os.remove(f)
+            if os.path.exists(_manifest_path(f)):
+                os.remove(_manifest_path(f))
+    # Journals are only replayable on top of a retained full backup
+    remaining = _full_backups()
+    oldest = os.path.getmtime(remaining[0]) if remaining else None
+    for f in _journals():
+        if oldest is None or os.path.getmtime(f) < oldest:
+            logger.info(f"Deleting orphaned journal: {f}")
+            os.remove(f)
+            if os.path.exists(_manifest_path(f)):
+                os.remove(_manifest_path(f))
+
+# --- SQLite ---
+def _deal_versions(conn):
+    """{"table:deal_id": version} for every deal row, the baseline for the next journal."""
+    versions = {}
+    for table in JOURNAL_TABLES:
+        try:
+            for deal_id, version in conn.execute(f"SELECT deal_id, version FROM {table}"):
+                versions[f"{table}:{deal_id}"] = version
+        except sqlite3.OperationalError:
+            pass # Table not created yet on this database
+    return versions
+
+def _save_state(state):
+    tmp = os.path.join(BACKUP_DIR, INCREMENTAL_STATE + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, os.path.join(BACKUP_DIR, INCREMENTAL_STATE))
+
+def _load_state():
+    try:
+        with open(os.path.join(BACKUP_DIR, INCREMENTAL_STATE), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
 
-def backup_sqlite():
-    if not os.path.exists(DB_FILE_SQLITE):
-        print(f"SQLite DB {DB_FILE_SQLITE} not found. Skipping.")
-        return False
-    
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    target_zip = os.path.join(BACKUP_DIR, f"backup_sqlite_{timestamp}")
-    
+def backup_sqlite(db_path=DB_FILE_SQLITE):
+    """
+    Consistent online snapshot via the sqlite3 backup API.
+
+    The copy is one step (pages=-1) inside a single read transaction: a
+    paged backup restarts whenever another connection writes, which the
+    deal write-behind does every half second. Under WAL the read does not
+    block writers, and WAL content is included, unlike copying the file. The snapshot is stream-compressed next to a manifest with
+    its sha256, which restore verifies. Returns the backup path or None.
+    """
+    if not os.path.exists(db_path):
+        logger.warning(f"SQLite DB {db_path} not found. Skipping.")
+        return None
+
+    ensure_backup_dir()
+    started = time.time()
+    target = os.path.join(BACKUP_DIR, f"backup_sqlite_{_timestamp()}.db{_compressed_ext()}")
+    raw = target + ".raw.tmp"
     try:
-        shutil.make_archive(target_zip, 'zip', root_dir='.', base_dir=DB_FILE_SQLITE)
-        print(f"SQLite backup created: {target_zip}.zip")
-        return True
+        src = sqlite3.connect(db_path, timeout=30)
+        dest = sqlite3.connect(raw)
+        try:
+            src.backup(dest, pages=-1)
+            versions = _deal_versions(dest) # Same point in time as the snapshot
+        finally:
+            dest.close()
+            src.close()
+
+        sha256 = _compress_file(raw, target)
+        _write_manifest(target, {
+            "type": "full",
+            "created_at": started,
+            "sha256": sha256,
+            "size": os.path.getsize(raw),
+        })
+        _save_state({"base": os.path.basename(target), "versions": versions})
+        logger.info(f"SQLite backup created: {target} ({time.time() - started:.1f}s)")
+        return target
     except Exception as e:
-        print(f"Backup failed: {e}")
-        return False
+        logger.error(f"Backup failed: {e}")
+        return None
+    finally:
+        if os.path.exists(raw):
+            os.remove(raw)
+
+def backup_sqlite_incremental(db_path=DB_FILE_SQLITE):
+    """
+    Deal-level change journal since the previous backup (full or journal).
+
+    Writes every deals/deals_archive row whose version changed, plus the
+    ids that left a table, as compressed JSON lines. Falls back to a full
+    backup when there is no base snapshot yet. Returns the path written.
+    """
+    state = _load_state()
+    if state is None or not os.path.exists(os.path.join(BACKUP_DIR, state["base"])):
+        return backup_sqlite(db_path)
+
+    started = time.time()
+    target = os.path.join(BACKUP_DIR, f"journal_{_timestamp()}.jsonl{_compressed_ext()}")
+    previous = state["versions"]
+    current = {}
+    changed = 0
+    try:
+        conn = sqlite3.connect(db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("BEGIN") # One read snapshot for every table
+            with _open_compressed(target + ".tmp", "wb") as out:
+                for table in JOURNAL_TABLES:
+                    try:
+                        rows = conn.execute(f"SELECT * FROM {table}")
+                    except sqlite3.OperationalError:
+                        continue
+                    for row in rows:
+                        key = f"{table}:{row['deal_id']}"
+                        current[key] = row["version"]
+                        if previous.get(key, -1) != row["version"]:
+                            out.write((json.dumps({"op": "upsert", "table": table, "row": dict(row)}) + "\n").encode())
+                            changed += 1
+                for key in previous.keys() - current.keys():
+                    table, deal_id = key.split(":", 1)
+                    out.write((json.dumps({"op": "delete", "table": table, "deal_id": deal_id}) + "\n").encode())
+                    changed += 1
+            conn.rollback()
+        finally:
+            conn.close()
+
+        os.replace(target + ".tmp", target)
+        _write_manifest(target, {"type": "journal", "base": state["base"], "created_at": started, "changes": changed})
+        _save_state({"base": state["base"], "versions": current})
+        logger.info(f"Incremental backup created: {target} ({changed} deal changes)")
+        return target
+    except Exception as e:
+        logger.error(f"Incremental backup failed: {e}")
+        if os.path.exists(target + ".tmp"):
+            os.remove(target + ".tmp")
+        return None
+
+def _apply_journal(conn, journal_path):
+    applied = 0
+    with io.TextIOWrapper(_open_compressed(journal_path, "rb"), encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry["op"] == "upsert":
+                row = entry["row"]
+                columns = ", ".join(row)
+                placeholders = ", ".join("?" for _ in row)
+                conn.execute(f"INSERT OR REPLACE INTO {entry['table']} ({columns}) VALUES ({placeholders})", tuple(row.values()))
+            else:
+                conn.execute(f"DELETE FROM {entry['table']} WHERE deal_id = ?", (entry["deal_id"],))
+            applied += 1
+    return applied
 
+def verify_backup(backup_path, workdir=BACKUP_DIR):
+    """
+    Decompress a full backup to a scratch file and check it: sha256 against
+    the manifest, PRAGMA integrity_check, and a readable schema_version.
+    Returns the scratch path (caller removes it) or raises ValueError.
+    """
+    manifest = _read_manifest(backup_path)
+    if manifest is None or manifest.get("type") != "full":
+        raise ValueError(f"{backup_path} has no full-backup manifest")
+
+    scratch = os.path.join(workdir, f".restore_{os.getpid()}.db")
+    sha256 = _decompress_file(backup_path, scratch)
+    try:
+        if sha256 != manifest["sha256"]:
+            raise ValueError(f"Checksum mismatch for {backup_path}")
+        conn = sqlite3.connect(scratch)
+        try:
+            result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+            if result != "ok":
+                raise ValueError(f"Integrity check failed for {backup_path}: {result}")
+            conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+        finally:
+            conn.close()
+    except Exception:
+        os.remove(scratch)
+        raise
+    return scratch
+
+def restore_sqlite(backup_path, db_path=DB_FILE_SQLITE, with_journals=True, dry_run=False):
+    """
+    Verified restore of a full backup (plus, by default, the journals taken
+    on top of it, in order) into `db_path`. The restored copy is verified
+    and fully assembled before the live database is touched, and is then
+    copied in with the backup API so an open WAL stays consistent. Stop
+    the bot first. Returns the number of journal entries replayed.
+    """
+    scratch = verify_backup(backup_path)
+    try:
+        replayed = 0
+        if with_journals:
+            base = os.path.basename(backup_path)
+            conn = sqlite3.connect(scratch)
+            try:
+                for journal in _journals():
+                    manifest = _read_manifest(journal)
+                    if manifest and manifest.get("base") == base:
+                        replayed += _apply_journal(conn, journal)
+                conn.commit()
+                if conn.execute("PRAGMA integrity_check").fetchone()[0] != "ok":
+                    raise ValueError("Integrity check failed after replaying journals")
+            finally:
+                conn.close()
+
+        if not dry_run:
+            src = sqlite3.connect(scratch)
+            dest = sqlite3.connect(db_path, timeout=30)
+            try:
+                src.backup(dest, pages=-1) # One step: no restarts, no half-copied database
+            finally:
+                dest.close()
+                src.close()
+            logger.info(f"Restored {db_path} from {backup_path} ({replayed} journal entries replayed)")
+        return replayed
+    finally:
+        os.remove(scratch)
+
+# --- Postgres ---
 def backup_postgres():
-    # Requires pg_dump installed and accessible
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    dump_file = os.path.join(BACKUP_DIR, f"pg_dump_{timestamp}.sql")
-    target_zip = os.path.join(BACKUP_DIR, f"backup_pg_{timestamp}")
-    
+    # Requires pg_dump installed and accessible; the dump is streamed straight into the compressor
+    target = os.path.join(BACKUP_DIR, f"backup_pg_{_timestamp()}.sql{_compressed_ext()}")
+
     # Try to grab creds from env if needed, but PGPASSWORD env var is standard
     try:
-        # Simple local execution
-        cmd = f"pg_dump {POSTGRES_DB} > {dump_file}"
-        ret = subprocess.call(cmd, shell=True)
-        
-        if ret == 0:
-            shutil.make_archive(target_zip, 'zip', root_dir=BACKUP_DIR, base_dir=os.path.basename(dump_file))
-            os.remove(dump_file) # Remove raw SQL after zip
-            print(f"Postgres backup created: {target_zip}.zip")
-            return True
-        else:
-            print("pg_dump failed (exit code != 0). Check postgres credentials/path.")
-            return False
-            
+        ensure_backup_dir()
+        proc = subprocess.Popen(["pg_dump", POSTGRES_DB], stdout=subprocess.PIPE)
+        with _open_compressed(target + ".tmp", "wb") as out:
+            shutil.copyfileobj(proc.stdout, out, 1 << 20)
+        if proc.wait() == 0:
+            os.replace(target + ".tmp", target)
+            logger.info(f"Postgres backup created: {target}")
+            return target
+        logger.error("pg_dump failed (exit code != 0). Check postgres credentials/path.")
     except Exception as e:
-        print(f"Postgres backup error: {e}")
-        return False
+        logger.error(f"Postgres backup error: {e}")
+    if os.path.exists(target + ".tmp"):
+        os.remove(target + ".tmp")
+    return None
 
-if __name__ == "__main__":
+def run_backup(incremental=False):
+    """One scheduled backup run for whichever backend is in use, followed by retention."""
+    from services.db_manager import db # Imported here: restore/verify must not open the database
     ensure_backup_dir()
-    
-    # Heuristic: check if we are using postgres based on .env or assumptions.
-    # For now, try sqlite, if not found, try postgres.
-    
-    if os.path.exists(DB_FILE_SQLITE):
-        backup_sqlite()
+    if db.db_type == "sqlite":
+        path = backup_sqlite_incremental() if incremental else backup_sqlite()
     else:
-        # Fallback to postgres backup attempt
-        backup_postgres()
-        
+        path = backup_postgres()
     cleanup_old_backups()
+    return path
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) >= 3 and sys.argv[1] == "restore":
+        print(f"Replayed {restore_sqlite(sys.argv[2])} journal entries.")
+    elif len(sys.argv) >= 3 and sys.argv[1] == "verify":
+        os.remove(verify_backup(sys.argv[2]))
+        print(f"{sys.argv[2]} OK")
+    else:
+        print(run_backup(incremental="--incremental" in sys.argv))
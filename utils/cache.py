@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Every TTLCache registers itself here so health checks can report all of them
+CACHES = {}
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded LRU cache with per-key TTL and tag invalidation.
+
+    - At most `maxsize` entries; the least recently used entry is evicted first.
+    - Entries expire after `ttl` seconds (overridable per key); expired entries
+      are dropped on access and swept whenever the cache is full.
+    - `set(..., tags=("user:123",))` lets write paths drop every entry that
+      depends on a row with one `invalidate_tag("user:123")`.
+    - Hit/miss/eviction/expiry/invalidation counters via `stats()`.
+    """
+
+    def __init__(self, name, maxsize=1024, ttl=60):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (value, expires_at, tags)
+        self._tags = {}             # tag -> set of keys
+        self._lock = threading.RLock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+        CACHES[name] = self
+
+    # --- Internal ---
+    def _drop(self, key):
+        # Caller holds self._lock
+        value, _, tags = self._data.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+        return value
+
+    def _sweep_expired(self, now):
+        expired = [key for key, (_, expires_at, _) in self._data.items() if expires_at <= now]
+        for key in expired:
+            self._drop(key)
+        self._counters["expirations"] += len(expired)
+
+    # --- Public API ---
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self._counters["misses"] += 1
+                return default
+            if entry[1] <= time.time():
+                self._drop(key)
+                self._counters["expirations"] += 1
+                self._counters["misses"] += 1
+                return default
+            self._data.move_to_end(key)
+            self._counters["hits"] += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None, tags=()):
+        now = time.time()
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            elif len(self._data) >= self.maxsize:
+                self._sweep_expired(now)
+                while len(self._data) >= self.maxsize:
+                    self._drop(next(iter(self._data)))
+                    self._counters["evictions"] += 1
+            tags = frozenset(tags)
+            self._data[key] = (value, now + (self.ttl if ttl is None else ttl), tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+
+    def get_or_load(self, key, loader, ttl=None, tags=()):
+        """Cached value for `key`, calling `loader()` and caching its result on a miss (None is not cached)."""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = loader()
+        if value is not None:
+            self.set(key, value, ttl=ttl, tags=tags)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+                self._counters["invalidations"] += 1
+
+    def invalidate_tag(self, tag):
+        with self._lock:
+            for key in list(self._tags.get(tag, ())):
+                self._drop(key)
+                self._counters["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["size"] = len(self._data)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+def cache_stats():
+    """{cache name: stats} for every TTLCache in the process."""
+    return {name: cache.stats() for name, cache in CACHES.items()}
@@ -1,5 +1,7 @@
 import asyncio
 import logging
+from utils import json_codec
+from services.evm_provider import evm_providers
 
 logger = logging.getLogger("RainyBot")
 
@@ -9,15 +11,13 @@ async def get_evm_confirmations(tx_hash, rpc_urls):
     Queries all RPCs and returns the HIGHEST confirmation count found.
     """
     if not tx_hash or not rpc_urls: return 0
-    from web3 import AsyncWeb3, AsyncHTTPProvider
     
     if isinstance(tx_hash, str) and not tx_hash.startswith("0x"):
         tx_hash = "0x" + tx_hash
 
     async def fetch_conf(url):
-        w3 = None
         try:
-            w3 = AsyncWeb3(AsyncHTTPProvider(url, request_kwargs={"timeout": 6}))
+            w3 = await evm_providers.get(url, timeout=6)
             
             # 1. Try Receipt (Normal path)
             receipt = await w3.eth.get_transaction_receipt(tx_hash)
@@ -37,10 +37,6 @@ async def get_evm_confirmations(tx_hash, rpc_urls):
             return 0
         except:
             return 0
-        finally:
-            if w3 and hasattr(w3.provider, 'session'):
-                try: await w3.provider.session.close()
-                except: pass
 
     tasks = [fetch_conf(url) for url in rpc_urls]
     results = await asyncio.gather(*tasks, return_exceptions=True)
@@ -67,7 +63,7 @@ async def get_solana_confirmations(tx_hash, rpc_urls):
                 }
                 async with session.post(url, json=payload, timeout=5) as r:
                     if r.status == 200:
-                        data = await r.json()
+                        data = await r.json(loads=json_codec.loads)
                         val = data.get("result", {}).get("value", [None])[0]
                         if not val: return 0
                         
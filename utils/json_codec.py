@@ -0,0 +1,90 @@
+"""
+JSON codec used for deal payloads and HTTP/RPC responses.
+
+Uses orjson when it is installed and falls back to the stdlib json module,
+with identical results for everything the bot stores or receives:
+- integers outside the 64-bit range (wei amounts) are encoded and decoded
+  by stdlib, since orjson rejects them on encode and turns them into floats
+  on decode;
+- non-string dict keys are stringified like json.dumps does.
+
+Run `python -m utils.json_codec` for a per-deal micro-benchmark.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson else "json"
+
+# 20+ digit runs may be integers beyond 64 bits; those documents are decoded by stdlib.
+# Checked with translate (digits -> "1", everything else -> "0") + substring search,
+# which is several times cheaper than a regex scan over the payload.
+_DIGIT_MAP = bytes(0x31 if 0x30 <= i <= 0x39 else 0x30 for i in range(256))
+_BIG_NUMBER = b"1" * 20
+
+def _has_big_number(data):
+    if isinstance(data, str):
+        data = data.encode()
+    return _BIG_NUMBER in data.translate(_DIGIT_MAP)
+
+def dumpb(obj):
+    """Serialize to UTF-8 bytes."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass # Big ints, unsupported types: let stdlib decide (and raise the usual error)
+    return json.dumps(obj).encode()
+
+def dumps(obj):
+    """Serialize to str (drop-in for json.dumps(obj) on stored payloads)."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+        except TypeError:
+            pass
+    return json.dumps(obj)
+
+def loads(data):
+    """Parse str or bytes; raises json.JSONDecodeError on invalid input with either backend."""
+    if orjson is not None:
+        if not _has_big_number(data):
+            return orjson.loads(data)
+    return json.loads(data)
+
+async def read_json(resp):
+    """Body of an aiohttp response parsed with the codec (regardless of content type)."""
+    return loads(await resp.read())
+
+
+def _benchmark(rounds=20000):
+    import timeit
+    deal = {
+        "channel_id": "1446114392960798811", "buyer": "1446114392960798811", "seller": "998877665544332211",
+        "amount": 125.5, "currency": "ethereum", "status": "awaiting_payment", "start_time": 1767549648.675,
+        "address": "0x52908400098527886E0F7030069857D2E4169EE7", "paid": False,
+        "expected_crypto_amount": 0.0412, "payment_start_time": 1767549700.1,
+        "ltc_usd_rate": 3050.12, "amount_final_embed_sent": False, "buyer_confirmed": True,
+        "messages": [{"user": "1446114392960798811", "ts": 1767549648.675 + i, "text": "ok"} for i in range(10)],
+        "wei_amount": 41200000000000000000,
+    }
+    encoded = json.dumps(deal)
+    results = [("json", timeit.timeit(lambda: json.dumps(deal), number=rounds),
+                timeit.timeit(lambda: json.loads(encoded), number=rounds))]
+    if orjson is not None:
+        results.append(("codec", timeit.timeit(lambda: dumps(deal), number=rounds),
+                        timeit.timeit(lambda: loads(encoded), number=rounds)))
+        small = {k: v for k, v in deal.items() if k != "wei_amount"}
+        small_encoded = json.dumps(small)
+        results.append(("codec, no big ints", timeit.timeit(lambda: dumps(small), number=rounds),
+                        timeit.timeit(lambda: loads(small_encoded), number=rounds)))
+    print(f"Backend: {BACKEND}, payload {len(encoded)} bytes, {rounds} rounds")
+    for name, dump_t, load_t in results:
+        print(f"  {name:<20} serialize {dump_t / rounds * 1e6:6.2f} us/deal   deserialize {load_t / rounds * 1e6:6.2f} us/deal")
+
+if __name__ == "__main__":
+    _benchmark()
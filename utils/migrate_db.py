@@ -1,86 +1,215 @@
-
+import csv
+import io
 import json
 import os
 import sys
-import psycopg2
-from psycopg2.extras import Json
-from typing import Dict, Any
+import time
 
 # Add project root to sys.path to allow imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from services.db_manager import db
+from services.global_stats import global_stats
+from database import DEAL_COLUMNS, _deal_row_params
+
+BATCH_SIZE = 1000
+CHECKPOINT_FILE = "migrate_checkpoint.json"
+USER_COLUMNS = ("user_id", "deals_completed", "volume_usd")
+VALUE_DELIMITERS = ",:}] \t\r\n"
 
-def load_json(filename):
+# --- Input ---
+def iter_json_object(filename, chunk_size=1 << 16):
+    """
+    Stream the (key, value) pairs of a top-level JSON object without
+    loading the whole file: values are decoded one at a time from a
+    sliding buffer.
+    """
     if not os.path.exists(filename):
         print(f"File {filename} not found, skipping.")
+        return
+    decoder = json.JSONDecoder()
+    with open(filename, "r") as f:
+        buf = ""
+        pos = 0
+        eof = False
+
+        def fill():
+            nonlocal buf, pos, eof
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+            buf = buf[pos:] + chunk
+            pos = 0
+
+        def skip_ws():
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n":
+                    pos += 1
+                if pos < len(buf) or eof:
+                    return
+                fill()
+
+        def decode():
+            nonlocal pos
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                    # A number at the buffer edge may continue in the next chunk
+                    # ("3." decodes as 3): only trust it when a delimiter follows
+                    if eof or (end < len(buf) and buf[end] in VALUE_DELIMITERS):
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                fill()
+
+        fill()
+        skip_ws()
+        if buf[pos:pos + 1] != "{":
+            raise ValueError(f"{filename} is not a JSON object")
+        pos += 1
+        while True:
+            skip_ws()
+            if buf[pos:pos + 1] == "}":
+                return
+            key = decode()
+            skip_ws()
+            pos += 1 # ':'
+            skip_ws()
+            yield key, decode()
+            skip_ws()
+            if buf[pos:pos + 1] == ",":
+                pos += 1
+
+def batched(pairs, size):
+    batch = []
+    for pair in pairs:
+        batch.append(pair)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# --- Checkpoint (records of each source already committed) ---
+def load_checkpoint():
+    try:
+        with open(CHECKPOINT_FILE, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
         return {}
-    with open(filename, 'r') as f:
-        return json.load(f)
-
-def migrate_deals():
-    data = load_json("data.json")
-    count = 0
-    with db.session() as conn:
-        cursor = conn.cursor()
-        for deal_id, info in data.items():
-            # Check if deal exists
-            cursor.execute("SELECT deal_id FROM deals WHERE deal_id = %s", (deal_id,))
-            if cursor.fetchone():
-                continue
-
-            # Extract schema fields
-            channel_id = str(info.get("channel_id"))
-            buyer = info.get("buyer")
-            seller = info.get("seller")
-            amount = info.get("amount", 0.0)
-            currency = info.get("currency")
-            created_at = info.get("start_time")
-            
-            # Determine generic status
-            # If final embed sent, assume completed. 
-            status = "completed" if info.get("amount_final_embed_sent") else "active"
-
-            # Prepare other data
-            schema_keys = {"deal_id", "channel_id", "buyer", "seller", "amount", "currency", "start_time"}
-            other_data = {k: v for k, v in info.items() if k not in schema_keys}
-            
-            cursor.execute("""
-                INSERT INTO deals (deal_id, channel_id, buyer_id, seller_id, amount, currency, status, created_at, other_data)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-                deal_id, 
-                channel_id, 
-                buyer, 
-                seller, 
-                amount, 
-                currency, 
-                status, 
-                created_at, 
-                Json(other_data)
-            ))
-            count += 1
-    print(f"Migrated {count} deals.")
-
-def migrate_users():
-    data = load_json("users.json")
-    count = 0
-    with db.session() as conn:
-        cursor = conn.cursor()
-        for user_id, stats in data.items():
-            cursor.execute("SELECT user_id FROM users WHERE user_id = %s", (user_id,))
-            if cursor.fetchone():
-                continue
-
-            deals = stats.get("deals", 0)
-            volume = stats.get("volume", 0.0)
-            
-            cursor.execute("""
-                INSERT INTO users (user_id, deals_completed, volume_usd)
-                VALUES (%s, %s, %s)
-            """, (user_id, deals, volume))
-            count += 1
-    print(f"Migrated {count} users.")
+
+def save_checkpoint(checkpoint):
+    tmp = CHECKPOINT_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, CHECKPOINT_FILE)
+
+# --- Bulk helpers ---
+def existing_keys(cursor, tables, key_column, keys):
+    """Keys of this batch already stored in any of `tables` (one set-based query)."""
+    if not keys:
+        return set()
+    placeholders = ", ".join([db.p] * len(keys))
+    sql = " UNION ".join(f"SELECT {key_column} FROM {table} WHERE {key_column} IN ({placeholders})" for table in tables)
+    cursor.execute(sql, list(keys) * len(tables))
+    return {row[0] for row in cursor.fetchall()}
+
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    if hasattr(value, "adapted"): # psycopg2 Json wrapper
+        return json.dumps(value.adapted)
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return str(value)
+
+def bulk_insert(cursor, table, columns, rows):
+    """
+    Insert rows, skipping conflicts: executemany on SQLite, COPY FROM STDIN
+    into a temp table followed by one INSERT ... ON CONFLICT on Postgres.
+    Returns the number of rows inserted.
+    """
+    column_list = ", ".join(columns)
+    if db.db_type == "sqlite":
+        before = db_total_changes(cursor)
+        cursor.executemany(
+            f"INSERT OR IGNORE INTO {table} ({column_list}) VALUES ({', '.join(['?'] * len(columns))})", rows
+        )
+        return db_total_changes(cursor) - before
+
+    buf = io.StringIO()
+    writer = csv.writer(buf, delimiter="\t", quotechar='"', lineterminator="\n")
+    for row in rows:
+        writer.writerow([_copy_value(v) for v in row])
+    buf.seek(0)
+    staging = f"_import_{table}"
+    cursor.execute(f"CREATE TEMP TABLE IF NOT EXISTS {staging} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS")
+    cursor.copy_expert(
+        f"COPY {staging} ({column_list}) FROM STDIN WITH (FORMAT csv, DELIMITER E'\\t', NULL '\\N')", buf
+    )
+    cursor.execute(f"""
+        INSERT INTO {table} ({column_list})
+        SELECT {column_list} FROM {staging}
+        ON CONFLICT DO NOTHING
+    """)
+    return cursor.rowcount
+
+def db_total_changes(cursor):
+    return cursor.connection.total_changes
+
+def run_import(name, filename, tables, key_column, columns, to_row, checkpoint, batch_size=BATCH_SIZE):
+    """Stream `filename` into `tables[0]` in batches, committing and checkpointing after each one."""
+    done = checkpoint.get(name, 0)
+    if done:
+        print(f"{name}: resuming after {done} records")
+    read = inserted = skipped = 0
+    started = time.time()
+
+    pairs = iter_json_object(filename)
+    for batch in batched(pairs, batch_size):
+        if read + len(batch) <= done:
+            read += len(batch)
+            continue # Already committed by a previous run
+        batch = batch[max(done - read, 0):]
+        read = max(read, done)
+
+        with db.session() as conn:
+            cursor = conn.cursor()
+            seen = existing_keys(cursor, tables, key_column, [str(k) for k, _ in batch])
+            rows = [to_row(str(k), v) for k, v in batch if str(k) not in seen]
+            added = bulk_insert(cursor, tables[0], columns, rows) if rows else 0
+            cursor.close()
+
+        read += len(batch)
+        inserted += added
+        skipped += len(batch) - added
+        checkpoint[name] = read
+        save_checkpoint(checkpoint)
+        rate = (read - done) / max(time.time() - started, 1e-6)
+        print(f"{name}: {read} read, {inserted} inserted, {skipped} skipped ({rate:.0f} records/s)")
+
+    print(f"Migrated {inserted} {name}.")
+    return inserted
+
+# --- Sources ---
+def _deal_row(deal_id, info):
+    info = dict(info)
+    # Determine generic status
+    # If final embed sent, assume completed.
+    info.setdefault("status", "completed" if info.get("amount_final_embed_sent") else "active")
+    return _deal_row_params(deal_id, info)
+
+def _user_row(user_id, stats):
+    return (user_id, stats.get("deals", 0), stats.get("volume", 0.0))
+
+def migrate_deals(checkpoint):
+    return run_import("deals", "data.json", ("deals", "deals_archive"), "deal_id", DEAL_COLUMNS, _deal_row, checkpoint)
+
+def migrate_users(checkpoint):
+    return run_import("users", "users.json", ("users",), "user_id", USER_COLUMNS, _user_row, checkpoint)
 
 def migrate_counter():
     if not os.path.exists("counter.json"):
@@ -90,23 +219,32 @@ def migrate_counter():
     try:
         with open("counter.json", "r") as f:
             val = json.load(f)
-            
+
+        # Never move the counter backwards (it is a reservation high-water mark)
+        as_int = "CAST(config.value AS INTEGER)" if db.db_type == "sqlite" else "CAST(config.value AS BIGINT)"
+        greatest = "MAX" if db.db_type == "sqlite" else "GREATEST"
         with db.session() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO config (key, value) VALUES (%s, %s)
-                ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
-            """, ("deal_counter", str(val)))
+            cursor.execute(f"""
+                INSERT INTO config (key, value) VALUES ({db.p}, {db.p})
+                ON CONFLICT (key) DO UPDATE SET value = CAST({greatest}({as_int}, {db.p}) AS TEXT)
+            """, ("deal_counter", str(val), int(val)))
+            cursor.close()
         print(f"Migrated counter: {val}")
     except Exception as e:
         print(f"Error migrating counter: {e}")
 
 if __name__ == "__main__":
-    print("Starting migration (PostgreSQL)...")
+    print(f"Starting migration ({db.db_type})...")
+    checkpoint = {} if "--restart" in sys.argv else load_checkpoint()
     try:
-        migrate_deals()
-        migrate_users()
+        migrate_deals(checkpoint)
+        migrate_users(checkpoint)
         migrate_counter()
+        # Bulk rows bypass the incremental counters
+        global_stats.rebuild()
+        if os.path.exists(CHECKPOINT_FILE):
+            os.remove(CHECKPOINT_FILE)
         print("Migration completed successfully.")
     except Exception as e:
-        print(f"Migration failed: {e}")
+        print(f"Migration failed: {e} (re-run to resume from the last committed batch)")